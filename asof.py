@@ -0,0 +1,74 @@
+# asof.py - هم‌ترازی as-of چند تایم‌فریم: در هر لحظه فقط آخرین کندل بسته‌شده هر تایم‌فریم (بدون نگاه به آینده)
+import numpy as np
+
+from candles import CandleSeries
+
+TF_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
+
+def _as_series(candles):
+    return candles if isinstance(candles, CandleSeries) else CandleSeries.from_dicts(candles)
+
+class AsOfIndex:
+    """
+    برای هر تایم‌فریم آرایه زمان بسته شدن کندل‌ها (t + طول کندل) یک بار ساخته می‌شود؛
+    کندل i در لحظه T بسته است اگر close_t[i] <= T، پس موقعیت as-of با یک searchsorted (O(log n)) است.
+    positions_many همه لحظه‌های تصمیم بک‌تست را یک‌جا حساب می‌کند تا هر قدم O(1) باشد.
+    """
+
+    def __init__(self, data, lookback=None):
+        # lookback: {tf: حداکثر تعداد کندل در هر view} تا بک‌تست مثل اسکن زنده پنجره ثابت ببیند
+        self.data = {tf: _as_series(candles) for tf, candles in data.items() if tf in TF_SECONDS}
+        self.close_t = {tf: series.t + TF_SECONDS[tf] for tf, series in self.data.items()}
+        self.lookback = lookback or {}
+
+    def position(self, tf, now):
+        # ایندکس آخرین کندل بسته‌شده tf در لحظه now (یا -1 اگر هیچ کندلی بسته نشده)
+        return int(np.searchsorted(self.close_t[tf], now, side="right")) - 1
+
+    def positions(self, now):
+        return {tf: self.position(tf, now) for tf in self.data}
+
+    def positions_many(self, times):
+        # {tf: آرایه ایندکس as-of برای هر لحظه در times}
+        times = np.asarray(times)
+        return {tf: np.searchsorted(close_t, times, side="right") - 1 for tf, close_t in self.close_t.items()}
+
+    def view(self, now, positions=None):
+        """
+        داده هر تایم‌فریم تا آخرین کندل بسته‌شده در now (برش بدون کپی).
+        تایم‌فریمی که هنوز کندل بسته‌شده ندارد حذف می‌شود.
+        """
+        positions = positions or self.positions(now)
+        view = {}
+        for tf, pos in positions.items():
+            if pos >= 0:
+                bars = self.lookback.get(tf)
+                view[tf] = self.data[tf][max(0, pos + 1 - bars) if bars else 0:pos + 1]
+        return view
+
+    def decision_times(self, tf="30m", start=None, end=None):
+        # لحظه‌های تصمیم بک‌تست: زمان بسته شدن هر کندل tf در بازه [start, end]
+        close_t = self.close_t[tf]
+        lo = 0 if start is None else np.searchsorted(close_t, start, side="left")
+        hi = len(close_t) if end is None else np.searchsorted(close_t, end, side="right")
+        return close_t[lo:hi]
+
+    def replay(self, tf="30m", start=None, end=None, min_bars=None):
+        """
+        پیمایش بک‌تست: (لحظه تصمیم، داده as-of همه تایم‌فریم‌ها) برای هر کندل بسته‌شده tf.
+        min_bars: {tf: حداقل کندل}؛ لحظه‌هایی که هنوز داده کافی ندارند رد می‌شوند.
+        """
+        times = self.decision_times(tf, start, end)
+        table = self.positions_many(times)
+        for i, now in enumerate(times.tolist()):
+            positions = {name: int(pos[i]) for name, pos in table.items()}
+            if min_bars and any(positions.get(name, -1) + 1 < bars for name, bars in min_bars.items()):
+                continue
+            yield int(now), self.view(now, positions)
+
+def closed_bars(data, now):
+    # حذف کندل‌های در حال شکل‌گیری از داده زنده یک نماد (هر تایم‌فریم تا آخرین کندل بسته‌شده در now)
+    index = AsOfIndex(data)
+    aligned = index.view(now)
+    aligned.update({tf: candles for tf, candles in data.items() if tf not in index.data})
+    return aligned
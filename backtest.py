@@ -0,0 +1,223 @@
+# backtest.py - بازپخش تصمیم‌های اسکن روی داده تاریخی با هم‌ترازی as-of (بدون نگاه به آینده)
+#
+# اجرا:
+#   MARKET_DATA_SOURCE=replay python backtest.py BTC-USDT 3     # سه روز آخر فیکسچر
+#   MARKET_DATA_SOURCE=archive python backtest.py ETH-USDT 90   # از آرشیو memmap
+
+import logging
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import kernels
+from asof import AsOfIndex, TF_SECONDS
+from bootstrap import bootstrap_metrics, format_ci_report
+from bot import TIMEFRAME_DAYS, intervals, build_signal_inputs
+from config import RISK_LEVELS, HISTORY_MIN_BARS, SIGNAL_THRESHOLD, DUPLICATE_COOLDOWN_MINUTES, TRACKER_MAX_HOLD_HOURS
+from divergence import recent_divergences_series
+from indicators import calculate_adx, StochasticState, SARState
+from integrity import validate_series
+from market_data import get_provider
+from outcome_tracker import compute_pnl_usd, TEHRAN
+from patterns import pullback_series, double_top_bottom_series
+from portfolio import first_exit
+from rules import evaluate_rules, indicator_snapshot, stop_levels
+from volume_stats import VolumeStatsRegistry
+
+logger = logging.getLogger(__name__)
+
+def rule_kwargs(symbol, inputs, snapshot=None):
+    # ورودی evaluate_rules از خروجی build_signal_inputs (همان محاسبه generate_signal)؛ ADX از snapshot اگر داده شود
+    adx = snapshot["adx"][0] if snapshot else calculate_adx(inputs["candles"])[0]
+    risk = inputs["prefer_risk"]
+    kwargs = dict(
+        symbol=symbol, direction=inputs["direction"], risk=risk,
+        risk_rules=next(r["rules"] for r in RISK_LEVELS if r["key"] == risk),
+        price_30m=inputs["price_30m"],
+        open_15m=inputs["open_15m"], close_15m=inputs["close_15m"],
+        high_15m=inputs["high_15m"], low_15m=inputs["low_15m"],
+        open_5m=inputs["open_5m"], close_5m=inputs["close_5m"],
+        high_5m=inputs["high_5m"], low_5m=inputs["low_5m"],
+        open_1m=inputs["open_1m"], close_1m=inputs["close_1m"],
+        high_1m=inputs["high_1m"], low_1m=inputs["low_1m"],
+        ema21_30m=inputs["ema21_30m"], ema50_30m=inputs["ema50_30m"], ema8_30m=inputs["ema8_30m"],
+        ema21_1h=inputs["ema21_1h"], ema50_1h=inputs["ema50_1h"],
+        ema21_4h=inputs["ema21_4h"], ema50_4h=inputs["ema50_4h"], ema200_4h=inputs["ema200_4h"],
+        macd_hist_30m=inputs["hist_30m"], rsi_30m=inputs["rsi_30m"],
+        vol_spike_factor=inputs["curr_vol"] / inputs["avg_vol_30m"] if inputs["avg_vol_30m"] else None,
+        divergence_detected=inputs["divergence_detected"],
+        candles=inputs["candles"], prices_series_30m=inputs["prices_series_30m"],
+        closes_by_tf=inputs["closes_by_tf"], adx_value=adx or 0,
+    )
+    if snapshot is not None:
+        kwargs["snapshot"] = snapshot
+    return kwargs
+
+def load_history(symbol, start, end, provider=None):
+    # داده هر تایم‌فریم از start منهای پنجره گرم شدن اسکن زنده تا end (اعتبارسنجی‌شده، فقط کندل‌های بسته)
+    provider = provider or get_provider()
+    data = {}
+    for tf, days in TIMEFRAME_DAYS.items():
+        candles = provider.klines(symbol, intervals[tf], start - days * 86400, end)
+        data[tf], _ = validate_series(candles, symbol, intervals[tf], now=end)
+    return data
+
+def lookback_bars():
+    # همان پنجره اسکن زنده به تعداد کندل هر تایم‌فریم
+    return {tf: days * 86400 // TF_SECONDS[tf] for tf, days in TIMEFRAME_DAYS.items()}
+
+def pattern_series(closes):
+    # قوانین الگوی وابسته به پنجره (پولبک، Double Top/Bottom) یک بار روی کل سری 30m؛ ایندکس i = تابع اسکالر روی closes[:i+1]
+    return {
+        "pullback": {d: pullback_series(closes, d) for d in ("LONG", "SHORT")},
+        "double_top_bottom": double_top_bottom_series(closes),
+    }
+
+def volume_series(symbol, candles, registry=None):
+    # آمار حجم هر کندل 30m نسبت به VOLUME_WINDOW کندل قبلش با پنجره غلتان O(1)؛ ایندکس i = volume_snapshot روی کندل‌های تا i
+    registry = registry or VolumeStatsRegistry()
+    return [registry.update(symbol, "30m", t, v) for t, v in zip(candles.t.tolist(), candles.v.tolist())]
+
+def state_series(candles):
+    """
+    Stochastic و SAR هر کندل 30m با StochasticState/SARState (O(1) به ازای هر کندل) با همان گرد کردن calculate_*.
+    ایندکس i = مقدار لحظه بسته شدن کندل i؛ SAR از ابتدای سری دنبال می‌شود، نه از ابتدای پنجره اسکن زنده.
+    """
+    stochastic, sar = StochasticState(), SARState()
+    out = {"stochastic": [], "sar": []}
+    for h, l, c in zip(candles.h.tolist(), candles.l.tolist(), candles.c.tolist()):
+        k, d = stochastic.update(h, l, c)
+        out["stochastic"].append((None, None) if d is None else (round(k, 2), round(d, 2)))
+        value = sar.update(h, l)
+        out["sar"].append(None if value is None else round(value, 4))
+    return out
+
+def _last(matrix, digits=None):
+    # ستون آخر ماتریس هسته → مقدار calculate_* (NaN = None، با همان گرد کردن)
+    return [None if np.isnan(x) else (round(x, digits) if digits is not None else x) for x in matrix[:, -1].tolist()]
+
+def batch_indicators(views):
+    """
+    EMA/RSI/ATR/ADX همه لحظه‌های تصمیم با هسته‌های دسته‌ای kernels.py: نماهای هر تایم‌فریم در یک ماتریس
+    (هم‌تراز از راست) و یک فراخوانی برای هر اندیکاتور. مقدار آخر هر سطر همان calculate_* روی همان نماست
+    (golden_check این برابری را بررسی می‌کند).
+    خروجی: (precomputed هر لحظه برای build_signal_inputs، (adx, di+, di-) هر لحظه برای indicator_snapshot)
+    """
+    precomputed = [{} for _ in views]
+    bars = [v["30m"] for v in views]
+    c, starts = kernels.stack([s.c for s in bars])
+    h, _ = kernels.stack([s.h for s in bars])
+    l, _ = kernels.stack([s.l for s in bars])
+    columns = {f"ema{p}_30m": _last(kernels.ema_batch(c, p, starts)) for p in (8, 21, 50)}
+    columns["rsi_30m"] = _last(kernels.rsi_batch(c, 14, starts))
+    columns["atr_val_30m"] = _last(kernels.atr_batch(h, l, c, 14, starts), 6)
+    for name, values in columns.items():
+        for pre, value in zip(precomputed, values):
+            pre[name] = value
+    adx = [(None, None, None) if len(s) < 28 else row
+           for s, row in zip(bars, zip(*(_last(x, 2) for x in kernels.adx_batch(h, l, c, 14, starts))))]
+
+    # EMA تایم‌فریم‌های بالاتر؛ لحظه‌ای که تایم‌فریم را ندارد به build_signal_inputs سپرده می‌شود
+    for tf, periods in (("1h", (21, 50)), ("4h", (21, 50, 200))):
+        rows = [i for i, v in enumerate(views) if len(v.get(tf, ()))]
+        if not rows:
+            continue
+        c, starts = kernels.stack([views[i][tf].c for i in rows])
+        for p in periods:
+            for i, value in zip(rows, _last(kernels.ema_batch(c, p, starts))):
+                precomputed[i][f"ema{p}_{tf}"] = value
+    return precomputed, adx
+
+def replay_symbol(symbol, start, end, provider=None, data=None):
+    """
+    یک تصمیم به ازای بسته شدن هر کندل 30m در [start, end]؛ همه تایم‌فریم‌ها با AsOfIndex تا همان لحظه برش می‌خورند.
+    اندیکاتورهای وابسته به کل پنجره (الگوها، واگرایی، آمار حجم، Stochastic، SAR) یک بار روی کل سری 30m و با ردیاب افزایشی ساخته می‌شوند،
+    نه با اسکن دوباره پنجره در هر کندل.
+    خروجی: لیست {"t", "direction", "price", "ratio", "status", "passed"} که passed بردار نتیجه قوانین است.
+    """
+    data = data or load_history(symbol, start, end, provider)
+    index = AsOfIndex({tf: c for tf, c in data.items() if len(c)}, lookback_bars())
+    decisions = []
+    # لحظه‌ای که هر تایم‌فریم حداقل یک کندل بسته (و 30m/1h/4h حداقل HISTORY_MIN_BARS) ندارد رد می‌شود
+    min_bars = {**{tf: 1 for tf in TIMEFRAME_DAYS}, **HISTORY_MIN_BARS}
+    steps = list(index.replay("30m", start, end, min_bars))
+    if not steps:
+        return decisions
+    patterns = pattern_series(index.data["30m"].c.tolist())
+    divergences = recent_divergences_series(index.data["30m"])
+    volumes = volume_series(symbol, index.data["30m"])
+    states = state_series(index.data["30m"])
+    precomputed, adx = batch_indicators([view for _, view in steps])
+    for (now, view), values, adx_values in zip(steps, precomputed, adx):
+        pos = index.position("30m", now)
+        values["divergences_30m"] = divergences[pos]
+        values["volume_30m"] = volumes[pos]
+        inputs = build_signal_inputs(view, precomputed=values)
+        snapshot = indicator_snapshot(inputs["candles"], adx=adx_values,
+                                      stochastic=states["stochastic"][pos], sar=states["sar"][pos])
+        snapshot["pullback"] = {d: series[pos] for d, series in patterns["pullback"].items()}
+        snapshot["double_top_bottom"] = patterns["double_top_bottom"][pos]
+        rule_results, passed_weight, total_weight = evaluate_rules(**rule_kwargs(symbol, inputs, snapshot))
+        ratio = passed_weight / total_weight if total_weight else 0.0
+        decision = {
+            "t": now, "direction": inputs["direction"], "price": inputs["price_30m"], "ratio": ratio,
+            "status": "SIGNAL" if ratio >= SIGNAL_THRESHOLD else "NO_SIGNAL",
+            "passed": [r.passed for r in rule_results],
+        }
+        if decision["status"] == "SIGNAL":
+            decision["stop_loss"], decision["take_profit"] = stop_levels(
+                inputs["direction"], ratio, inputs["price_30m"], inputs["atr_val_30m"], inputs["candles"])
+        decisions.append(decision)
+    return decisions
+
+def resolve_signals(decisions, series, position_usd=10.0, cooldown_minutes=DUPLICATE_COOLDOWN_MINUTES,
+                    max_hold_hours=TRACKER_MAX_HOLD_HOURS):
+    """
+    نتیجه سیگنال‌های بازپخش روی کندل‌های 1m (series) مثل ردیاب: اولین لمس SL/TP بعد از لحظه تصمیم،
+    و اگر تا max_hold_hours لمس نشود CLOSED_MANUAL با آخرین close. سیگنال هم‌جهت تا بسته شدن قبلی یا
+    گذشت cooldown_minutes صادر نمی‌شود (مثل emit_signal)؛ سیگنالی که تا انتهای داده باز می‌ماند کنار گذاشته می‌شود.
+    خروجی: لیست {"t", "direction", "status", "exit_t", "pnl"}
+    """
+    trades, last = [], {}   # direction -> (لحظه صدور، لحظه خروج یا None)
+    for d in decisions:
+        if d["status"] != "SIGNAL":
+            continue
+        prev = last.get(d["direction"])
+        if prev and (prev[1] is None or d["t"] < prev[1] or d["t"] - prev[0] < cooldown_minutes * 60):
+            continue
+        hi = int(np.searchsorted(series.t, d["t"] + max_hold_hours * 3600, side="right"))
+        hit = first_exit(series[:hi], d["direction"], d["stop_loss"], d["take_profit"], d["t"])
+        if hit is None and hi < len(series):
+            hit = ("CLOSED_MANUAL", int(series.t[hi - 1]), float(series.c[hi - 1]))
+        last[d["direction"]] = (d["t"], hit[1] if hit else None)
+        if hit is None:
+            continue
+        status, exit_t, exit_price = hit
+        pnl, _, _ = compute_pnl_usd(d["direction"], d["price"], exit_price, position_usd)
+        trades.append({"t": d["t"], "direction": d["direction"], "status": status, "exit_t": exit_t, "pnl": pnl})
+    return trades
+
+def trades_ci(trades):
+    # فاصله اطمینان bootstrap معاملات بک‌تست با روز صدور (تهران) به عنوان بلوک، مثل history_ci
+    days = [datetime.fromtimestamp(t["t"], TEHRAN).strftime("%Y-%m-%d") for t in trades]
+    return bootstrap_metrics([t["pnl"] for t in trades], blocks=days)
+
+if __name__ == "__main__":
+    from log_setup import setup_logging
+
+    setup_logging(log_file=None)
+    symbol = sys.argv[1] if len(sys.argv) > 1 else "BTC-USDT"
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    provider = get_provider()
+    end = provider.now()
+    start = end - days * 86400
+    data = load_history(symbol, start, end, provider)
+    decisions = replay_symbol(symbol, start, end, data=data)
+    signals = [d for d in decisions if d["status"] == "SIGNAL"]
+    logger.info("🔁 بک‌تست %s: %d تصمیم، %d سیگنال (LONG=%d، SHORT=%d)", symbol, len(decisions), len(signals),
+                sum(d["direction"] == "LONG" for d in signals), sum(d["direction"] == "SHORT" for d in signals))
+    trades = resolve_signals(decisions, data["1m"])
+    logger.info("🎯 %d معامله resolve شد (TP=%d، SL=%d، بسته دستی=%d)", len(trades),
+                *(sum(t["status"] == s for t in trades) for s in ("TP_HIT", "STOP_HIT", "CLOSED_MANUAL")))
+    print(format_ci_report(trades_ci(trades), f"📐 فاصله اطمینان بک‌تست {symbol} {days} روز (bootstrap)"))
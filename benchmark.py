@@ -0,0 +1,431 @@
+# benchmark.py - بنچمارک مسیر اسکن و مانیتور شبانه با داده ضبط‌شده (بدون شبکه)
+#
+# اجرا:
+#   python benchmark.py                       # همه مراحل برای 21، 200 و 1000 نماد
+#   python benchmark.py --sizes 21 200 --repeat 5
+#   python benchmark.py --baseline bench_results/baseline.json
+#   python benchmark.py --record              # ضبط داده واقعی KuCoin در فیکسچر
+#
+# اگر فایل فیکسچر وجود نداشته باشد، یک فیکسچر مصنوعی قطعی (seed ثابت) با همان
+# قالب خروجی KuCoin ساخته می‌شود تا نتایج بین اجراها قابل مقایسه باشند.
+# پوشه fixtures/ در git نیست (فیکسچر مصنوعی از seed بازسازی می‌شود)؛ فیلد "source" فیکسچر
+# نشان می‌دهد داده ضبط واقعی (kucoin) است یا مصنوعی (synthetic).
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import market_data
+from data_fetcher import INTERVAL_SECONDS, KUCOIN_MAX_CANDLES
+
+FIXTURE_DIR = "fixtures"
+FIXTURE_PATH = os.path.join(FIXTURE_DIR, "kucoin_klines.json.gz")
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = [21, 200, 1000]
+DEFAULT_MAX_REGRESSION = 1.25  # کندتر شدن بیش از ۲۵٪ نسبت به baseline = رگرسیون
+FIXTURE_SEED = 20260812
+
+# قیمت پایه برای ساخت فیکسچر مصنوعی
+SYNTHETIC_BASE_PRICES = {
+    'XAUT-USDT': 4500.0, 'BTC-USDT': 74000.0, 'ETH-USDT': 2350.0, 'BNB-USDT': 660.0,
+    'SOL-USDT': 180.0, 'XRP-USDT': 2.9, 'ADA-USDT': 0.85, 'DOGE-USDT': 0.21,
+    'DOT-USDT': 4.1, 'POL-USDT': 0.24, 'LTC-USDT': 115.0, 'TRX-USDT': 0.34,
+    'AVAX-USDT': 24.0, 'ATOM-USDT': 4.6, 'XLM-USDT': 0.41, 'NEAR-USDT': 2.7,
+    'APT-USDT': 4.8, 'ARB-USDT': 0.48, 'OP-USDT': 0.72, 'SUI-USDT': 3.6, 'FIL-USDT': 2.5
+}
+
+# ===== فیکسچر =====
+def _synthetic_rows(rng, base_price, interval, count, end_time):
+    # قدم تصادفی با نوسان متغیر؛ خروجی مثل KuCoin جدیدترین کندل اول و همه مقادیر رشته‌ای
+    step = INTERVAL_SECONDS[interval]
+    vol_scale = (step / 60.0) ** 0.5 * 0.0012
+    start = end_time - (count - 1) * step
+    price = base_price
+    rows = []
+    for i in range(count):
+        drift = rng.gauss(0.0, vol_scale)
+        o = price
+        c = max(o * (1.0 + drift), 1e-9)
+        h = max(o, c) * (1.0 + abs(rng.gauss(0.0, vol_scale * 0.5)))
+        l = min(o, c) * (1.0 - abs(rng.gauss(0.0, vol_scale * 0.5)))
+        v = abs(rng.gauss(1000.0, 350.0)) * (step / 60.0)
+        t = start + i * step
+        rows.append([str(t), f"{o:.8g}", f"{c:.8g}", f"{h:.8g}", f"{l:.8g}", f"{v:.6f}", f"{v * c:.6f}"])
+        price = c
+    rows.reverse()
+    return rows
+
+def build_synthetic_fixture():
+    from bot import TIMEFRAME_DAYS, intervals
+    rng = random.Random(FIXTURE_SEED)
+    # زمان ثابت تا فیکسچر بایت‌به‌بایت تکرارپذیر باشد (مرز ۴ ساعته)
+    end_time = 1787300000 - 1787300000 % 14400
+    klines = {}
+    for symbol, base_price in SYNTHETIC_BASE_PRICES.items():
+        klines[symbol] = {}
+        for tf, days in TIMEFRAME_DAYS.items():
+            api_tf = intervals[tf]
+            count = min(days * 86400 // INTERVAL_SECONDS[api_tf], KUCOIN_MAX_CANDLES)
+            klines[symbol][api_tf] = _synthetic_rows(rng, base_price, api_tf, count, end_time)
+    return {"source": "synthetic", "seed": FIXTURE_SEED, "recorded_at": end_time, "klines": klines}
+
+def record_fixture():
+    from bot import TIMEFRAME_DAYS, intervals
+    from config import SYMBOLS
+    from market_data import KucoinProvider, RecordingProvider
+    recorder = RecordingProvider(KucoinProvider(), FIXTURE_PATH)
+    end_time = recorder.now()
+    for symbol in SYMBOLS:
+        for tf, days in TIMEFRAME_DAYS.items():
+            recorder.klines(symbol, intervals[tf], end_time - days * 86400, end_time)
+        print(f"📥 ضبط شد: {symbol}")
+    return recorder.fixture()
+
+def save_fixture(fixture, path=FIXTURE_PATH):
+    market_data.save_fixture(fixture, path)
+
+def load_fixture(path=FIXTURE_PATH):
+    if not os.path.isfile(path):
+        save_fixture(build_synthetic_fixture(), path)
+    return market_data.load_fixture(path)
+
+def scaled_symbols(fixture, size):
+    # نمادهای فیکسچر به صورت چرخشی تکرار می‌شوند تا به تعداد خواسته‌شده برسند
+    base = list(fixture["klines"].keys())
+    return [(base[i % len(base)] if i < len(base) else f"{base[i % len(base)]}#{i}", base[i % len(base)])
+            for i in range(size)]
+
+# ===== اندازه‌گیری =====
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+        "repeat": repeat,
+        "alloc_peak_bytes": alloc_peak,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+@contextlib.contextmanager
+def sandbox():
+    # همه نوشتن‌ها به پوشه موقت، بدون شبکه و تلگرام و بدون وابستگی به ساعت/شمارنده روزانه/ایندکس سیگنال تکراری
+    import rules
+    import signal_store
+    import monitor_nightly
+
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    saved = {
+        (signal_store, "SIGNALS_DIR"): signal_store.SIGNALS_DIR,
+        (monitor_nightly, "SIGNALS_DIR"): monitor_nightly.SIGNALS_DIR,
+        (rules, "TELEGRAM_BOT_TOKEN"): rules.TELEGRAM_BOT_TOKEN,
+        (monitor_nightly, "TELEGRAM_BOT_TOKEN"): monitor_nightly.TELEGRAM_BOT_TOKEN,
+        (rules, "is_forbidden_hour"): rules.is_forbidden_hour,
+        (rules, "duplicate_signal_of"): rules.duplicate_signal_of,
+        (rules, "MAX_DAILY_SIGNALS"): rules.MAX_DAILY_SIGNALS,
+        (monitor_nightly, "fetch_kucoin_1m"): monitor_nightly.fetch_kucoin_1m,
+        (market_data, "_provider"): market_data._provider,
+    }
+    signal_store.SIGNALS_DIR = os.path.join(tmp, "signals")
+    monitor_nightly.SIGNALS_DIR = signal_store.SIGNALS_DIR
+    rules.TELEGRAM_BOT_TOKEN = None
+    monitor_nightly.TELEGRAM_BOT_TOKEN = None
+    rules.is_forbidden_hour = lambda: False
+    rules.duplicate_signal_of = lambda symbol, direction: None
+    rules.MAX_DAILY_SIGNALS = float("inf")
+
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    try:
+        yield tmp
+    finally:
+        for (module, name), value in saved.items():
+            setattr(module, name, value)
+        root.handlers, root.level = saved_handlers, saved_level
+        devnull.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+# ===== مراحل =====
+def _indicator_calls():
+    import indicators as ind
+    return {
+        "ema_series": lambda d, cl: ind.ema_series(cl, 21),
+        "calculate_ema": lambda d, cl: ind.calculate_ema(cl, 50),
+        "calculate_rsi": lambda d, cl: ind.calculate_rsi(cl),
+        "calculate_macd": lambda d, cl: ind.calculate_macd(cl),
+        "calculate_atr": lambda d, cl: ind.calculate_atr(d),
+        "body_strength": lambda d, cl: ind.body_strength(d[-1]),
+        "calculate_adx": lambda d, cl: ind.calculate_adx(d),
+        "calculate_swing_low": lambda d, cl: ind.calculate_swing_low(d),
+        "calculate_swing_high": lambda d, cl: ind.calculate_swing_high(d),
+        "calculate_cci": lambda d, cl: ind.calculate_cci(d),
+        "calculate_sar": lambda d, cl: ind.calculate_sar(d),
+        "calculate_stochastic": lambda d, cl: ind.calculate_stochastic(d),
+    }
+
+def _write_open_signals(path, symbols, data_by_symbol, date_str):
+    from monitor_nightly import CSV_HEADERS
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tz = ZoneInfo("Asia/Tehran")
+    with open(path, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
+        writer.writeheader()
+        for i, (symbol, base) in enumerate(symbols):
+            first = data_by_symbol[base]["1m"][0]
+            entry = first['c']
+            direction = "LONG" if i % 2 == 0 else "SHORT"
+            sign = 1 if direction == "LONG" else -1
+            writer.writerow({
+                "symbol": symbol, "direction": direction, "risk_level": "MEDIUM",
+                "entry_price": f"{entry:.8f}",
+                "stop_loss": f"{entry * (1 - sign * 0.01):.8f}",
+                "take_profit": f"{entry * (1 + sign * 0.02):.8f}",
+                "issued_at_tehran": datetime.fromtimestamp(first['t'], tz).strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "OPEN", "hit_time_tehran": "", "hit_price": "", "broker_fee": "",
+                "final_pnl_usd": "", "position_size_usd": "10.00", "return_pct": "",
+                "signal_source": "bench",
+            })
+
+def _response_body(rows):
+    return json.dumps({"code": "200000", "data": rows}, separators=(",", ":")).encode("utf-8")
+
+def _legacy_parse(body):
+    # مسیر قبلی (json + تبدیل تک‌تک مقادیر به دیکشنری) فقط به عنوان مرجع مقایسه
+    rows = json.loads(body).get("data", [])
+    candles = [{'t': int(c[0]), 'o': float(c[1]), 'c': float(c[2]),
+                'h': float(c[3]), 'l': float(c[4]), 'v': float(c[5])} for c in rows]
+    return list(reversed(candles))
+
+def run_parse_micro(fixture, repeat, candles_per_response=1500, responses=50):
+    # زمان پارس یک پاسخ ۱۵۰۰ کندلی: مسیر قبلی در برابر parse_klines_body
+    # (نسبت به دیکودر بستگی دارد؛ بدون orjson مسیر جدید با json استاندارد اجرا می‌شود)
+    from data_fetcher import parse_klines_body, _json_loads
+    rows = next(iter(fixture["klines"].values()))["1min"]
+    rows = (rows * (candles_per_response // len(rows) + 1))[:candles_per_response]
+    body = _response_body(rows)
+    legacy = measure(lambda: [_legacy_parse(body) for _ in range(responses)], repeat)
+    fast = measure(lambda: [parse_klines_body(body) for _ in range(responses)], repeat)
+    for res in (legacy, fast):
+        res["per_response_ms"] = res["median_s"] / responses * 1000.0
+    return {"legacy": legacy, "fast": fast, "speedup": legacy["median_s"] / fast["median_s"],
+            "decoder": _json_loads.__module__}
+
+def run_size(fixture, size, repeat):
+    import backtest
+    import bot
+    import kernels
+    import rules
+    import monitor_nightly
+    import outcome_tracker
+    from data_fetcher import parse_klines_body
+    from integrity import check_series
+    from signal_store import compose_signal_source
+    from candles import closes as series_closes
+
+    symbols = scaled_symbols(fixture, size)
+    raw = fixture["klines"]
+    tf_by_api = {v: k for k, v in bot.intervals.items()}
+    replay = market_data.ReplayProvider(fixture)
+    market_data.set_provider(replay)
+
+    parsed = {base: {tf_by_api[api_tf]: replay.series(base, api_tf) for api_tf in tfs}
+              for base, tfs in raw.items()}
+    inputs = {base: bot.build_signal_inputs(d) for base, d in parsed.items()}
+    rule_kwargs = {base: backtest.rule_kwargs(base, inp) for base, inp in inputs.items()}
+    closes = {base: {tf: series_closes(series) for tf, series in d.items()} for base, d in parsed.items()}
+    bodies = {base: [_response_body(rows) for rows in tfs.values()] for base, tfs in raw.items()}
+
+    stages = {}
+
+    def stage_parse():
+        for _, base in symbols:
+            for body in bodies[base]:
+                parse_klines_body(body)
+    stages["parse_klines"] = measure(stage_parse, repeat)
+
+    def stage_integrity():
+        for _, base in symbols:
+            for tf, series in parsed[base].items():
+                check_series(series, bot.intervals[tf], replay.now())
+    stages["check_series"] = measure(stage_integrity, repeat)
+
+    for name, call in _indicator_calls().items():
+        def stage_indicator(call=call):
+            for _, base in symbols:
+                call(parsed[base]["30m"], closes[base]["30m"])
+        stages[f"indicators.{name}"] = measure(stage_indicator, repeat)
+
+    def stage_rules():
+        for symbol, base in symbols:
+            kwargs = dict(rule_kwargs[base], symbol=symbol)
+            rules.evaluate_rules(**kwargs)
+    stages["evaluate_rules"] = measure(stage_rules, repeat)
+
+    # هزینه اضافه هر پروفایل سایه: فقط قوانین روی snapshot اندیکاتور مشترک
+    snapshots = {base: rules.indicator_snapshot(kw["candles"]) for base, kw in rule_kwargs.items()}
+
+    def stage_rules_shadow():
+        for symbol, base in symbols:
+            rules.evaluate_rules(**dict(rule_kwargs[base], symbol=symbol, snapshot=snapshots[base]))
+    stages["evaluate_rules.shadow"] = measure(stage_rules_shadow, repeat)
+
+    # هسته‌های دسته‌ای kernels.py: EMA/RSI/ATR/ADX همه نمادها در یک فراخوانی، مرجع numpy در برابر backend فعال
+    kernels.warmup()
+    c30, starts30 = kernels.stack([parsed[base]["30m"].c for _, base in symbols])
+    h30, _ = kernels.stack([parsed[base]["30m"].h for _, base in symbols])
+    l30, _ = kernels.stack([parsed[base]["30m"].l for _, base in symbols])
+
+    def stage_kernels(backend_name):
+        kernels.ema_batch(c30, 21, starts30, backend_name)
+        kernels.rsi_batch(c30, 14, starts30, backend_name)
+        kernels.atr_batch(h30, l30, c30, 14, starts30, backend_name)
+        kernels.adx_batch(h30, l30, c30, 14, starts30, backend_name)
+    stages["kernels.numpy"] = measure(lambda: stage_kernels("numpy"), repeat)
+    if kernels.backend() != "numpy":
+        stages[f"kernels.{kernels.backend()}"] = measure(lambda: stage_kernels(None), repeat)
+
+    def stage_process():
+        async def run():
+            for idx, (symbol, base) in enumerate(symbols, 1):
+                rules._daily_signal_count = 0
+                await bot.process_symbol(symbol, parsed[base], idx, size)
+        asyncio.run(run())
+    stages["process_symbol"] = measure(stage_process, repeat)
+
+    def stage_compose():
+        for _, base in symbols:
+            check = {"passed_rules": ["trend_4h", "trend_1h", "rsi"], "reasons": ["bench"]}
+            compose_signal_source(check, {"closes": closes[base], "data": parsed[base]}, "LONG")
+    stages["compose_signal_source"] = measure(stage_compose, repeat)
+
+    date_str = monitor_nightly.tehran_now().strftime("%Y-%m-%d")
+    # نمادهای تکراری (#i) همان داده نماد پایه را از منبع replay می‌گیرند
+    monitor_nightly.fetch_kucoin_1m = lambda symbol, start, end: replay.klines(symbol.split("#")[0], "1min", start, end)
+
+    def stage_update():
+        if os.path.exists(outcome_tracker.state_path()):
+            os.remove(outcome_tracker.state_path())
+        _write_open_signals(monitor_nightly.daily_csv_path(date_str), symbols, parsed, date_str)
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor_nightly.update_csv_rows(date_str)
+    stages["update_csv_rows"] = measure(stage_update, repeat)
+
+    for result in stages.values():
+        result["per_symbol_ms"] = result["median_s"] / size * 1000.0
+    return stages
+
+def run(sizes, repeat, fixture_path=FIXTURE_PATH):
+    fixture = load_fixture(fixture_path)
+    results = {
+        "created_at": datetime.now(ZoneInfo("UTC")).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixture": {"path": fixture_path, "source": fixture.get("source"), "recorded_at": fixture.get("recorded_at")},
+        "sizes": {},
+    }
+    with sandbox():
+        results["parse_1500"] = run_parse_micro(fixture, repeat)
+        for size in sizes:
+            print(f"⏱️ اجرای بنچمارک برای {size} نماد ...")
+            results["sizes"][str(size)] = run_size(fixture, size, repeat)
+    return results
+
+def compare(results, baseline, max_regression=DEFAULT_MAX_REGRESSION):
+    # فهرست مراحلی که زمان میانه آن‌ها بیش از حد مجاز نسبت به baseline بیشتر شده
+    regressions = []
+    for size, stages in results["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size, {})
+        for stage, res in stages.items():
+            base = base_stages.get(stage)
+            if not base or base["median_s"] <= 0:
+                continue
+            ratio = res["median_s"] / base["median_s"]
+            res["baseline_ratio"] = round(ratio, 3)
+            if ratio > max_regression:
+                regressions.append((size, stage, ratio))
+    return regressions
+
+def print_table(results):
+    micro = results.get("parse_1500")
+    if micro:
+        print(f"\nپارس پاسخ ۱۵۰۰ کندلی: قبلی={micro['legacy']['per_response_ms']:.3f}ms | "
+              f"جدید={micro['fast']['per_response_ms']:.3f}ms | {micro['speedup']:.1f}x ({micro['decoder']})")
+    for size, stages in results["sizes"].items():
+        print(f"\n=== {size} نماد ===")
+        print(f"{'stage':<34}{'median ms':>12}{'per sym ms':>12}{'alloc KB':>12}{'rss MB':>9}{'vs base':>9}")
+        for stage, res in stages.items():
+            ratio = res.get("baseline_ratio")
+            print(f"{stage:<34}{res['median_s'] * 1000:>12.2f}{res['per_symbol_ms']:>12.4f}"
+                  f"{res['alloc_peak_bytes'] / 1024:>12.1f}{res['peak_rss_kb'] / 1024:>9.1f}"
+                  f"{(f'{ratio:.2f}x' if ratio else '-'):>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="بنچمارک مسیر اسکن و مانیتور شبانه")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    parser.add_argument("--record", action="store_true", help="ضبط داده زنده KuCoin در فایل فیکسچر")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        save_fixture(record_fixture(), args.fixture)
+        print(f"✅ فیکسچر ذخیره شد: {args.fixture}")
+        return 0
+
+    results = run(args.sizes, args.repeat, args.fixture)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_table(results)
+    print(f"\n💾 نتایج ذخیره شد: {args.output}")
+
+    if regressions:
+        print("\n❌ رگرسیون نسبت به baseline:")
+        for size, stage, ratio in regressions:
+            print(f"   {size} نماد | {stage}: {ratio:.2f}x")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
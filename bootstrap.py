@@ -0,0 +1,109 @@
+# bootstrap.py - فاصله اطمینان bootstrap برای نرخ برد، امید ریاضی و بیشترین افت سرمایه
+#
+# اجرا:
+#   python bootstrap.py                 # ۹۰ روز تا امروز از داده فشرده قوانین (signals/*.rules.json)
+#   python bootstrap.py 2026-10-01 30
+
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import BOOTSTRAP_SAMPLES, BOOTSTRAP_ALPHA, BOOTSTRAP_SEED
+
+# حداکثر تعداد عنصر ماتریس نمونه‌ها در هر تکه (کنترل حافظه برای تاریخچه طولانی)
+_CHUNK_ELEMENTS = 4_000_000
+
+def max_drawdown(cum):
+    # بیشترین افت (منفی یا صفر) هر سطر یک ماتریس سود تجمعی، نسبت به سقف قبلی (سرمایه اولیه = 0)
+    peak = np.maximum.accumulate(np.maximum(cum, 0.0), axis=-1)
+    return (cum - peak).min(axis=-1)
+
+def _block_matrix(blocks, n):
+    # ایندکس اعضای هر بلوک به ترتیب سری، در ماتریس (تعداد بلوک × بزرگ‌ترین بلوک) با -1 برای جای خالی
+    if blocks is None:
+        return np.arange(n).reshape(n, 1)
+    _, labels = np.unique(np.asarray(blocks), return_inverse=True)
+    sizes = np.bincount(labels)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.arange(n) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    matrix = np.full((len(sizes), sizes.max()), -1)
+    matrix[labels[order], offsets] = order
+    return matrix
+
+def bootstrap_metrics(pnl, wins=None, blocks=None, n_boot=BOOTSTRAP_SAMPLES, alpha=BOOTSTRAP_ALPHA,
+                      seed=BOOTSTRAP_SEED):
+    """
+    نمونه‌گیری مجدد با جایگذاری از نتایج سیگنال‌ها (n_boot بار، همه با یک ماتریس ایندکس numpy):
+    win_rate، expectancy (میانگین PNL هر سیگنال) و max_drawdown (روی ترتیب تصادفی نمونه = Monte Carlo ترتیب معاملات).
+    blocks: برچسب خوشه هر سیگنال (مثلاً روز صدور)؛ خوشه‌ها کامل و با ترتیب داخلی خود نمونه‌گیری می‌شوند
+    تا زیان‌های همزمان (یک روز روند) از هم جدا نشوند و افت سرمایه کم‌برآورد نشود. None = هر سیگنال جدا (i.i.d.).
+    خروجی برای هر معیار: {"point", "low", "high"} با فاصله صدکی (1 - alpha).
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    wins = pnl > 0 if wins is None else np.asarray(wins, dtype=bool)
+    n = len(pnl)
+    result = {"n": n, "samples": n_boot, "alpha": alpha}
+    if n == 0:
+        return result
+
+    matrix = _block_matrix(blocks, n)
+    result["blocks"] = len(matrix)
+    # جای خالی بلوک‌ها PNL صفر دارد (سود تجمعی و افت را تغییر نمی‌دهد) و در شمارش نمی‌آید
+    pnl_pad, wins_pad = np.append(pnl, 0.0), np.append(wins, False)
+    n_blocks, width = matrix.shape
+    rng = np.random.default_rng(seed)
+    rows = max(1, _CHUNK_ELEMENTS // (n_blocks * width))
+    win_rate, expectancy, drawdown = [], [], []
+    for start in range(0, n_boot, rows):
+        idx = matrix[rng.integers(0, n_blocks, size=(min(rows, n_boot - start), n_blocks))]
+        idx = idx.reshape(len(idx), -1)
+        count = (idx >= 0).sum(axis=1)
+        sample = pnl_pad[idx]
+        win_rate.append(wins_pad[idx].sum(axis=1) / count)
+        expectancy.append(sample.sum(axis=1) / count)
+        drawdown.append(max_drawdown(np.cumsum(sample, axis=1)))
+
+    q = [alpha / 2 * 100, (1 - alpha / 2) * 100]
+    points = {
+        "win_rate": wins.mean(),
+        "expectancy": pnl.mean(),
+        "max_drawdown": max_drawdown(np.cumsum(pnl)),
+    }
+    for name, values in (("win_rate", win_rate), ("expectancy", expectancy), ("max_drawdown", drawdown)):
+        low, high = np.percentile(np.concatenate(values), q)
+        result[name] = {"point": float(points[name]), "low": float(low), "high": float(high)}
+    return result
+
+def format_ci_report(ci, title="📐 فاصله اطمینان (bootstrap)"):
+    if not ci.get("n"):
+        return f"{title}: سیگنال resolve شده‌ای برای نمونه‌گیری وجود ندارد."
+    level = (1 - ci["alpha"]) * 100
+    wr, ex, dd = ci["win_rate"], ci["expectancy"], ci["max_drawdown"]
+    return "\n".join([
+        f"{title} — {ci['n']} سیگنال در {ci['blocks']} بلوک، {ci['samples']} نمونه، سطح {level:.0f}%",
+        f"   - نرخ برد: {wr['point'] * 100:.1f}% [{wr['low'] * 100:.1f}% .. {wr['high'] * 100:.1f}%]",
+        f"   - امید ریاضی هر سیگنال: {ex['point']:+.3f} [{ex['low']:+.3f} .. {ex['high']:+.3f}] USD",
+        f"   - بیشترین افت: {dd['point']:.2f} [{dd['low']:.2f} .. {dd['high']:.2f}] USD",
+    ])
+
+def history_ci(end_date_str, days):
+    # فاصله اطمینان سیگنال‌های resolve شده [end - days + 1, end] از داده فشرده قوانین، با روز صدور به عنوان بلوک
+    from rule_analytics import load_daily_rules
+    end = datetime.strptime(end_date_str, "%Y-%m-%d")
+    pnl, wins, blocks = [], [], []
+    for i in range(days - 1, -1, -1):
+        daily = load_daily_rules((end - timedelta(days=i)).strftime("%Y-%m-%d")) or []
+        pnl.extend(s["pnl"] for s in daily)
+        wins.extend(s["win"] for s in daily)
+        blocks.extend([i] * len(daily))
+    return bootstrap_metrics(np.array(pnl, dtype=np.float64), np.array(wins, dtype=bool), blocks)
+
+def generate_ci_report(end_date_str, days=90):
+    return format_ci_report(history_ci(end_date_str, days), f"📐 فاصله اطمینان {days} روز اخیر (bootstrap)")
+
+if __name__ == "__main__":
+    import signal_store
+    end_date = sys.argv[1] if len(sys.argv) > 1 else signal_store.tehran_date_str()
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    print(generate_ci_report(end_date, days))
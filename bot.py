@@ -1,28 +1,31 @@
-# bot.py - بدون تغییر (همان نسخه قبلی با 4h=45 روز)
+# bot.py - اسکن چند تایم‌فریمی نمادها (4h=100 روز)
 
 import aiohttp
 import asyncio
 import logging
-import sys
-from datetime import datetime
-from zoneinfo import ZoneInfo
 
-from config import SYMBOLS
-from indicators import calculate_rsi, calculate_ema, calculate_macd, calculate_atr
-from rules import generate_signal
-
-# ========== تنظیمات لاگ ==========
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot_log.txt", encoding="utf-8"),
-        logging.StreamHandler(sys.stdout)
-    ]
+from config import (
+    SYMBOLS, HISTORY_MIN_COMPLETENESS, HISTORY_MIN_BARS, PREFILTER_ENABLED,
+    SCHEDULER_ENABLED, SCHEDULER_REQUEST_BUDGET, CORRELATION_ENABLED
 )
-logger = logging.getLogger(__name__)
+from indicators import calculate_rsi, calculate_ema, calculate_macd, calculate_atr
+from rules import evaluate_signal, emit_signal, indicator_snapshot
+from data_fetcher import RateLimiter, check_completeness, history_chunks
+from market_data import get_provider
+from scan_state import ScanState
+from prefilter import prefilter_symbols
+from scheduler import plan_scan
+from correlation import RollingCorrelation, select_per_cluster
+from profiles import ShadowRecorder
+from candles import closes
+from asof import closed_bars
+from integrity import validate_series
+from divergence import recent_divergences, opposing_divergence
+from volume_stats import volume_snapshot
+from metrics import run_metrics, span, incr
+from log_setup import setup_logging
 
-KUCOIN_URL = "https://api.kucoin.com/api/v1/market/candles"
+logger = logging.getLogger(__name__)
 
 intervals = {
     "1m": "1min",
@@ -33,51 +36,64 @@ intervals = {
     "4h": "4hour"
 }
 
-async def fetch_timeframe(session, symbol, tf, days):
+async def fetch_timeframe(session, symbol, tf, days, limiter):
     api_tf = intervals[tf]
-    end_time = int(datetime.utcnow().timestamp())
+    provider = get_provider()
+    end_time = provider.now()
     start_time = end_time - days * 24 * 3600
-    params = {"symbol": symbol, "type": api_tf, "startAt": start_time, "endAt": end_time}
     try:
-        async with session.get(KUCOIN_URL, params=params, timeout=30) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                candles_raw = data.get("data", [])
-                parsed = [
-                    {'t': int(c[0]), 'o': float(c[1]), 'c': float(c[2]),
-                     'h': float(c[3]), 'l': float(c[4]), 'v': float(c[5])}
-                    for c in candles_raw
-                ]
-                return tf, list(reversed(parsed))
-            else:
-                logger.warning(f"خطای HTTP {resp.status} برای {symbol} {tf}")
-                return tf, []
+        candles = await provider.klines_async(session, symbol, api_tf, start_time, end_time, limiter)
     except Exception as e:
-        logger.error(f"خطا در دریافت {symbol} {tf}: {e}")
+        incr("http_errors")
+        logger.error("خطا در دریافت %s %s: %s", symbol, tf, e)
         return tf, []
+    candles, _ = validate_series(candles, symbol, api_tf, now=end_time)
+
+    # بررسی کامل بودن داده قبل از محاسبه اندیکاتورها
+    completeness = check_completeness(candles, start_time, end_time, api_tf)
+    if completeness < HISTORY_MIN_COMPLETENESS:
+        incr("incomplete_series")
+        logger.warning("⚠️ داده ناقص %s %s: %d کندل (%.0f%% بازه)", symbol, tf, len(candles), completeness * 100)
+    if len(candles) < HISTORY_MIN_BARS.get(tf, 1):
+        logger.warning("⚠️ کندل کافی برای %s %s نیست (%d < %d)", symbol, tf, len(candles), HISTORY_MIN_BARS.get(tf, 1))
+        return tf, []
+    return tf, candles
+
+# بازه دریافت داده (روز) برای هر تایم‌فریم؛ 4h با ۱۰۰ روز (۶۰۰ کندل) تا EMA200 گرم شود
+TIMEFRAME_DAYS = {
+    "1m": 1,
+    "5m": 3,
+    "15m": 5,
+    "30m": 7,
+    "1h": 14,
+    "4h": 100
+}
+
+def requests_per_symbol():
+    # تعداد درخواست کندل برای اسکن کامل یک نماد (همه تایم‌فریم‌ها و تکه‌ها)
+    return sum(len(history_chunks(0, days * 86400, intervals[tf])) for tf, days in TIMEFRAME_DAYS.items())
 
-async def fetch_all_timeframes(session, symbol):
-    settings = {
-        "1m": 1,
-        "5m": 3,
-        "15m": 5,
-        "30m": 7,
-        "1h": 14,
-        "4h": 45
-    }
-    tasks = [fetch_timeframe(session, symbol, tf, days) for tf, days in settings.items()]
+async def fetch_all_timeframes(session, symbol, limiter):
+    tasks = [fetch_timeframe(session, symbol, tf, days, limiter) for tf, days in TIMEFRAME_DAYS.items()]
     results = await asyncio.gather(*tasks)
-    return {tf: candles for tf, candles in results if candles}
+    # کندل در حال شکل‌گیری هر تایم‌فریم حذف می‌شود تا همه تایم‌فریم‌ها به یک لحظه (آخرین کندل بسته) هم‌تراز باشند
+    return closed_bars({tf: candles for tf, candles in results if len(candles)}, get_provider().now())
 
-async def process_symbol(symbol, data, index, total):
-    if not data or "30m" not in data:
-        logger.info(f"[{index}/{total}] {symbol} — ❌ داده کافی نیست")
-        return
+def build_signal_inputs(data, live_price=None, precomputed=None):
+    # محاسبه ورودی‌های generate_signal از داده چند تایم‌فریمی یک نماد
+    # live_price: قیمت لحظه‌ای از snapshot تیکرها (به جای close کندل 30m که ممکن است کهنه باشد)
+    # precomputed: مقادیر EMA/RSI/ATR از پیش محاسبه‌شده (بک‌تست با هسته‌های دسته‌ای kernels.py) و
+    # "divergences_30m"/"volume_30m" به شکل recent_divergences/volume_snapshot (بک‌تست با PivotTracker و
+    # VolumeStatsRegistry)؛ کلید غایب محاسبه می‌شود
+    precomputed = precomputed or {}
+
+    def value(name, compute):
+        return precomputed[name] if name in precomputed else compute()
 
-    closes_30 = [c['c'] for c in data["30m"]]
-    ema21_30m = calculate_ema(closes_30, 21)
-    ema50_30m = calculate_ema(closes_30, 50)
-    ema8_30m = calculate_ema(closes_30, 8)
+    closes_30 = closes(data["30m"])
+    ema21_30m = value("ema21_30m", lambda: calculate_ema(closes_30, 21))
+    ema50_30m = value("ema50_30m", lambda: calculate_ema(closes_30, 50))
+    ema8_30m = value("ema8_30m", lambda: calculate_ema(closes_30, 8))
 
     candle_1m = data.get("1m", [{}])[-1]
     open_1m = candle_1m.get("o")
@@ -91,24 +107,26 @@ async def process_symbol(symbol, data, index, total):
     high_5m = candle_5m.get("h")
     low_5m = candle_5m.get("l")
 
-    closes_1h = [c['c'] for c in data.get("1h", [])]
-    ema21_1h = calculate_ema(closes_1h, 21) if closes_1h else None
-    ema50_1h = calculate_ema(closes_1h, 50) if closes_1h else None
+    closes_1h = closes(data.get("1h", []))
+    ema21_1h = value("ema21_1h", lambda: calculate_ema(closes_1h, 21) if closes_1h else None)
+    ema50_1h = value("ema50_1h", lambda: calculate_ema(closes_1h, 50) if closes_1h else None)
 
-    closes_4h = [c['c'] for c in data.get("4h", [])]
-    ema21_4h = calculate_ema(closes_4h, 21) if closes_4h else None
-    ema50_4h = calculate_ema(closes_4h, 50) if closes_4h else None
-    ema200_4h = calculate_ema(closes_4h, 200) if closes_4h else None
+    closes_4h = closes(data.get("4h", []))
+    ema21_4h = value("ema21_4h", lambda: calculate_ema(closes_4h, 21) if closes_4h else None)
+    ema50_4h = value("ema50_4h", lambda: calculate_ema(closes_4h, 50) if closes_4h else None)
+    ema200_4h = value("ema200_4h", lambda: calculate_ema(closes_4h, 200) if closes_4h else None)
 
     macd_30m = calculate_macd(closes_30)
-    rsi_30m = calculate_rsi(closes_30)
-    atr_30m = calculate_atr(data["30m"]) if "30m" in data else None
+    rsi_30m = value("rsi_30m", lambda: calculate_rsi(closes_30))
+    atr_30m = value("atr_val_30m", lambda: calculate_atr(data["30m"]) if "30m" in data else None)
 
-    price_30m = closes_30[-1]
+    price_30m = live_price or closes_30[-1]
+    direction = "LONG" if ema21_30m > ema50_30m else "SHORT"
+    volume_30m = value("volume_30m", lambda: volume_snapshot(data["30m"]))
+    divergences_30m = value("divergences_30m", lambda: recent_divergences(data["30m"]))
 
-    signal = await generate_signal(
-        symbol=symbol,
-        direction="LONG" if ema21_30m > ema50_30m else "SHORT",
+    return dict(
+        direction=direction,
         prefer_risk="MEDIUM",
         price_30m=price_30m,
         open_15m=data.get("15m", [{}])[-1].get("o", price_30m),
@@ -125,24 +143,118 @@ async def process_symbol(symbol, data, index, total):
         rsi_30m=rsi_30m,
         atr_val_30m=atr_30m or 0.0,
         curr_vol=data["30m"][-1].get("v", 0.0),
-        avg_vol_30m=0.0,
-        divergence_detected=False,
+        avg_vol_30m=volume_30m["mean"] if volume_30m else 0.0,
+        divergence_detected=opposing_divergence(divergences_30m, direction),
         candles=data["30m"],
         prices_series_30m=closes_30[-120:],
         closes_by_tf=data
     )
 
+def record_scan_state(state, symbol, inputs, signal):
+    price = inputs["price_30m"]
+    ema21, ema50 = inputs["ema21_30m"], inputs["ema50_30m"]
+    total_weight = (signal or {}).get("total_weight") or 0
+    state.record_scan(
+        symbol, price=price,
+        ema_spread=abs(ema21 - ema50) / price if price and ema21 is not None and ema50 is not None else None,
+        ratio=signal["passed_weight"] / total_weight if total_weight else None,
+        atr_pct=inputs["atr_val_30m"] / price if price else None,
+        adx=(signal or {}).get("adx"), now=get_provider().now(),
+    )
+
+def evaluate_symbol(symbol, data, index, total, live_price=None, state=None, shadow=None):
+    # ارزیابی بدون صدور؛ None اگر داده کافی نباشد
+    # shadow: ShadowRecorder؛ پروفایل‌های سایه با همان ورودی و snapshot اندیکاتور ارزیابی می‌شوند
+    if not data or "30m" not in data:
+        logger.info("[%d/%d] %s — ❌ داده کافی نیست", index, total, symbol)
+        return None
+
+    with span("indicators", symbol=symbol):
+        inputs = build_signal_inputs(data, live_price)
+        snapshot = indicator_snapshot(inputs["candles"])
+    signal = evaluate_signal(symbol=symbol, snapshot=snapshot, **inputs)
+    if shadow:
+        shadow.evaluate(symbol, inputs, snapshot, primary=signal)
+    if state is not None:
+        record_scan_state(state, symbol, inputs, signal)
+    return signal
+
+async def emit_and_log(signal):
+    signal = await emit_signal(signal)
     if signal and signal.get("status") == "SIGNAL":
-        logger.info(f"✅ سیگنال {symbol}: {signal['direction']} | قیمت={signal['price']:.4f}")
+        logger.info("✅ سیگنال %s: %s | قیمت=%.4f", signal['symbol'], signal['direction'], signal['price'])
     else:
-        logger.info(f"📭 بدون سیگنال معتبر برای {symbol}")
+        logger.debug("📭 بدون سیگنال معتبر برای %s", signal['symbol'])
+    return signal
+
+async def process_symbol(symbol, data, index, total, live_price=None, state=None):
+    # ارزیابی و صدور یک نماد به صورت مستقل
+    signal = evaluate_symbol(symbol, data, index, total, live_price, state)
+    if signal is not None:
+        await emit_and_log(signal)
+
+def dedupe_correlated(candidates, data_by_symbol, now):
+    """
+    به‌روزرسانی افزایشی همبستگی با کندل‌های 30m همین اسکن و حفظ فقط قوی‌ترین سیگنال هر (خوشه، جهت).
+    """
+    engine = RollingCorrelation.load()
+    added = engine.update({sym: data["30m"] for sym, data in data_by_symbol.items() if data and "30m" in data}, now)
+    candidates = select_per_cluster(candidates, engine.clusters())
+    engine.save()
+    suppressed = sum(1 for c in candidates if c.get("suppressed_by"))
+    incr("signals_clustered", suppressed)
+    logger.info("🔗 همبستگی: %d کندل جدید، %d نماد؛ %d سیگنال هم‌خوشه حذف شد",
+                added, len(engine.symbols), suppressed)
+    return candidates
 
 async def main_async():
+    run_metrics.reset()
+    limiter = RateLimiter()
+    state = ScanState.load()
+    shadow = ShadowRecorder()
+    provider = get_provider()
     async with aiohttp.ClientSession() as session:
-        tasks = [fetch_all_timeframes(session, sym) for sym in SYMBOLS]
-        results = await asyncio.gather(*tasks)
-        for idx, data in enumerate(results, 1):
-            await process_symbol(SYMBOLS[idx-1], data, idx, len(SYMBOLS))
+        symbols, tickers = list(SYMBOLS), {}
+        if PREFILTER_ENABLED:
+            # یک درخواست allTickers؛ نمادهای بدون تغییر و دور از سیگنال کندل دریافت نمی‌کنند
+            with span("prefilter"):
+                tickers = await provider.tickers_async(session, limiter)
+                symbols, skipped = prefilter_symbols(SYMBOLS, tickers, state, provider.now())
+            for sym in skipped:
+                state.record_skip(sym)
+            incr("symbols_skipped", len(skipped))
+            logger.info("🔎 پیش‌فیلتر: %d نماد اسکن کامل، %d نماد رد شد (قیمت لحظه‌ای: %d نماد)",
+                        len(symbols), len(skipped), len(tickers))
+        if SCHEDULER_ENABLED:
+            # نمادهای داغ هر اجرا، بقیه با فاصله tier خود و همه در سقف بودجه درخواست
+            with span("schedule"):
+                symbols, deferred = plan_scan(symbols, state, SCHEDULER_REQUEST_BUDGET, requests_per_symbol(),
+                                              provider.now())
+            incr("symbols_deferred", len(deferred))
+            logger.info("🗓️ زمان‌بندی: %d نماد در این اجرا، %d نماد به اجراهای بعد موکول شد",
+                        len(symbols), len(deferred))
+        with span("fetch_all"):
+            tasks = [fetch_all_timeframes(session, sym, limiter) for sym in symbols]
+            results = await asyncio.gather(*tasks)
+        with span("process_all"):
+            candidates = []
+            for idx, (sym, data) in enumerate(zip(symbols, results), 1):
+                signal = evaluate_symbol(sym, data, idx, len(symbols), tickers.get(sym), state, shadow)
+                if signal is not None:
+                    candidates.append(signal)
+        if CORRELATION_ENABLED:
+            # روز روند: سیگنال هم‌جهت چند نماد همبسته عملاً یک معامله است و سهمیه روزانه را هدر می‌دهد
+            with span("correlation"):
+                candidates = dedupe_correlated(candidates, dict(zip(symbols, results)), provider.now())
+        with span("emit_all"):
+            for signal in candidates:
+                await emit_and_log(signal)
+    shadow.flush()
+    state.save()
+    provider.close()
+    path = run_metrics.write_report("scan")
+    logger.info("⏱️ گزارش زمان‌بندی اجرا ذخیره شد: %s", path)
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main_async())
@@ -0,0 +1,155 @@
+# candle_archive.py - آرشیو چندساله کندل روی دیسک با memory mapping برای بک‌تست
+#
+# ساختار برای هر (symbol, interval) در CANDLE_ARCHIVE_DIR/<symbol>/:
+#   <interval>.ohlcv   ردیف‌های float64 با عرض ثابت (t, o, c, h, l, v)
+#   <interval>.t       ایندکس زمان int64 پیوسته برای searchsorted (فقط log n صفحه خوانده می‌شود)
+#   <interval>.meta    {"rows": تعداد ردیف commit شده, ...} — با جایگزینی اتمیک نوشته می‌شود
+#
+# اجرا:
+#   python candle_archive.py BTC-USDT 1min 365     # پر کردن آرشیو از منبع داده فعلی (market_data)
+
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from candles import CandleSeries, COLUMNS
+from config import CANDLE_ARCHIVE_DIR
+from data_fetcher import INTERVAL_SECONDS
+from market_data import MarketDataProvider, get_provider
+
+ROW_BYTES = len(COLUMNS) * 8
+
+logger = logging.getLogger(__name__)
+
+class CandleArchive:
+    """
+    فایل‌ها فقط append می‌شوند و تعداد ردیف معتبر فقط در meta است:
+    اگر اجرا وسط نوشتن قطع شود، ردیف‌های اضافه بعد از rows نادیده گرفته و در append بعدی بازنویسی می‌شوند.
+    خواندن‌ها view بدون کپی روی np.memmap هستند، پس RSS به طول تاریخچه بستگی ندارد.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or CANDLE_ARCHIVE_DIR
+        self._maps = {}     # (symbol, interval) -> (rows, memmap داده, memmap زمان)
+
+    def _paths(self, symbol, interval):
+        base = os.path.join(self.root, symbol, interval)
+        return base + ".ohlcv", base + ".t", base + ".meta"
+
+    def rows(self, symbol, interval):
+        meta_path = self._paths(symbol, interval)[2]
+        if not os.path.isfile(meta_path):
+            return 0
+        with open(meta_path, encoding="utf-8") as f:
+            return int(json.load(f)["rows"])
+
+    def _maps_for(self, symbol, interval):
+        n = self.rows(symbol, interval)
+        cached = self._maps.get((symbol, interval))
+        if cached is not None and cached[0] == n:
+            return cached
+        if n == 0:
+            data, times = np.empty((0, len(COLUMNS))), np.empty(0, dtype=np.int64)
+        else:
+            data_path, t_path, _ = self._paths(symbol, interval)
+            data = np.memmap(data_path, dtype=np.float64, mode="r", shape=(n, len(COLUMNS)))
+            times = np.memmap(t_path, dtype=np.int64, mode="r", shape=(n,))
+        cached = self._maps[(symbol, interval)] = (n, data, times)
+        return cached
+
+    def last_t(self, symbol, interval):
+        _, _, times = self._maps_for(symbol, interval)
+        return int(times[-1]) if len(times) else None
+
+    def series(self, symbol, interval):
+        return CandleSeries(self._maps_for(symbol, interval)[1])
+
+    def range(self, symbol, interval, start_at, end_at):
+        # کندل‌های [start_at, end_at] (دو سر شامل) به صورت view روی memmap
+        _, data, times = self._maps_for(symbol, interval)
+        lo = np.searchsorted(times, start_at, side="left")
+        hi = np.searchsorted(times, end_at, side="right")
+        return CandleSeries(data[lo:hi])
+
+    def append(self, symbol, interval, candles):
+        """
+        افزودن کندل‌های جدیدتر از آخرین کندل آرشیو (به ترتیب زمانی، تکراری‌ها حذف).
+        ترتیب crash-safe: داده و ایندکس بعد از rows نوشته و fsync می‌شوند، سپس meta اتمیک جایگزین می‌شود.
+        خروجی: تعداد ردیف اضافه‌شده.
+        """
+        arr = candles.arr if isinstance(candles, CandleSeries) else CandleSeries.from_dicts(candles).arr
+        arr = np.ascontiguousarray(arr[:, :len(COLUMNS)], dtype=np.float64)
+        if len(arr):
+            arr = arr[np.argsort(arr[:, 0], kind="stable")]
+            keep = np.ones(len(arr), dtype=bool)
+            keep[1:] = arr[1:, 0] != arr[:-1, 0]
+            arr = arr[keep]
+        last = self.last_t(symbol, interval)
+        if last is not None:
+            arr = arr[arr[:, 0] > last]
+        if not len(arr):
+            return 0
+
+        n = self.rows(symbol, interval)
+        first_t = self._maps_for(symbol, interval)[2][0] if n else arr[0, 0]
+        data_path, t_path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        self._maps.pop((symbol, interval), None)
+        for path, payload, width in ((data_path, arr, ROW_BYTES), (t_path, arr[:, 0].astype(np.int64), 8)):
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                f.truncate(n * width)
+                f.seek(n * width)
+                f.write(payload.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": n + len(arr), "columns": list(COLUMNS), "interval": interval,
+                       "first_t": int(first_t), "last_t": int(arr[-1, 0])}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, meta_path)
+        return len(arr)
+
+    def backfill(self, symbol, interval, start_at, end_at, provider=None):
+        # دریافت فقط بخش جدیدتر از آخرین کندل آرشیو (یا از start_at) از منبع داده و افزودن آن
+        provider = provider or get_provider()
+        last = self.last_t(symbol, interval)
+        start = max(start_at, last + INTERVAL_SECONDS[interval]) if last is not None else start_at
+        if start > end_at:
+            return 0
+        added = self.append(symbol, interval, provider.klines(symbol, interval, start, end_at))
+        logger.info("🗄️ آرشیو %s %s: %d کندل اضافه شد (مجموع %d)", symbol, interval, added,
+                    self.rows(symbol, interval))
+        return added
+
+class ArchiveProvider(MarketDataProvider):
+    # منبع داده بک‌تست از روی آرشیو؛ now قابل تنظیم است تا اسکن در هر لحظه تاریخی اجرا شود
+    name = "archive"
+
+    def __init__(self, archive=None, now=None):
+        self.archive = archive or CandleArchive()
+        self._now = now
+
+    def now(self):
+        return int(self._now) if self._now is not None else super().now()
+
+    def set_now(self, now):
+        self._now = now
+
+    def klines(self, symbol, interval, start_at, end_at):
+        return self.archive.range(symbol, interval, start_at, end_at)
+
+if __name__ == "__main__":
+    from log_setup import setup_logging
+
+    setup_logging(log_file=None)
+    symbol, interval = sys.argv[1], sys.argv[2]
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 365
+    provider = get_provider()
+    end = provider.now()
+    CandleArchive().backfill(symbol, interval, end - days * 86400, end, provider)
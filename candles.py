@@ -0,0 +1,94 @@
+# candles.py - سری کندل ستونی (numpy) با دسترسی سطری سازگار با لیست دیکشنری‌های قبلی
+import numpy as np
+
+COLUMNS = ("t", "o", "c", "h", "l", "v")
+
+class CandleSeries:
+    """
+    نگهداری کندل‌ها به صورت آرایه (n, 6) با ستون‌های t, o, c, h, l, v به ترتیب زمانی.
+    ایندکس عددی و پیمایش همان دیکشنری‌های {'t','o','c','h','l','v'} را برمی‌گرداند
+    (یک بار و در اولین نیاز ساخته می‌شوند)؛ برش، سری جدید بدون کپی برمی‌گرداند.
+    """
+    __slots__ = ("_arr", "_rows")
+
+    def __init__(self, arr, rows=None):
+        self._arr = arr
+        self._rows = rows
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty((0, len(COLUMNS)), dtype=np.float64))
+
+    @classmethod
+    def from_dicts(cls, candles):
+        if not candles:
+            return cls.empty()
+        arr = np.array([[c['t'], c['o'], c['c'], c['h'], c['l'], c['v']] for c in candles], dtype=np.float64)
+        return cls(arr)
+
+    @property
+    def arr(self):
+        return self._arr
+
+    @property
+    def t(self):
+        return self._arr[:, 0]
+
+    @property
+    def o(self):
+        return self._arr[:, 1]
+
+    @property
+    def c(self):
+        return self._arr[:, 2]
+
+    @property
+    def h(self):
+        return self._arr[:, 3]
+
+    @property
+    def l(self):
+        return self._arr[:, 4]
+
+    @property
+    def v(self):
+        return self._arr[:, 5]
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = [
+                {'t': int(r[0]), 'o': r[1], 'c': r[2], 'h': r[3], 'l': r[4], 'v': r[5]}
+                for r in self._arr[:, :6].tolist()
+            ]
+        return self._rows
+
+    def to_dicts(self):
+        return list(self.rows)
+
+    def __len__(self):
+        return self._arr.shape[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return CandleSeries(self._arr[key], None if self._rows is None else self._rows[key])
+        if self._rows is not None:
+            return self._rows[key]
+        r = self._arr[key, :6].tolist()
+        return {'t': int(r[0]), 'o': r[1], 'c': r[2], 'h': r[3], 'l': r[4], 'v': r[5]}
+
+    def __repr__(self):
+        return f"CandleSeries(n={len(self)})"
+
+def rows_of(candles):
+    # لیست دیکشنری‌ها برای حلقه‌های ایندکسی (دسترسی با سرعت list)
+    return candles.rows if isinstance(candles, CandleSeries) else candles
+
+def closes(candles):
+    # لیست قیمت بسته شدن برای هر دو نوع ورودی (CandleSeries یا لیست دیکشنری)
+    if isinstance(candles, CandleSeries):
+        return candles.c.tolist()
+    return [c['c'] for c in candles]
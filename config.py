@@ -9,6 +9,10 @@ TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 # ============================================
 
 # آستانه‌های اصلی
+# ⚠️ آستانه‌های ADX روی calculate_adx قدیمی تنظیم شده‌اند: DX اولین ۱۴ کندل پنجره 30m (یعنی ۷ روز قبل) با DI حدود ۱۴ برابر
+# (CSVهای سیگنال تا 2026-10 مقادیر DI بالای ۵۰۰ دارند). calculate_adx حالا ADX کامل Wilder آخرین کندل است، پس
+# تعداد سیگنال‌ها با همین اعداد جابه‌جا می‌شود؛ تا کالیبره شدن دوباره، مقادیر جایگزین را با پروفایل سایه مقایسه کنید
+# (SHADOW_PROFILES پایین‌تر). همین آستانه‌ها در فیلتر رنج ترکیبی هم استفاده می‌شوند.
 ADX_THRESHOLD_LONG = 25              # حداقل ADX برای سیگنال LONG
 ADX_THRESHOLD_SHORT = 22             # حداقل ADX برای سیگنال SHORT
 SIGNAL_THRESHOLD = 0.55              # حداقل نسبت وزنی برای صدور سیگنال
@@ -125,3 +129,104 @@ ADVANCED_RISK_PARAMS = {
     "MEDIUM": {"stop_loss_factor": 1.0, "take_profit_factor": 1.5, "signal_strength": "Normal"},
     "HIGH": {"stop_loss_factor": 1.5, "take_profit_factor": 2.0, "signal_strength": "Aggressive"}
 }
+
+# ⏱️ گزارش زمان‌بندی اجرا
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')                   # مسیر خروجی JSON زمان‌بندی هر اجرا
+METRICS_PROMETHEUS = os.getenv('METRICS_PROMETHEUS', '0') == '1'    # خروجی اضافه با فرمت متنی Prometheus
+
+# 📝 تنظیمات لاگ
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')      # DEBUG: جزئیات همه قوانین برای هر نماد | WARNING: حالت بی‌صدا
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')    # text یا json (هر خط یک رکورد JSON)
+
+# 🌐 محدودیت درخواست به KuCoin و کامل بودن داده
+KUCOIN_MAX_CONCURRENCY = 8           # حداکثر درخواست همزمان
+KUCOIN_REQUESTS_PER_SEC = 15         # حداکثر نرخ شروع درخواست در ثانیه
+KUCOIN_MAX_RETRIES = 3               # تعداد تلاش مجدد پس از خطای 429
+KUCOIN_RETRY_BACKOFF = 2.0           # ثانیه انتظار (ضربدر شماره تلاش) پس از 429
+HISTORY_MIN_COMPLETENESS = 0.9       # کمتر از این نسبت کندل دریافتی → هشدار داده ناقص
+HISTORY_MIN_BARS = {                 # حداقل کندل لازم برای محاسبه اندیکاتورها؛ کمتر → کنار گذاشتن تایم‌فریم
+    "30m": 50,
+    "1h": 50,
+    "4h": 200,
+}
+
+# 💸 هزینه معاملات (مشترک بین مانیتور، ردیاب نتیجه و شبیه‌سازها)
+BROKER_FEE_RATE = 0.001              # 0.1% برای ورود و خروج
+SLIPPAGE_PCT = 0.0005                # 0.05% لغزش
+
+# 🎯 ردیابی افزایشی نتیجه سیگنال‌ها
+TRACKER_MAX_HOLD_HOURS = int(os.getenv('TRACKER_MAX_HOLD_HOURS', '72'))   # سیگنال باز پس از این مدت CLOSED_MANUAL می‌شود
+
+# 📇 جلوگیری از سیگنال تکراری
+DUPLICATE_COOLDOWN_MINUTES = int(os.getenv('DUPLICATE_COOLDOWN_MINUTES', '120'))   # تا وقتی سیگنال (symbol, direction) باز است یا این مدت از آخرین سیگنال نگذشته، سیگنال جدید صادر نمی‌شود
+
+# 🔎 پیش‌فیلتر با snapshot قیمت همه نمادها (allTickers)
+PREFILTER_ENABLED = os.getenv('PREFILTER_ENABLED', '1') == '1'
+PREFILTER_MIN_MOVE = 0.003           # تغییر قیمت کمتر از این نسبت از اسکن قبلی → نماد قابل رد شدن
+PREFILTER_RATIO_MARGIN = 0.15        # نسبت وزنی اسکن قبلی کمتر از SIGNAL_THRESHOLD منهای این مقدار → دور از سیگنال
+PREFILTER_MAX_AGE_MINUTES = 120      # حداکثر عمر وضعیت ذخیره‌شده؛ پس از آن نماد حتماً کامل اسکن می‌شود
+
+# 🗓️ زمان‌بندی تطبیقی اسکن (اولویت با نوسان و نزدیکی به SIGNAL_THRESHOLD)
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') == '1'
+SCHEDULER_REQUEST_BUDGET = int(os.getenv('SCHEDULER_REQUEST_BUDGET', '200'))   # حداکثر درخواست کندل در هر اجرا (پنجره ۳۰ دقیقه‌ای)
+SCHEDULER_TIERS = [                  # (نام، حداقل امتیاز، فاصله اسکن به دقیقه) — از داغ به خاموش
+    ("hot", 0.60, 0),
+    ("warm", 0.35, 60),
+    ("dormant", 0.0, 180),
+]
+SCHEDULER_DUE_TOLERANCE_MINUTES = 15 # نیم فاصله cron؛ اجرای دیرتر GitHub Actions اسکن بعدی را یک دور عقب نیندازد
+
+# 🔀 تشخیص واگرایی RSI/MACD با قیمت (30m)
+DIVERGENCE_PIVOT_BARS = 3            # تعداد کندل هر طرف برای تایید سقف/کف محلی
+DIVERGENCE_MIN_GAP = 5               # حداقل فاصله دو پیوت متوالی (کندل)
+DIVERGENCE_MAX_GAP = 60              # حداکثر فاصله دو پیوت متوالی (کندل)
+DIVERGENCE_RECENT_BARS = 6           # واگرایی تاییدشده در این تعداد کندل آخر «فعال» حساب می‌شود
+
+# 📊 آمار غلتان حجم و قانون جهش حجم
+VOLUME_WINDOW = 20                   # تعداد کندل قبلی برای میانگین/انحراف معیار/صدک حجم
+VOLUME_SPIKE_MIN = 1.5               # حجم کندل فعلی حداقل این ضریب از میانگین → جهش حجم
+
+# 🌐 منبع داده بازار (market_data.py)
+MARKET_DATA_SOURCE = os.getenv('MARKET_DATA_SOURCE', 'kucoin')     # kucoin، replay (پخش فیکسچر ضبط‌شده بدون شبکه) یا archive (آرشیو کندل روی دیسک)
+MARKET_DATA_FIXTURE = os.getenv('MARKET_DATA_FIXTURE', 'fixtures/kucoin_klines.json.gz')   # فایل فیکسچر برای replay
+MARKET_DATA_RECORD = os.getenv('MARKET_DATA_RECORD', '')           # اگر تنظیم شود، همه پاسخ‌ها در این فایل gzip ضبط می‌شوند
+
+# 🗄️ آرشیو کندل روی دیسک برای بک‌تست (candle_archive.py)
+CANDLE_ARCHIVE_DIR = os.getenv('CANDLE_ARCHIVE_DIR', 'archive')
+
+# 🧹 اعتبارسنجی سری کندل (integrity.py)
+INTEGRITY_BACKFILL_FROM_ARCHIVE = os.getenv('INTEGRITY_BACKFILL_FROM_ARCHIVE', '0') == '1'   # پر کردن شکاف‌ها از آرشیو محلی کندل
+INTEGRITY_MAX_GAP_RATIO = 0.02       # نسبت کندل‌های گمشده بیش از این → هشدار شکاف داده
+
+# 💼 شبیه‌سازی پرتفوی (portfolio.py)
+PORTFOLIO_INITIAL_EQUITY = float(os.getenv('PORTFOLIO_INITIAL_EQUITY', '1000'))
+PORTFOLIO_SIZING = os.getenv('PORTFOLIO_SIZING', 'fixed')   # fixed | atr_risk | kelly
+PORTFOLIO_FIXED_USD = 10.0           # اندازه ثابت پوزیشن (همان position_size_usd سیگنال‌ها)
+PORTFOLIO_RISK_PCT = 0.01            # atr_risk: درصد سرمایه در معرض زیان تا استاپ
+PORTFOLIO_KELLY_CAP = 0.25           # kelly: سقف کسر سرمایه هر پوزیشن
+PORTFOLIO_KELLY_MIN_TRADES = 20      # kelly: تا این تعداد معامله بسته، اندازه ثابت
+PORTFOLIO_MAX_EXPOSURE = 1.0         # سقف مجموع ارزش اسمی پوزیشن‌های باز نسبت به سرمایه
+PORTFOLIO_MAX_POSITIONS = 10         # حداکثر پوزیشن باز همزمان
+
+# 📐 فاصله اطمینان bootstrap (bootstrap.py)
+BOOTSTRAP_SAMPLES = int(os.getenv('BOOTSTRAP_SAMPLES', '2000'))   # تعداد نمونه‌گیری مجدد
+BOOTSTRAP_ALPHA = 0.05               # فاصله اطمینان 95%
+BOOTSTRAP_SEED = 20261018            # seed ثابت تا گزارش‌ها بین اجراها قابل مقایسه باشند
+
+# 🔗 حذف سیگنال‌های هم‌جهت نمادهای همبسته (correlation.py)
+CORRELATION_ENABLED = os.getenv('CORRELATION_ENABLED', '1') == '1'
+CORRELATION_WINDOW = 96              # تعداد کندل 30m پنجره غلتان بازده (۲ روز)
+CORRELATION_CLUSTER_MIN = 0.8        # همبستگی >= این مقدار → دو نماد در یک خوشه
+CORRELATION_MIN_OBS = 24             # حداقل کندل مشترک برای معتبر بودن همبستگی یک جفت
+
+# 🧪 ارزیابی سایه چند پروفایل در هر اسکن (profiles.py)
+# هر پروفایل آستانه‌ها و/یا وزن‌های RISK_FACTORS را بازنویسی می‌کند (فقط کلیدهای داده‌شده)؛
+# تصمیم‌ها فقط در signals/shadow/<نام>/<تاریخ>.csv ثبت می‌شوند (بدون تلگرام و ایندکس سیگنال باز).
+SHADOW_PROFILES = {
+    # "strict": {"SIGNAL_THRESHOLD": 0.62, "ADX_THRESHOLD_LONG": 28, "RISK_FACTORS": {"MEDIUM": {"Patterns": 2, "TF_Big": 4}}},
+    # "adx_wilder_20": {"ADX_THRESHOLD_LONG": 20, "ADX_THRESHOLD_SHORT": 18},   # کالیبره کردن آستانه‌های ADX روی Wilder ADX
+}
+SHADOW_PROFILES_FILE = os.getenv('SHADOW_PROFILES_FILE', '')   # فایل JSON اختیاری با همان ساختار (اضافه به SHADOW_PROFILES)
+
+# ⚡ هسته‌های دسته‌ای اندیکاتورهای بازگشتی (kernels.py)
+KERNELS_BACKEND = os.getenv('KERNELS_BACKEND', 'auto')   # auto: numba اگر نصب باشد | numba | numpy (پیاده‌سازی مرجع)
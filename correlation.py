@@ -0,0 +1,232 @@
+# correlation.py - همبستگی غلتان بازده 30m بین نمادها (به‌روزرسانی افزایشی) و خوشه‌بندی برای حذف سیگنال‌های هم‌جهت تکراری
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+import signal_store
+from candles import CandleSeries
+from config import CORRELATION_WINDOW, CORRELATION_CLUSTER_MIN, CORRELATION_MIN_OBS
+
+CORRELATION_STATE_FILE = "correlation_state.json"
+BAR_SECONDS = 1800
+
+logger = logging.getLogger(__name__)
+
+class RollingCorrelation:
+    """
+    پنجره غلتان window کندل 30m از بازده همه نمادها با پشتیبانی از داده گمشده (نماد اسکن‌نشده در یک کندل).
+    برای هر جفت (i, j) فقط کندل‌هایی که هر دو داده دارند حساب می‌شوند، با چهار ماتریس جمع:
+        C = Σ v vᵀ   P = Σ x xᵀ   A = Σ x vᵀ   Q = Σ x² vᵀ     (x بازده با صفر برای گمشده، v نشانگر وجود داده)
+    هر کندل در خانه (زمان کندل / 30m) mod window بافر حلقوی است؛ تغییر یک سطر فقط همان سطر را از جمع‌ها کم و
+    دوباره اضافه می‌کند: O(نمادها²) به جای محاسبه کامل. هر نماد watermark خودش را دارد (last_close)، پس
+    نمادی که چند اسکن رد شده در اسکن بعدی بازده‌های جاافتاده‌اش را در خانه کندل خودشان پر می‌کند.
+    """
+
+    def __init__(self, symbols=(), window=CORRELATION_WINDOW, path=None):
+        self.path = path or os.path.join(signal_store.SIGNALS_DIR, CORRELATION_STATE_FILE)
+        self.window = window
+        self.symbols = []
+        self.col = {}
+        self.returns = np.zeros((window, 0))      # بافر حلقوی بازده (NaN = گمشده)
+        self.slot_t = np.full(window, -1, dtype=np.int64)   # زمان کندل هر خانه بافر (-1 = خالی)
+        self.last_t = None                         # زمان جدیدترین کندل پنجره
+        self.last_close = {}                       # symbol -> (t, close): watermark نماد و close آن برای بازده بعدی
+        self._reset_sums()
+        self.add_symbols(symbols)
+
+    def _reset_sums(self):
+        n = len(self.symbols)
+        self.C, self.P, self.A, self.Q = (np.zeros((n, n)) for _ in range(4))
+
+    def add_symbols(self, symbols):
+        new = [s for s in symbols if s not in self.col]
+        if not new:
+            return
+        for s in new:
+            self.col[s] = len(self.symbols)
+            self.symbols.append(s)
+        pad = np.full((self.window, len(new)), np.nan)
+        self.returns = np.concatenate([self.returns, pad], axis=1)
+        old = self.C.shape[0]
+        n = len(self.symbols)
+        for name in ("C", "P", "A", "Q"):
+            m = np.zeros((n, n))
+            m[:old, :old] = getattr(self, name)
+            setattr(self, name, m)
+
+    def _apply(self, row, sign):
+        valid = ~np.isnan(row)
+        v = valid.astype(np.float64)
+        x = np.where(valid, row, 0.0)
+        self.C += sign * np.outer(v, v)
+        self.P += sign * np.outer(x, x)
+        self.A += sign * np.outer(x, v)
+        self.Q += sign * np.outer(x * x, v)
+
+    def _slot(self, t):
+        return int(t // BAR_SECONDS) % self.window
+
+    def advance(self, t):
+        # جلو بردن پنجره تا کندل t: خانه‌های کندل‌های جدید از قدیمی‌ترین داده خالی می‌شوند؛ خروجی تعداد کندل جدید
+        if self.last_t is not None and t <= self.last_t:
+            return 0
+        first = t - (self.window - 1) * BAR_SECONDS
+        if self.last_t is not None:
+            first = max(first, self.last_t + BAR_SECONDS)
+        for bar_t in range(int(first), int(t) + 1, BAR_SECONDS):
+            slot = self._slot(bar_t)
+            if self.slot_t[slot] >= 0:
+                self._apply(self.returns[slot], -1.0)
+            self.returns[slot] = np.nan
+            self.slot_t[slot] = bar_t
+        self.last_t = int(t)
+        return (int(t) - int(first)) // BAR_SECONDS + 1
+
+    def fill(self, slot, values):
+        # نوشتن بازده‌های جدید (NaN = بدون تغییر) در یک خانه و اصلاح جمع‌ها
+        self._apply(self.returns[slot], -1.0)
+        self.returns[slot] = np.where(np.isnan(values), self.returns[slot], values)
+        self._apply(self.returns[slot], +1.0)
+
+    def update(self, closes_by_symbol, now=None):
+        """
+        اعمال کندل‌های 30m بسته‌شده هر نماد که از watermark همان نماد جدیدترند (از سری‌های cache شده اسکن فعلی).
+        closes_by_symbol: {symbol: CandleSeries 30m}؛ نمادی که در یک کندل داده ندارد برای آن کندل گمشده است
+        تا وقتی در اسکن بعدی همان کندل را بیاورد.
+        خروجی: تعداد کندل‌های جدید پنجره.
+        """
+        self.add_symbols(closes_by_symbol.keys())
+        series = {}
+        for s, c in closes_by_symbol.items():
+            c = c if isinstance(c, CandleSeries) else CandleSeries.from_dicts(c)
+            if now is not None and len(c):
+                c = c[:int(np.searchsorted(c.t + BAR_SECONDS, now, side="right"))]
+            if len(c):
+                series[s] = c
+        if not series:
+            return 0
+        added = self.advance(max(int(c.t[-1]) for c in series.values()))
+        oldest = self.last_t - (self.window - 1) * BAR_SECONDS
+
+        # بازده‌های جدید هر نماد (کندل‌های بعد از watermark و داخل پنجره) → سطر خانه کندل
+        pending = {}
+        for s, c in series.items():
+            j = self.col[s]
+            t, close = c.t.astype(np.int64), c.c
+            prev_t = np.concatenate([[-1], t[:-1]])
+            prev_c = np.concatenate([[np.nan], close[:-1]])
+            last = self.last_close.get(s)
+            if last is not None:
+                # اولین کندل سری ممکن است دنباله همان کندلی باشد که اسکن قبلی دیده
+                prev_t[0], prev_c[0] = last
+                mark = last[0]
+            else:
+                mark = -1
+            new = (t > mark) & (t >= oldest) & (prev_t == t - BAR_SECONDS)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rets = close[new] / prev_c[new] - 1.0
+            for bar_t, r in zip(t[new].tolist(), rets.tolist()):
+                pending.setdefault(self._slot(bar_t), np.full(len(self.symbols), np.nan))[j] = r
+            if last is None or t[-1] > last[0]:
+                self.last_close[s] = (int(t[-1]), float(close[-1]))
+        for slot, values in pending.items():
+            self.fill(slot, values)
+        return added
+
+    def matrix(self, min_obs=CORRELATION_MIN_OBS):
+        # ماتریس همبستگی جفتی؛ جفت با کمتر از min_obs کندل مشترک → NaN
+        C, P, A, Q = self.C, self.P, self.A, self.Q
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = C * P - A * A.T
+            var_i = C * Q - A * A
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr[C < min_obs] = np.nan
+        np.fill_diagonal(corr, 1.0)
+        return np.clip(corr, -1.0, 1.0)
+
+    def clusters(self, symbols=None, threshold=CORRELATION_CLUSTER_MIN):
+        """
+        خوشه‌بندی با union-find روی یال‌های همبستگی >= threshold (پیوند تکی).
+        خروجی: {symbol: نماینده خوشه}؛ نماد ناشناخته خوشه خودش است.
+        """
+        corr = self.matrix()
+        parent = list(range(len(self.symbols)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        ii, jj = np.nonzero(np.triu(np.nan_to_num(corr, nan=-1.0) >= threshold, k=1))
+        for i, j in zip(ii.tolist(), jj.tolist()):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+        symbols = self.symbols if symbols is None else symbols
+        return {s: self.symbols[find(self.col[s])] if s in self.col else s for s in symbols}
+
+    # ===== ذخیره‌سازی =====
+    @classmethod
+    def load(cls, path=None, window=CORRELATION_WINDOW):
+        engine = cls(window=window, path=path)
+        if not os.path.isfile(engine.path):
+            return engine
+        try:
+            with open(engine.path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ وضعیت همبستگی خوانده نشد (%s) → شروع از صفر", e)
+            return engine
+        if payload.get("window") != window or "slot_t" not in payload:
+            # پنجره دیگر یا قالب قدیمی (بافر ترتیبی بدون زمان خانه‌ها) → شروع از صفر
+            return engine
+        engine.add_symbols(payload["symbols"])
+        engine.returns = np.array(payload["returns"], dtype=np.float64).reshape(window, len(engine.symbols))
+        engine.slot_t = np.array(payload["slot_t"], dtype=np.int64)
+        engine.last_t = payload["last_t"]
+        engine.last_close = {s: tuple(v) for s, v in payload["last_close"].items()}
+        # جمع‌ها یک بار از بافر بازسازی می‌شوند (بدون انباشت خطای اعشاری بین اجراها)
+        engine._reset_sums()
+        for row in engine.returns[engine.slot_t >= 0]:
+            engine._apply(row, +1.0)
+        return engine
+
+    def save(self):
+        signal_store.ensure_dir()
+        payload = {
+            "updated_at": int(time.time()), "window": self.window, "symbols": self.symbols,
+            "slot_t": self.slot_t.tolist(), "last_t": self.last_t,
+            "last_close": self.last_close,
+            "returns": [[None if np.isnan(x) else round(x, 8) for x in row] for row in self.returns.tolist()],
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+def select_per_cluster(signals, clusters):
+    """
+    از هر (خوشه، جهت) فقط قوی‌ترین SIGNAL (بیشترین نسبت وزنی) باقی می‌ماند؛ بقیه NO_SIGNAL با suppressed_by می‌شوند.
+    خروجی: سیگنال‌ها مرتب به ترتیب قدرت نزولی تا سهمیه روزانه اول صرف قوی‌ترین‌ها شود.
+    """
+    def ratio(s):
+        return s["passed_weight"] / s["total_weight"] if s.get("total_weight") else 0.0
+
+    ranked = sorted(signals, key=ratio, reverse=True)
+    kept = {}
+    for signal in ranked:
+        if signal.get("status") != "SIGNAL":
+            continue
+        key = (clusters.get(signal["symbol"], signal["symbol"]), signal["direction"])
+        leader = kept.setdefault(key, signal)
+        if leader is not signal:
+            signal["status"] = "NO_SIGNAL"
+            signal["strength"] = None
+            signal["suppressed_by"] = leader["symbol"]
+            logger.info("🔗 سیگنال %s %s حذف شد: هم‌خوشه با %s (قوی‌تر)",
+                        signal["symbol"], signal["direction"], leader["symbol"])
+    return ranked
@@ -1,35 +1,228 @@
+import asyncio
+import json
+import logging
 import requests
 import time
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from candles import CandleSeries, COLUMNS
+from config import (
+    KUCOIN_MAX_CONCURRENCY, KUCOIN_REQUESTS_PER_SEC, KUCOIN_MAX_RETRIES, KUCOIN_RETRY_BACKOFF,
+    HISTORY_MIN_COMPLETENESS,
+)
+from metrics import span, incr
+
+logger = logging.getLogger(__name__)
+
+KUCOIN_URL = "https://api.kucoin.com/api/v1/market/candles"
+KUCOIN_TICKERS_URL = "https://api.kucoin.com/api/v1/market/allTickers"
+KUCOIN_MAX_CANDLES = 1500    # حداکثر تعداد کندل در هر پاسخ candles
+
+INTERVAL_SECONDS = {
+    "1min": 60, "5min": 300, "15min": 900,
+    "30min": 1800, "1hour": 3600, "4hour": 14400
+}
+
+# دیکودر JSON سریع در صورت نصب بودن orjson (وابستگی اختیاری؛ در requirements.txt نیست)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+def loads_json(body):
+    return _json_loads(body)
+
+def parse_klines(rows):
+    # تبدیل ردیف‌های خام KuCoin (رشته‌ای، جدیدترین کندل اول) به CandleSeries به ترتیب زمانی
+    if not rows:
+        return CandleSeries.empty()
+    arr = np.array([r[:len(COLUMNS)] for r in rows], dtype=np.float64)
+    return CandleSeries(arr[::-1])
+
+def parse_klines_body(body):
+    """
+    پارس مستقیم بدنه پاسخ candles به آرایه numpy.
+    مقادیر KuCoin رشته‌ای هستند؛ با حذف '"' و '[' و ']' از بخش data کل جدول به یک
+    آرایه عددی تخت JSON تبدیل می‌شود که در یک مرحله دیکود و در آرایه (n, ستون) قرار می‌گیرد.
+    معکوس‌سازی ترتیب با view انجام می‌شود (بدون کپی).
+    """
+    try:
+        start = body.index(b'[', body.index(b'"data"'))
+        end = body.rindex(b']')
+    except ValueError:
+        start = end = -1
+    if start < 0 or body[end + 1:].strip() != b'}':
+        # قالب غیرمنتظره (مثلاً پاسخ خطا) → مسیر عادی
+        return parse_klines(loads_json(body).get("data") or [])
+
+    segment = body[start + 1:end]
+    first_row_end = segment.find(b']')
+    if first_row_end < 0:
+        return CandleSeries.empty()
+    ncols = segment[:first_row_end].count(b',') + 1
+    flat = segment.translate(None, b'"[]')
+    values = _json_loads(b'[' + flat + b']')
+    arr = np.array(values, dtype=np.float64).reshape(-1, ncols)
+    return CandleSeries(arr[::-1, :len(COLUMNS)])
+
+# ===== دریافت تاریخچه طولانی به صورت چند تکه =====
+def history_chunks(start_at, end_at, interval, max_rows=KUCOIN_MAX_CANDLES):
+    # تقسیم بازه [start_at, end_at] به تکه‌هایی که هر کدام در یک پاسخ جا می‌شوند
+    # (دو سر بازه شامل هستند، پس هر تکه max_rows - 1 گام است؛ کندل مرزی در stitch حذف می‌شود)
+    chunk_seconds = INTERVAL_SECONDS[interval] * (max_rows - 1)
+    chunks = []
+    s = start_at
+    while s < end_at:
+        e = min(s + chunk_seconds, end_at)
+        chunks.append((s, e))
+        s = e
+    return chunks or [(start_at, end_at)]
+
+def stitch_chunks(parts):
+    # اتصال تکه‌ها به ترتیب زمان و حذف کندل‌های تکراری مرز تکه‌ها
+    arrays = [p.arr for p in parts if len(p)]
+    if not arrays:
+        return CandleSeries.empty()
+    arr = np.concatenate(arrays)
+    arr = arr[np.argsort(arr[:, 0], kind="stable")]
+    keep = np.ones(len(arr), dtype=bool)
+    keep[1:] = arr[1:, 0] != arr[:-1, 0]
+    return CandleSeries(arr[keep])
+
+def check_completeness(series, start_at, end_at, interval):
+    # نسبت کندل‌های دریافت‌شده به تعداد مورد انتظار در بازه
+    expected = max((end_at - start_at) // INTERVAL_SECONDS[interval], 1)
+    return min(len(series) / expected, 1.0)
+
+class RateLimiter:
+    """
+    محدودکننده درخواست‌ها برای asyncio: حداکثر درخواست همزمان + حداقل فاصله بین شروع درخواست‌ها.
+    """
+
+    def __init__(self, max_concurrency=KUCOIN_MAX_CONCURRENCY, requests_per_sec=KUCOIN_REQUESTS_PER_SEC):
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._interval = 1.0 / requests_per_sec if requests_per_sec else 0.0
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        if self._interval:
+            async with self._lock:
+                now = asyncio.get_running_loop().time()
+                wait = self._next_at - now
+                self._next_at = max(now, self._next_at) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+async def fetch_klines_chunk_async(session, symbol, interval, start_at, end_at, limiter):
+    params = {"symbol": symbol, "type": interval, "startAt": start_at, "endAt": end_at}
+    for attempt in range(KUCOIN_MAX_RETRIES + 1):
+        async with limiter:
+            with span("fetch", symbol=symbol, tf=interval):
+                incr("http_requests")
+                async with session.get(KUCOIN_URL, params=params, timeout=30) as resp:
+                    status = resp.status
+                    body = await resp.read() if status == 200 else b""
+        if status == 200:
+            incr("bytes_downloaded", len(body))
+            with span("parse", tf=interval):
+                return parse_klines_body(body)
+        if status == 429 and attempt < KUCOIN_MAX_RETRIES:
+            incr("http_retries")
+            await asyncio.sleep(KUCOIN_RETRY_BACKOFF * (attempt + 1))
+            continue
+        incr("http_errors")
+        logger.warning("خطای HTTP %s برای %s %s", status, symbol, interval)
+        break
+    return CandleSeries.empty()
+
+async def fetch_history_async(session, symbol, interval, start_at, end_at, limiter):
+    # تکه‌ها همزمان (زیر محدودکننده) دریافت و به ترتیب به هم متصل می‌شوند
+    chunks = history_chunks(start_at, end_at, interval)
+    parts = await asyncio.gather(*(
+        fetch_klines_chunk_async(session, symbol, interval, s, e, limiter) for s, e in chunks
+    ))
+    return stitch_chunks(parts)
+
+def parse_tickers(payload):
+    # پاسخ allTickers → {symbol: آخرین قیمت}
+    tickers = {}
+    for t in (payload.get("data") or {}).get("ticker") or []:
+        try:
+            tickers[t["symbol"]] = float(t["last"])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return tickers
+
+async def fetch_all_tickers_async(session, limiter):
+    # یک درخواست برای قیمت لحظه‌ای همه نمادها؛ در خطا دیکشنری خالی برمی‌گردد
+    for attempt in range(KUCOIN_MAX_RETRIES + 1):
+        async with limiter:
+            with span("fetch", tf="tickers"):
+                incr("http_requests")
+                async with session.get(KUCOIN_TICKERS_URL, timeout=30) as resp:
+                    status = resp.status
+                    body = await resp.read() if status == 200 else b""
+        if status == 200:
+            incr("bytes_downloaded", len(body))
+            return parse_tickers(loads_json(body))
+        if status == 429 and attempt < KUCOIN_MAX_RETRIES:
+            incr("http_retries")
+            await asyncio.sleep(KUCOIN_RETRY_BACKOFF * (attempt + 1))
+            continue
+        incr("http_errors")
+        logger.warning("خطای HTTP %s برای allTickers", status)
+        break
+    return {}
+
+def fetch_klines_chunk(symbol, interval, start_at, end_at):
+    params = {'symbol': symbol, 'type': interval, 'startAt': start_at, 'endAt': end_at}
+    for attempt in range(KUCOIN_MAX_RETRIES + 1):
+        with span("fetch", symbol=symbol, tf=interval):
+            incr("http_requests")
+            r = requests.get(KUCOIN_URL, params=params, timeout=20)
+        if r.status_code == 200:
+            incr("bytes_downloaded", len(r.content))
+            with span("parse", tf=interval):
+                return parse_klines_body(r.content)
+        if r.status_code == 429 and attempt < KUCOIN_MAX_RETRIES:
+            incr("http_retries")
+            logger.warning("⚠️ Rate limit برای %s — %.0f ثانیه صبر...", symbol, KUCOIN_RETRY_BACKOFF * (attempt + 1))
+            time.sleep(KUCOIN_RETRY_BACKOFF * (attempt + 1))
+            continue
+        incr("http_errors")
+        logger.warning("خطای HTTP %s برای %s %s", r.status_code, symbol, interval)
+        break
+    return CandleSeries.empty()
+
+def fetch_history(symbol, interval, start_at, end_at):
+    # تکه ناموفق خالی برمی‌گردد؛ کمبود کندل بعد از اتصال با check_completeness گزارش می‌شود
+    parts = [fetch_klines_chunk(symbol, interval, s, e) for s, e in history_chunks(start_at, end_at, interval)]
+    series = stitch_chunks(parts)
+    completeness = check_completeness(series, start_at, end_at, interval)
+    if completeness < HISTORY_MIN_COMPLETENESS:
+        incr("incomplete_series")
+        logger.warning("⚠️ داده ناقص %s %s: %d کندل (%.0f%% بازه)", symbol, interval, len(series), completeness * 100)
+    return series
+
 def fetch_kucoin_klines(symbol, interval='5min', days=3):
     interval_map = {
-        '5m': '5min', '15m': '15min', '30m': '30min',
+        '1m': '1min', '5m': '5min', '15m': '15min', '30m': '30min',
         '1h': '1hour', '4h': '4hour'
     }
     kucoin_interval = interval_map.get(interval, interval)
     end_time = int(datetime.utcnow().timestamp())
     start_time = int((datetime.utcnow() - timedelta(days=days)).timestamp())
-    url = "https://api.kucoin.com/api/v1/market/candles"
-    params = {'symbol': symbol, 'type': kucoin_interval,
-              'startAt': start_time, 'endAt': end_time}
     try:
-        r = requests.get(url, params=params, timeout=20)
-        if r.status_code == 200:
-            data = r.json().get('data', [])
-            # خروجی به شکل دیکشنری
-            candles = [{
-                't': int(c[0]),
-                'o': float(c[1]),
-                'c': float(c[2]),
-                'h': float(c[3]),
-                'l': float(c[4]),
-                'v': float(c[5])
-            } for c in data]
-            return list(reversed(candles))
-        elif r.status_code == 429:
-            time.sleep(10)
-            return fetch_kucoin_klines(symbol, interval, days)
+        return fetch_history(symbol, kucoin_interval, start_time, end_time)
     except Exception as e:
         print(f"❌ خطا در دریافت داده {symbol}: {e}")
     return None
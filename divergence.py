@@ -0,0 +1,154 @@
+# divergence.py - تشخیص واگرایی RSI / هیستوگرام MACD با قیمت (برداری روی کل سری + ردیاب افزایشی)
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candles import CandleSeries
+from config import DIVERGENCE_PIVOT_BARS, DIVERGENCE_MIN_GAP, DIVERGENCE_MAX_GAP, DIVERGENCE_RECENT_BARS
+from indicators import rsi_series, macd_series
+
+def _as_array(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def find_pivots(highs, lows, k=DIVERGENCE_PIVOT_BARS):
+    """
+    ایندکس سقف‌ها و کف‌های محلی با پنجره k کندل در هر طرف.
+    سقف: بزرگ‌تر از k کندل قبل (اکید) و نه کوچک‌تر از k کندل بعد؛ کف برعکس.
+    (شرط اکید سمت چپ باعث می‌شود سقف صاف فقط یک بار شمرده شود)
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    if len(highs) < 2 * k + 1:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    wh = sliding_window_view(highs, 2 * k + 1)
+    wl = sliding_window_view(lows, 2 * k + 1)
+    ch, cl = wh[:, k], wl[:, k]
+    pivot_high = (ch > wh[:, :k].max(axis=1)) & (ch >= wh[:, k + 1:].max(axis=1))
+    pivot_low = (cl < wl[:, :k].min(axis=1)) & (cl <= wl[:, k + 1:].min(axis=1))
+    return np.nonzero(pivot_high)[0] + k, np.nonzero(pivot_low)[0] + k
+
+def _pair_divergence(pivots, price, osc, price_sign, min_gap, max_gap):
+    # مقایسه هر پیوت با پیوت قبلی هم‌نوع؛ price_sign=+1 برای سقف (قیمت بالاتر، نوسان‌گر پایین‌تر)
+    if len(pivots) < 2:
+        return np.empty(0, dtype=np.int64)
+    p1, p2 = pivots[:-1], pivots[1:]
+    gap = p2 - p1
+    o1, o2 = osc[p1], osc[p2]
+    mask = (gap >= min_gap) & (gap <= max_gap) & ~np.isnan(o1) & ~np.isnan(o2)
+    mask &= price_sign * (price[p2] - price[p1]) > 0
+    mask &= price_sign * (o2 - o1) < 0
+    return p2[mask]
+
+def detect_divergences(highs, lows, osc, k=DIVERGENCE_PIVOT_BARS,
+                       min_gap=DIVERGENCE_MIN_GAP, max_gap=DIVERGENCE_MAX_GAP):
+    """
+    واگرایی‌های معمولی روی کل سری:
+    صعودی = کف پایین‌تر قیمت + کف بالاتر نوسان‌گر، نزولی = سقف بالاتر قیمت + سقف پایین‌تر نوسان‌گر.
+    خروجی: (ایندکس کندل تایید صعودی‌ها، نزولی‌ها)؛ تایید k کندل بعد از پیوت دوم است.
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    osc = _as_array(osc) if not isinstance(osc, np.ndarray) else osc
+    ph, pl = find_pivots(highs, lows, k)
+    bullish = _pair_divergence(pl, lows, osc, -1, min_gap, max_gap) + k
+    bearish = _pair_divergence(ph, highs, osc, +1, min_gap, max_gap) + k
+    return bullish, bearish
+
+def recent_divergences(candles, recent=DIVERGENCE_RECENT_BARS):
+    # {"bullish": [...], "bearish": [...]} با نام نوسان‌گرهایی که در recent کندل آخر واگرایی تایید کرده‌اند
+    if not isinstance(candles, CandleSeries):
+        candles = CandleSeries.from_dicts(candles)
+    n = len(candles)
+    found = {"bullish": [], "bearish": []}
+    if n < 2 * DIVERGENCE_PIVOT_BARS + 1:
+        return found
+    closes = candles.c.tolist()
+    oscillators = {
+        "RSI": _as_array(rsi_series(closes)),
+        "MACD": _as_array(macd_series(closes)["histogram"]),
+    }
+    for name, osc in oscillators.items():
+        bullish, bearish = detect_divergences(candles.h, candles.l, osc)
+        if len(bullish) and bullish[-1] >= n - recent:
+            found["bullish"].append(name)
+        if len(bearish) and bearish[-1] >= n - recent:
+            found["bearish"].append(name)
+    return found
+
+def recent_divergences_series(candles, recent=DIVERGENCE_RECENT_BARS):
+    """
+    recent_divergences برای همه کندل‌های سری در یک پیمایش (بک‌تست کندل به کندل):
+    نوسان‌گرها یک بار روی کل سری و یک PivotTracker برای هر نوسان‌گر که کندل به کندل تغذیه می‌شود.
+    خروجی: لیست هم‌طول سری؛ ایندکس i همان recent_divergences روی کندل‌های تا i
+    (RSI/MACD از ابتدای سری گرم می‌شوند، نه از ابتدای پنجره اسکن زنده).
+    """
+    if not isinstance(candles, CandleSeries):
+        candles = CandleSeries.from_dicts(candles)
+    closes = candles.c.tolist()
+    oscillators = {
+        "RSI": rsi_series(closes),
+        "MACD": macd_series(closes)["histogram"],
+    }
+    trackers = {name: PivotTracker() for name in oscillators}
+    last = {}   # (نام نوسان‌گر، نوع) -> ایندکس آخرین تایید
+    out = []
+    for i, (high, low) in enumerate(zip(candles.h.tolist(), candles.l.tolist())):
+        for name, osc in oscillators.items():
+            for kind, confirm in trackers[name].update(high, low, osc[i]):
+                last[(name, kind)] = confirm
+        out.append({kind: [name for name in oscillators if last.get((name, kind), -recent - 1) > i - recent]
+                    for kind in ("bullish", "bearish")})
+    return out
+
+def opposing_divergence(found, direction):
+    # واگرایی خلاف جهت سیگنال در خروجی recent_divergences: نزولی برای LONG، صعودی برای SHORT
+    return bool(found["bearish" if direction == "LONG" else "bullish"])
+
+class PivotTracker:
+    """
+    نسخه افزایشی detect_divergences برای بک‌تست کندل به کندل:
+    هر update فقط پنجره 2k+1 کندل آخر و آخرین سقف/کف را بررسی می‌کند (O(k) به ازای هر کندل).
+    خروجی هر update لیست رویدادهای ("bullish"|"bearish", ایندکس کندل تایید) است
+    و با خروجی نسخه برداری روی همان سری یکسان است.
+    """
+
+    def __init__(self, k=DIVERGENCE_PIVOT_BARS, min_gap=DIVERGENCE_MIN_GAP, max_gap=DIVERGENCE_MAX_GAP):
+        self.k = k
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.window = deque(maxlen=2 * k + 1)
+        self.index = -1
+        self.last_high = None   # (ایندکس، قیمت، نوسان‌گر)
+        self.last_low = None
+
+    def _pair(self, last, idx, price, osc, price_sign):
+        if last is None:
+            return False
+        gap = idx - last[0]
+        if not (self.min_gap <= gap <= self.max_gap):
+            return False
+        if osc is None or last[2] is None or np.isnan(osc) or np.isnan(last[2]):
+            return False
+        return price_sign * (price - last[1]) > 0 and price_sign * (osc - last[2]) < 0
+
+    def update(self, high, low, osc):
+        self.index += 1
+        self.window.append((high, low, np.nan if osc is None else osc))
+        if len(self.window) < self.window.maxlen:
+            return []
+        k = self.k
+        bars = list(self.window)
+        ch, cl, co = bars[k]
+        center = self.index - k
+        events = []
+        if ch > max(b[0] for b in bars[:k]) and ch >= max(b[0] for b in bars[k + 1:]):
+            if self._pair(self.last_high, center, ch, co, +1):
+                events.append(("bearish", self.index))
+            self.last_high = (center, ch, co)
+        if cl < min(b[1] for b in bars[:k]) and cl <= min(b[1] for b in bars[k + 1:]):
+            if self._pair(self.last_low, center, cl, co, -1):
+                events.append(("bullish", self.index))
+            self.last_low = (center, cl, co)
+        return events
@@ -0,0 +1,603 @@
+# golden_check.py - مقایسه تفاضلی پیاده‌سازی‌های مرجع (پایتون خالص) با مسیرهای سریع اندیکاتور و موتور قوانین
+#
+# هر مسیر سریع (numpy برداری، هسته‌های دسته‌ای kernels.py با numba یا بدون آن، snapshot مشترک قوانین)
+# کنار مرجع روی فیکسچر ضبط‌شده، OHLCV تصادفی و حالت‌های مرزی اجرا می‌شود:
+#   - هر مقدار اندیکاتور با تلورانس نسبی/مطلق برابر و جای NaN ها دقیقاً یکسان باشد
+#   - بردار RuleResult.passed و وزن پاس‌شده evaluate_rules دقیقاً یکسان باشد
+# و نسبت سرعت هر مسیر به مرجع گزارش می‌شود. خروجی غیر صفر اگر هر مقایسه‌ای شکست بخورد.
+#
+# اجرا:
+#   python golden_check.py
+#   python golden_check.py --random 500 --seed 7 --days 3 --output bench_results/golden.json
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+import kernels
+import market_data
+import patterns
+from candles import CandleSeries
+from config import DIVERGENCE_PIVOT_BARS, DIVERGENCE_MIN_GAP, DIVERGENCE_MAX_GAP, VOLUME_WINDOW
+from data_fetcher import parse_klines, parse_klines_body, loads_json
+from divergence import detect_divergences, PivotTracker
+from indicators import (
+    ema_series, rsi_series, calculate_rsi, calculate_atr, calculate_adx, adx_series,
+    stochastic_series, sar_series, ADXState, StochasticState, calculate_swing_low, calculate_swing_high,
+)
+from volume_stats import volume_snapshot, VolumeStatsRegistry
+
+RTOL = 1e-9
+ATOL = 1e-9
+EDGE_LENGTHS = (0, 1, 2, 13, 14, 15, 27, 28, 29, 50)
+
+# ===== داده =====
+def _series(o, h, l, c, v=None, step=1800, t0=1_700_000_000):
+    n = len(c)
+    t = t0 + step * np.arange(n, dtype=np.float64)
+    v = np.ones(n) if v is None else v
+    return CandleSeries(np.column_stack([t, o, c, h, l, v]) if n else np.empty((0, 6)))
+
+def random_cases(count, seed):
+    # گام تصادفی لگاریتمی با نوسان، طول و مقیاس قیمت متفاوت؛ بخشی از کندل‌ها بدون دامنه (h = l)
+    rng = np.random.default_rng(seed)
+    cases = []
+    for i in range(count):
+        n = int(rng.integers(1, 800))
+        scale = 10 ** rng.uniform(-6, 5)
+        c = scale * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.001, 0.05), n)))
+        o = np.concatenate([[c[0]], c[:-1]])
+        spread = np.abs(rng.normal(0, 0.01, n)) * c
+        h = np.maximum(o, c) + spread
+        l = np.minimum(o, c) - spread
+        flat = rng.random(n) < 0.05
+        h[flat] = l[flat] = o[flat] = c[flat]
+        cases.append((f"random#{i}", _series(o, h, l, c, rng.uniform(0, 1000, n))))
+    return cases
+
+def edge_cases():
+    cases = []
+    for n in EDGE_LENGTHS:
+        ramp = np.linspace(1.0, 2.0, n)
+        cases += [
+            (f"flat[{n}]", _series(*(np.full(n, 5.0),) * 4)),
+            (f"zero_range_ramp[{n}]", _series(ramp, ramp, ramp, ramp)),
+            (f"monotonic_up[{n}]", _series(ramp, ramp * 1.001, ramp * 0.999, ramp * 1.0005)),
+            (f"monotonic_down[{n}]", _series(ramp[::-1], ramp[::-1] * 1.001, ramp[::-1] * 0.999, ramp[::-1] * 0.9995)),
+        ]
+    spike = np.full(60, 100.0)
+    spike[30] = 1e6
+    cases.append(("spike", _series(spike, spike, np.full(60, 100.0), spike)))
+    tiny = 1e-8 * (1 + 0.01 * np.sin(np.arange(200)))
+    cases.append(("tiny_prices", _series(tiny, tiny * 1.01, tiny * 0.99, tiny)))
+    return cases
+
+def fixture_cases(fixture):
+    replay = market_data.ReplayProvider(fixture)
+    return [(f"{symbol}:{tf}", replay.series(symbol, tf))
+            for symbol, tfs in fixture["klines"].items() for tf in tfs]
+
+# ===== مراجع پایتون خالص =====
+def _nan_array(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def ref_ema(s):
+    return _nan_array(ema_series(s.c.tolist(), 21))
+
+def ref_rsi(s):
+    return _nan_array(rsi_series(s.c.tolist(), 14))
+
+def ref_atr(s, period=14):
+    # سری ATR با همان بازگشت calculate_atr (میانگین ساده period کندل اول، سپس Wilder)
+    h, l, c = s.h.tolist(), s.l.tolist(), s.c.tolist()
+    out = [None] * len(c)
+    atr = 0.0
+    for t in range(1, len(c)):
+        tr = max(h[t] - l[t], abs(h[t] - c[t - 1]), abs(l[t] - c[t - 1]))
+        if t <= period:
+            atr += tr
+            if t < period:
+                continue
+            atr /= period
+        else:
+            atr = (atr * (period - 1) + tr) / period
+        out[t] = atr
+    return _nan_array(out)
+
+def ref_adx(s, period=14):
+    """
+    ADX کتاب Wilder با جمع‌های هموارشده (TR14 = TR14 - TR14/14 + TR) به جای میانگین؛ مستقل از indicators.py.
+    قرارداد مخرج صفر همان پیاده‌سازی اصلی است: DI و DX صفر.
+    """
+    h, l, c = s.h.tolist(), s.l.tolist(), s.c.tolist()
+    n = len(c)
+    adx, plus_di, minus_di = [None] * n, [None] * n, [None] * n
+    tr_sum = plus_sum = minus_sum = 0.0
+    dxs = []
+    for t in range(1, n):
+        up, down = h[t] - h[t - 1], l[t - 1] - l[t]
+        plus_dm = up if up > down and up > 0 else 0.0
+        minus_dm = down if down > up and down > 0 else 0.0
+        tr = max(h[t] - l[t], abs(h[t] - c[t - 1]), abs(l[t] - c[t - 1]))
+        if t <= period:
+            tr_sum, plus_sum, minus_sum = tr_sum + tr, plus_sum + plus_dm, minus_sum + minus_dm
+            if t < period:
+                continue
+        else:
+            tr_sum = tr_sum - tr_sum / period + tr
+            plus_sum = plus_sum - plus_sum / period + plus_dm
+            minus_sum = minus_sum - minus_sum / period + minus_dm
+        plus_di[t] = 100.0 * plus_sum / tr_sum if tr_sum > 0 else 0.0
+        minus_di[t] = 100.0 * minus_sum / tr_sum if tr_sum > 0 else 0.0
+        di_sum = plus_di[t] + minus_di[t]
+        dxs.append(100.0 * abs(plus_di[t] - minus_di[t]) / di_sum if di_sum > 0 else 0.0)
+        if len(dxs) == period:
+            adx[t] = sum(dxs) / period
+        elif len(dxs) > period:
+            adx[t] = (adx[t - 1] * (period - 1) + dxs[-1]) / period
+    return _nan_array(adx), _nan_array(plus_di), _nan_array(minus_di)
+
+def ref_sar(s, step=0.02, max_step=0.2):
+    """
+    Parabolic SAR کتاب Wilder با حلقه روی آرایه‌ها (مستقل از SARState).
+    شروع مثل پیاده‌سازی اصلی: جهت از میانه کندل دوم نسبت به اول، SAR اولیه کف/سقف دو کندل.
+    """
+    h, l = s.h.tolist(), s.l.tolist()
+    n = len(h)
+    out = [None] * n
+    if n < 2:
+        return _nan_array(out)
+    rising = h[1] + l[1] >= h[0] + l[0]
+    out[1] = min(l[0], l[1]) if rising else max(h[0], h[1])
+    ep = max(h[0], h[1]) if rising else min(l[0], l[1])
+    af = step
+    for t in range(2, n):
+        sar = out[t - 1] + af * (ep - out[t - 1])
+        if rising:
+            sar = min(sar, l[t - 1], l[t - 2])
+            if l[t] < sar:
+                rising, sar, ep, af = False, ep, l[t], step
+            elif h[t] > ep:
+                ep, af = h[t], min(af + step, max_step)
+        else:
+            sar = max(sar, h[t - 1], h[t - 2])
+            if h[t] > sar:
+                rising, sar, ep, af = True, ep, h[t], step
+            elif l[t] < ep:
+                ep, af = l[t], min(af + step, max_step)
+        out[t] = sar
+    return _nan_array(out)
+
+def ref_stochastic(s, period=14, smooth_k=3, smooth_d=3):
+    # Stochastic کند: %K سریع از max/min هر پنجره، %K = SMA(smooth_k) و %D = SMA(smooth_d)؛ حلقه ساده O(n·period)
+    h, l, c = s.h.tolist(), s.l.tolist(), s.c.tolist()
+    n = len(c)
+    fast, k, d = [None] * n, [None] * n, [None] * n
+    for t in range(period - 1, n):
+        hh, ll = max(h[t - period + 1:t + 1]), min(l[t - period + 1:t + 1])
+        fast[t] = 100.0 * (c[t] - ll) / (hh - ll) if hh != ll else 0.0
+    for t in range(period + smooth_k - 2, n):
+        k[t] = sum(fast[t - smooth_k + 1:t + 1]) / smooth_k
+    for t in range(period + smooth_k + smooth_d - 3, n):
+        d[t] = sum(k[t - smooth_d + 1:t + 1]) / smooth_d
+    return _nan_array(k), _nan_array(d)
+
+def _state_series(state_cls, cases, columns):
+    # اجرای نسخه افزایشی کندل به کندل روی هر مورد
+    out = []
+    for _, s in cases:
+        state = state_cls()
+        rows = [state.update(h, l, c) for h, l, c in zip(s.h.tolist(), s.l.tolist(), s.c.tolist())]
+        out.append(tuple(_nan_array(col) for col in zip(*rows)) if rows else (np.empty(0),) * columns)
+    return out
+
+# ----- الگوها: تابع اسکالر روی هر پیشوند سری (همان چیزی که اسکن زنده می‌بیند) -----
+PATTERN_CODES = {"DoubleTop": 1.0, "DoubleBottom": -1.0, None: 0.0}
+
+def _pattern_inputs(s):
+    closes = s.c.tolist()
+    return closes, ema_series(closes, 21), ema_series(closes, 50)
+
+def ref_patterns(s):
+    rows = s.rows
+    closes, ema21, ema50 = _pattern_inputs(s)
+    prefixes = [closes[:i + 1] for i in range(len(closes))]
+    return (
+        _nan_array([calculate_swing_low(rows[:i + 1]) for i in range(len(rows))]),
+        _nan_array([calculate_swing_high(rows[:i + 1]) for i in range(len(rows))]),
+        np.array([bool(patterns.pullback(p, "LONG")) for p in prefixes], dtype=np.float64),
+        np.array([bool(patterns.pullback(p, "SHORT")) for p in prefixes], dtype=np.float64),
+        np.array([PATTERN_CODES[patterns.double_top_bottom(p)] for p in prefixes]),
+        np.array([bool(patterns.ema_rejection(p, e)) for p, e in zip(prefixes, ema21)], dtype=np.float64),
+        np.array([bool(patterns.resistance_test(p, e)) for p, e in zip(prefixes, ema50)], dtype=np.float64),
+    )
+
+def pattern_variant(cases):
+    out = []
+    for _, s in cases:
+        closes, ema21, ema50 = _pattern_inputs(s)
+        out.append((
+            _nan_array(patterns.swing_low_series(s)),
+            _nan_array(patterns.swing_high_series(s)),
+            np.array(patterns.pullback_series(closes, "LONG"), dtype=np.float64),
+            np.array(patterns.pullback_series(closes, "SHORT"), dtype=np.float64),
+            np.array([PATTERN_CODES[x] for x in patterns.double_top_bottom_series(closes)]),
+            np.array(patterns.ema_rejection_series(closes, ema21), dtype=np.float64),
+            np.array(patterns.resistance_test_series(closes, ema50), dtype=np.float64),
+        ))
+    return out
+
+# ----- واگرایی: پیوت و جفت‌سازی با حلقه ساده روی RSI (همان نوسان‌گر recent_divergences) -----
+def _divergence_events(n, bullish, bearish):
+    # (نشانگر تایید صعودی، نزولی) هر کندل
+    out = np.zeros((2, n))
+    out[0, np.asarray(bullish, dtype=np.int64)] = 1.0
+    out[1, np.asarray(bearish, dtype=np.int64)] = 1.0
+    return out[0], out[1]
+
+def ref_divergence(s, k=DIVERGENCE_PIVOT_BARS, min_gap=DIVERGENCE_MIN_GAP, max_gap=DIVERGENCE_MAX_GAP):
+    h, l = s.h.tolist(), s.l.tolist()
+    osc = _nan_array(rsi_series(s.c.tolist())).tolist()
+    bullish, bearish = [], []
+    last_high = last_low = None
+    for c in range(k, len(h) - k):
+        if h[c] > max(h[c - k:c]) and h[c] >= max(h[c + 1:c + k + 1]):
+            if last_high is not None and min_gap <= c - last_high <= max_gap \
+                    and not np.isnan(osc[c]) and not np.isnan(osc[last_high]) \
+                    and h[c] > h[last_high] and osc[c] < osc[last_high]:
+                bearish.append(c + k)
+            last_high = c
+        if l[c] < min(l[c - k:c]) and l[c] <= min(l[c + 1:c + k + 1]):
+            if last_low is not None and min_gap <= c - last_low <= max_gap \
+                    and not np.isnan(osc[c]) and not np.isnan(osc[last_low]) \
+                    and l[c] < l[last_low] and osc[c] > osc[last_low]:
+                bullish.append(c + k)
+            last_low = c
+    return _divergence_events(len(h), bullish, bearish)
+
+def divergence_variant(cases):
+    # find_pivots + جفت‌سازی برداری
+    out = []
+    for _, s in cases:
+        bullish, bearish = detect_divergences(s.h, s.l, _nan_array(rsi_series(s.c.tolist())))
+        out.append(_divergence_events(len(s), bullish, bearish))
+    return out
+
+def pivot_tracker_variant(cases):
+    out = []
+    for _, s in cases:
+        tracker = PivotTracker()
+        osc = _nan_array(rsi_series(s.c.tolist())).tolist()
+        events = [e for h, l, o in zip(s.h.tolist(), s.l.tolist(), osc) for e in tracker.update(h, l, o)]
+        out.append(_divergence_events(len(s), [i for kind, i in events if kind == "bullish"],
+                                      [i for kind, i in events if kind == "bearish"]))
+    return out
+
+# ----- آمار حجم: میانگین/انحراف معیار/صدک کندل جاری نسبت به پنجره قبلی با حلقه ساده -----
+VOLUME_FIELDS = ("mean", "std", "spike_factor", "zscore", "percentile")
+
+def _volume_columns(snapshots):
+    return tuple(_nan_array([snap[f] if snap else None for snap in snapshots]) for f in VOLUME_FIELDS)
+
+def ref_volume(s, window=VOLUME_WINDOW):
+    v = s.v.tolist()
+    snapshots = [None]
+    for i in range(1, len(v)):
+        base = v[max(0, i - window):i]
+        mean = sum(base) / len(base)
+        std = (sum((x - mean) ** 2 for x in base) / len(base)) ** 0.5
+        snapshots.append({
+            "mean": mean, "std": std,
+            "spike_factor": v[i] / mean if mean > 0 else 1.0,
+            "zscore": (v[i] - mean) / std if std > 0 else 0.0,
+            "percentile": sum(x <= v[i] for x in base) / len(base) * 100.0,
+        })
+    return _volume_columns(snapshots[:len(v)])
+
+def volume_snapshot_variant(cases):
+    return [_volume_columns([volume_snapshot(s[:i + 1]) for i in range(len(s))]) for _, s in cases]
+
+def volume_registry_variant(cases):
+    out = []
+    for label, s in cases:
+        registry = VolumeStatsRegistry()
+        out.append(_volume_columns([registry.update(label, "30m", t, v) for t, v in zip(s.t.tolist(), s.v.tolist())]))
+    return out
+
+# ----- پارس پاسخ candles: مسیر عادی (json + parse_klines) در برابر parse_klines_body -----
+_bodies = {}
+
+def _klines_body(s, compact=True):
+    # بدنه پاسخ KuCoin (ردیف‌های رشته‌ای جدیدترین اول) یک بار برای هر مورد؛ زمان ساخت جزو اندازه‌گیری نیست
+    key = (id(s), compact)
+    if key not in _bodies:
+        payload = {"code": "200000", "data": market_data.series_to_rows(s)}
+        _bodies[key] = json.dumps(payload, separators=(",", ":") if compact else None).encode("utf-8")
+    return _bodies[key]
+
+def ref_parse(s):
+    return parse_klines(loads_json(_klines_body(s))["data"]).arr
+
+# ===== مسیرهای سریع =====
+def _unstack(matrix, cases):
+    return [matrix[i, matrix.shape[1] - len(s):] for i, (_, s) in enumerate(cases)]
+
+def _stacked(cases):
+    c, starts = kernels.stack([s.c for _, s in cases])
+    h, _ = kernels.stack([s.h for _, s in cases])
+    l, _ = kernels.stack([s.l for _, s in cases])
+    return h, l, c, starts
+
+def _batch_variants(fn, unpack):
+    # یک نسخه برای هر backend موجود؛ زمان stack جزو زمان مسیر سریع است
+    variants = {}
+    for name in ("numpy", "numba"):
+        if kernels.backend(name) == name:
+            variants[f"kernels.{name}"] = lambda cases, name=name: unpack(fn(_stacked(cases), name), cases)
+    return variants
+
+CHECKS = {
+    "ema21": (ref_ema, _batch_variants(
+        lambda m, b: kernels.ema_batch(m[2], 21, m[3], b), _unstack)),
+    "rsi14": (ref_rsi, _batch_variants(
+        lambda m, b: kernels.rsi_batch(m[2], 14, m[3], b), _unstack)),
+    "atr14": (ref_atr, _batch_variants(
+        lambda m, b: kernels.atr_batch(m[0], m[1], m[2], 14, m[3], b), _unstack)),
+    "adx14": (ref_adx, {
+        "adx_series": lambda cases: [adx_series(s) for _, s in cases],
+        "ADXState": lambda cases: _state_series(ADXState, cases, 3),
+        **_batch_variants(lambda m, b: kernels.adx_batch(m[0], m[1], m[2], 14, m[3], b),
+                          lambda out, cases: list(zip(*(_unstack(x, cases) for x in out)))),
+    }),
+    "stochastic": (ref_stochastic, {
+        "stochastic_series": lambda cases: [stochastic_series(s) for _, s in cases],
+        "StochasticState": lambda cases: _state_series(StochasticState, cases, 2),
+    }),
+    "sar": (ref_sar, {
+        "sar_series": lambda cases: [sar_series(s) for _, s in cases],
+    }),
+    "patterns": (ref_patterns, {"*_series": pattern_variant}),
+    "divergence": (ref_divergence, {
+        "find_pivots": divergence_variant,
+        "PivotTracker": pivot_tracker_variant,
+    }),
+    "volume": (ref_volume, {
+        "volume_snapshot": volume_snapshot_variant,
+        "RollingVolumeStats": volume_registry_variant,
+    }),
+    "parse_klines": (ref_parse, {
+        "parse_klines_body": lambda cases: [parse_klines_body(_klines_body(s)).arr for _, s in cases],
+        "parse_klines_body:spaced": lambda cases: [parse_klines_body(_klines_body(s, False)).arr for _, s in cases],
+    }),
+}
+
+# مقدار آخر (همان چیزی که قوانین می‌بینند) با گرد کردن تابع اصلی
+LAST_VALUE_CHECKS = {
+    "calculate_rsi": (lambda s: calculate_rsi(s.c.tolist()), lambda x: x),
+    "calculate_atr": (calculate_atr, lambda x: round(x, 6)),
+    "calculate_adx": (lambda s: calculate_adx(s)[0], lambda x: round(x, 2)),
+}
+
+# ===== مقایسه =====
+def compare(ref, got, rtol=RTOL, atol=ATOL):
+    # (تعداد مقدار خارج از تلورانس، عدم تطابق NaN، بیشترین خطای مطلق)
+    ref = np.asarray(ref, dtype=np.float64)
+    got = np.asarray(got, dtype=np.float64)
+    if ref.shape != got.shape:
+        return max(len(ref), 1), 0, float("inf")
+    ref_nan, got_nan = np.isnan(ref), np.isnan(got)
+    nan_mismatch = int((ref_nan != got_nan).sum())
+    both = ~ref_nan & ~got_nan
+    err = np.abs(ref[both] - got[both])
+    bad = int((err > atol + rtol * np.abs(ref[both])).sum())
+    return bad, nan_mismatch, float(err.max()) if len(err) else 0.0
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def check_indicators(cases):
+    results = {}
+    for check, (reference, variants) in CHECKS.items():
+        refs, ref_s = _timed(lambda: [reference(s) for _, s in cases])
+        for variant, fn in variants.items():
+            outs, fast_s = _timed(fn, cases)
+            failures, max_err = [], 0.0
+            for (label, _), ref, got in zip(cases, refs, outs):
+                parts = zip(ref, got) if isinstance(ref, tuple) else [(ref, got)]
+                for part, (r, g) in enumerate(parts):
+                    bad, nan_mismatch, err = compare(r, g)
+                    max_err = max(max_err, err)
+                    if bad or nan_mismatch:
+                        failures.append(f"{label}[{part}]: {bad} خارج از تلورانس، {nan_mismatch} NaN نامنطبق، خطا={err:.3g}")
+            results[f"{check}:{variant}"] = _result(len(cases), failures, max_err, ref_s, fast_s)
+
+    matrices = _stacked(cases)
+    fast_last = {
+        "calculate_rsi": kernels.rsi_batch(matrices[2], 14, matrices[3])[:, -1],
+        "calculate_atr": kernels.atr_batch(*matrices[:3], 14, matrices[3])[:, -1],
+        "calculate_adx": kernels.adx_batch(*matrices[:3], 14, matrices[3])[0][:, -1],
+    }
+    for check, (reference, rounding) in LAST_VALUE_CHECKS.items():
+        failures = []
+        for (label, s), value in zip(cases, fast_last[check].tolist()):
+            ref = reference(s)
+            got = None if np.isnan(value) else rounding(value)
+            if (ref is None) != (got is None) or (ref is not None and abs(ref - got) > ATOL + RTOL * abs(ref)):
+                failures.append(f"{label}: مرجع={ref} سریع={got}")
+        results[f"{check}:kernels.{kernels.backend()}"] = _result(len(cases), failures, 0.0, None, None)
+    return results
+
+def _result(cases, failures, max_err, ref_s, fast_s):
+    return {
+        "cases": cases, "failures": len(failures), "examples": failures[:5], "max_abs_err": max_err,
+        "reference_ms": ref_s * 1000 if ref_s is not None else None,
+        "fast_ms": fast_s * 1000 if fast_s is not None else None,
+        "speedup": ref_s / fast_s if ref_s and fast_s else None,
+    }
+
+# ===== موتور قوانین =====
+def rule_decisions(fixture, days):
+    # (نماد، لحظه، ورودی‌ها، kwargs) برای هر بسته شدن کندل 30m در days روز آخر فیکسچر (همان مسیر backtest)
+    # و (نماد، start، end، داده) هر نماد برای check_replay
+    import backtest
+    from asof import AsOfIndex
+    from config import HISTORY_MIN_BARS
+
+    replay = market_data.ReplayProvider(fixture)
+    end = replay.now()
+    start = end - days * 86400
+    min_bars = {**{tf: 1 for tf in backtest.TIMEFRAME_DAYS}, **HISTORY_MIN_BARS}
+    decisions, histories = [], []
+    for symbol in fixture["klines"]:
+        data = backtest.load_history(symbol, start, end, replay)
+        histories.append((symbol, start, end, data))
+        index = AsOfIndex({tf: c for tf, c in data.items() if len(c)}, backtest.lookback_bars())
+        for now, view in index.replay("30m", start, end, min_bars):
+            inputs = backtest.build_signal_inputs(view)
+            decisions.append((symbol, now, inputs, backtest.rule_kwargs(symbol, inputs)))
+    return decisions, histories
+
+def check_rules(decisions):
+    import rules
+
+    def passed(kwargs_list):
+        out = []
+        for kwargs in kwargs_list:
+            rule_results, passed_weight, _ = rules.evaluate_rules(**kwargs)
+            out.append(([r.passed for r in rule_results], passed_weight))
+        return out
+
+    def snapshot_variant():
+        return passed([dict(kw, snapshot=rules.indicator_snapshot(kw["candles"])) for _, _, _, kw in decisions])
+
+    def kernel_variant():
+        # EMA/RSI/ADX ورودی قوانین از هسته‌های دسته‌ای روی همه لحظه‌ها در یک فراخوانی
+        candles = [kw["candles"] for _, _, _, kw in decisions]
+        c, starts = kernels.stack([s.c for s in candles])
+        h, _ = kernels.stack([s.h for s in candles])
+        l, _ = kernels.stack([s.l for s in candles])
+        ema = {p: kernels.ema_batch(c, p, starts)[:, -1] for p in (8, 21, 50)}
+        rsi = kernels.rsi_batch(c, 14, starts)[:, -1]
+        adx, plus_di, minus_di = (x[:, -1] for x in kernels.adx_batch(h, l, c, 14, starts))
+        kwargs_list = []
+        for i, (_, _, _, kw) in enumerate(decisions):
+            snapshot = rules.indicator_snapshot(kw["candles"])
+            if len(kw["candles"]) >= 28:
+                snapshot["adx"] = (round(adx[i], 2), round(plus_di[i], 2), round(minus_di[i], 2))
+            kwargs_list.append(dict(
+                kw, ema8_30m=ema[8][i], ema21_30m=ema[21][i], ema50_30m=ema[50][i],
+                rsi_30m=None if np.isnan(rsi[i]) else rsi[i],
+                adx_value=snapshot["adx"][0] or 0, snapshot=snapshot,
+            ))
+        return passed(kwargs_list)
+
+    refs, ref_s = _timed(passed, [kw for _, _, _, kw in decisions])
+    results = {}
+    for variant, fn in (("snapshot", snapshot_variant), (f"kernels.{kernels.backend()}", kernel_variant)):
+        outs, fast_s = _timed(fn)
+        failures = []
+        for (symbol, now, _, _), (ref_passed, ref_weight), (got_passed, got_weight) in zip(decisions, refs, outs):
+            if ref_passed != got_passed or ref_weight != got_weight:
+                diff = [i for i, (a, b) in enumerate(zip(ref_passed, got_passed)) if a != b]
+                failures.append(f"{symbol}@{now}: قوانین متفاوت {diff}، وزن {ref_weight} ↔ {got_weight}")
+        results[f"evaluate_rules:{variant}"] = _result(len(decisions), failures, 0.0, ref_s, fast_s)
+    return results
+
+def check_replay(histories):
+    # تصمیم‌های backtest.replay_symbol (هسته‌ها، سری الگوها، ردیاب‌های افزایشی) در برابر مسیر اسکن زنده روی هر نما
+    import backtest
+    from asof import AsOfIndex
+    from config import HISTORY_MIN_BARS
+
+    min_bars = {**{tf: 1 for tf in backtest.TIMEFRAME_DAYS}, **HISTORY_MIN_BARS}
+
+    def live():
+        out = []
+        for symbol, start, end, data in histories:
+            index = AsOfIndex({tf: c for tf, c in data.items() if len(c)}, backtest.lookback_bars())
+            for now, view in index.replay("30m", start, end, min_bars):
+                inputs = backtest.build_signal_inputs(view)
+                rule_results, _, _ = backtest.evaluate_rules(**backtest.rule_kwargs(symbol, inputs))
+                out.append((symbol, now, inputs["direction"], [r.passed for r in rule_results]))
+        return out
+
+    def replay():
+        return [(symbol, d["t"], d["direction"], d["passed"])
+                for symbol, start, end, data in histories
+                for d in backtest.replay_symbol(symbol, start, end, data=data)]
+
+    refs, ref_s = _timed(live)
+    outs, fast_s = _timed(replay)
+    failures = []
+    if len(refs) != len(outs):
+        failures.append(f"تعداد تصمیم‌ها متفاوت: {len(refs)} ↔ {len(outs)}")
+    for (symbol, now, ref_dir, ref_passed), (_, _, got_dir, got_passed) in zip(refs, outs):
+        if ref_dir != got_dir or ref_passed != got_passed:
+            diff = [i for i, (a, b) in enumerate(zip(ref_passed, got_passed)) if a != b]
+            failures.append(f"{symbol}@{now}: جهت {ref_dir} ↔ {got_dir}، قوانین متفاوت {diff}")
+    return {"replay_symbol": _result(len(refs), failures, 0.0, ref_s, fast_s)}
+
+# ===== اجرا =====
+def run(fixture_path, random_count, seed, days):
+    fixture = benchmark.load_fixture(fixture_path)
+    kernels.warmup()
+    suites = {
+        "fixture": fixture_cases(fixture),
+        "random": random_cases(random_count, seed),
+        "edge": edge_cases(),
+    }
+    report = {"backend": kernels.backend(), "rtol": RTOL, "atol": ATOL,
+              "fixture_source": fixture.get("source"), "suites": {}}
+    for name, cases in suites.items():
+        report["suites"][name] = check_indicators(cases)
+    decisions, histories = rule_decisions(fixture, days)
+    report["suites"]["rules"] = {**check_rules(decisions), **check_replay(histories)}
+    report["failures"] = sum(r["failures"] for suite in report["suites"].values() for r in suite.values())
+    return report
+
+def print_report(report):
+    print(f"backend هسته‌ها: {report['backend']} | تلورانس: rtol={report['rtol']:g} atol={report['atol']:g}")
+    if report.get("fixture_source") == "synthetic":
+        # گام تصادفی مصنوعی شکاف، کندل تخت و رفتار واقعی بازار را ندارد؛ نتیجه suite fixture و rules قطعی نیست
+        print("⚠️ فیکسچر ضبط‌شده پیدا نشد → داده مصنوعی؛ برای مقایسه روی داده واقعی: python benchmark.py --record")
+    for suite, results in report["suites"].items():
+        print(f"\n=== {suite} ===")
+        print(f"{'check':<40}{'cases':>7}{'fail':>6}{'max err':>11}{'ref ms':>10}{'fast ms':>10}{'speedup':>9}")
+        for check, r in results.items():
+            ref_ms = f"{r['reference_ms']:.1f}" if r["reference_ms"] is not None else "-"
+            fast_ms = f"{r['fast_ms']:.1f}" if r["fast_ms"] is not None else "-"
+            speedup = f"{r['speedup']:.1f}x" if r["speedup"] else "-"
+            print(f"{check:<40}{r['cases']:>7}{r['failures']:>6}{r['max_abs_err']:>11.2e}{ref_ms:>10}{fast_ms:>10}{speedup:>9}")
+            for example in r["examples"]:
+                print(f"      ❌ {example}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="مقایسه مرجع و مسیرهای سریع اندیکاتور و قوانین")
+    parser.add_argument("--fixture", default=benchmark.FIXTURE_PATH)
+    parser.add_argument("--random", type=int, default=200, help="تعداد سری OHLCV تصادفی")
+    parser.add_argument("--seed", type=int, default=20261018)
+    parser.add_argument("--days", type=int, default=2, help="روزهای آخر فیکسچر برای بازپخش قوانین")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    report = run(args.fixture, args.random, args.seed, args.days)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if report["failures"]:
+        print(f"\n❌ {report['failures']} مقایسه ناموفق")
+        return 1
+    print("\n✅ همه مسیرهای سریع با مرجع برابرند")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
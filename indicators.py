@@ -1,4 +1,10 @@
 import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candles import CandleSeries, rows_of
 
 # ===== EMA =====
 def ema_series(prices, period):
@@ -35,6 +41,29 @@ def calculate_rsi(prices, period=14):
     rs = avg_gain / avg_loss
     return 100.0 - (100.0 / (1.0 + rs))
 
+def rsi_series(prices, period=14):
+    # مقدار RSI برای هر کندل؛ مقدار آخر برابر calculate_rsi(prices) است
+    n = len(prices)
+    if n < period + 1:
+        return [None] * n
+    gains, losses = [], []
+    for i in range(1, n):
+        change = prices[i] - prices[i - 1]
+        gains.append(max(change, 0.0))
+        losses.append(max(-change, 0.0))
+    avg_gain = sum(gains[:period]) / period
+    avg_loss = sum(losses[:period]) / period
+    out = [None] * period
+    if avg_loss == 0:
+        # مطابق calculate_rsi: میانگین اولیه بدون ضرر → 100 برای کل سری
+        return out + [100.0] * (n - period)
+    out.append(100.0 - (100.0 / (1.0 + avg_gain / avg_loss)))
+    for i in range(period, len(gains)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+        out.append(100.0 if avg_loss == 0 else 100.0 - (100.0 / (1.0 + avg_gain / avg_loss)))
+    return out
+
 # ===== MACD =====
 def calculate_macd(prices, fast=12, slow=26, signal_period=9):
     if len(prices) < slow + signal_period:
@@ -50,10 +79,25 @@ def calculate_macd(prices, fast=12, slow=26, signal_period=9):
     histogram = [m - s if m and s else None for m, s in zip(macd_line, signal_series)]
     return {'macd': macd_line[-1], 'signal': signal_series[-1], 'histogram': histogram[-1]}
 
+def macd_series(prices, fast=12, slow=26, signal_period=9):
+    # سری کامل MACD؛ مقدار آخر هر سری برابر خروجی calculate_macd است
+    n = len(prices)
+    if n < slow + signal_period:
+        return {'macd': [None] * n, 'signal': [None] * n, 'histogram': [None] * n}
+    ema_fast = ema_series(prices, fast)
+    ema_slow = ema_series(prices, slow)
+    macd_line = [(f - s) if f is not None and s is not None else None for f, s in zip(ema_fast, ema_slow)]
+    valid_macd = [m for m in macd_line if m is not None]
+    signal_full = ema_series(valid_macd, signal_period)
+    signal_series = [None] * (len(macd_line) - len(signal_full)) + signal_full
+    histogram = [m - s if m and s else None for m, s in zip(macd_line, signal_series)]
+    return {'macd': macd_line, 'signal': signal_series, 'histogram': histogram}
+
 # ===== ATR =====
 def calculate_atr(candles, period=14):
     if len(candles) < period + 1:
         return None
+    candles = rows_of(candles)
     tr_list = []
     for i in range(1, len(candles)):
         high, low, prev_close = candles[i]['h'], candles[i]['l'], candles[i-1]['c']
@@ -72,28 +116,126 @@ def body_strength(candle):
     body = abs(close_p - open_p)
     total_range = high - low if high > low else 0.000001
     return body / total_range
-# ===== ADX =====
+# ===== ADX (Wilder) =====
+def _hlc(candles):
+    # آرایه‌های high/low/close برای هر دو نوع ورودی
+    if isinstance(candles, CandleSeries):
+        return candles.h, candles.l, candles.c
+    rows = rows_of(candles)
+    return (np.array([c['h'] for c in rows], dtype=np.float64),
+            np.array([c['l'] for c in rows], dtype=np.float64),
+            np.array([c['c'] for c in rows], dtype=np.float64))
+
+def wilder_smooth(x, period, seed):
+    """
+    میانگین Wilder: out[seed] = میانگین x[seed-period+1..seed] و بعد از آن
+    out[t] = (out[t-1]*(period-1) + x[t]) / period؛ قبل از seed مقدار NaN.
+    بازگشت خطی در بلوک‌ها با cumsum حل می‌شود (بدون حلقه روی تک‌تک کندل‌ها).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if seed >= len(x) or seed < period - 1:
+        return out
+    out[seed] = x[seed - period + 1:seed + 1].mean()
+    a = (period - 1) / period
+    block = max(1, int(30.0 / -np.log(a))) if a > 0 else 1
+    prev = out[seed]
+    t = seed + 1
+    while t < len(x):
+        chunk = x[t:t + block] / period
+        powers = a ** np.arange(1, len(chunk) + 1)
+        out[t:t + len(chunk)] = powers * (prev + np.cumsum(chunk / powers))
+        prev = out[t + len(chunk) - 1]
+        t += len(chunk)
+    return out
+
+def adx_series(candles, period=14):
+    """
+    ADX/DI+/DI- کامل Wilder برای کل سری (آرایه هم‌طول کندل‌ها، NaN در ابتدای سری).
+    DI از کندل period و ADX (میانگین Wilder روی DX) از کندل 2*period-1 معتبر است.
+    """
+    high, low, close = _hlc(candles)
+    return adx_arrays(high, low, close, period)
+
+def adx_arrays(high, low, close, period=14):
+    # همان adx_series روی آرایه‌های high/low/close (مرجع هسته‌های دسته‌ای kernels.py)
+    n = len(close)
+    nan = np.full(n, np.nan)
+    if n < period + 1:
+        return nan, nan.copy(), nan.copy()
+    up = np.diff(high)
+    down = -np.diff(low)
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    tr = np.maximum.reduce([high[1:] - low[1:], np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])])
+    # ایندکس 0 این آرایه‌ها مربوط به کندل 1 است
+    atr = wilder_smooth(tr, period, period - 1)
+    sp = wilder_smooth(plus_dm, period, period - 1)
+    sm = wilder_smooth(minus_dm, period, period - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = np.where(atr > 0, 100.0 * sp / atr, 0.0)
+        minus_di = np.where(atr > 0, 100.0 * sm / atr, 0.0)
+        di_sum = plus_di + minus_di
+        dx = np.where(di_sum > 0, 100.0 * np.abs(plus_di - minus_di) / di_sum, 0.0)
+    plus_di[:period - 1] = minus_di[:period - 1] = dx[:period - 1] = np.nan
+    adx = wilder_smooth(dx, period, 2 * period - 2)
+    pad = np.array([np.nan])
+    return np.concatenate([pad, adx]), np.concatenate([pad, plus_di]), np.concatenate([pad, minus_di])
+
+class ADXState:
+    """
+    نسخه افزایشی adx_series: هر update(high, low, close) در O(1) مقدار (adx, di+, di-) کندل جدید را می‌دهد
+    (None تا وقتی داده کافی نیست). برای بک‌تست کندل به کندل.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None
+        self.count = 0          # تعداد TR دیده‌شده
+        self.tr = self.pdm = self.mdm = 0.0
+        self.dx_count = 0
+        self.adx = 0.0
+
+    def update(self, high, low, close):
+        p = self.period
+        if self.prev is None:
+            self.prev = (high, low, close)
+            return None, None, None
+        ph, pl, pc = self.prev
+        self.prev = (high, low, close)
+        up, down = high - ph, pl - low
+        pdm = up if up > down and up > 0 else 0.0
+        mdm = down if down > up and down > 0 else 0.0
+        tr = max(high - low, abs(high - pc), abs(low - pc))
+        self.count += 1
+        if self.count <= p:
+            self.tr += tr / p
+            self.pdm += pdm / p
+            self.mdm += mdm / p
+            if self.count < p:
+                return None, None, None
+        else:
+            self.tr = (self.tr * (p - 1) + tr) / p
+            self.pdm = (self.pdm * (p - 1) + pdm) / p
+            self.mdm = (self.mdm * (p - 1) + mdm) / p
+        plus_di = 100.0 * self.pdm / self.tr if self.tr > 0 else 0.0
+        minus_di = 100.0 * self.mdm / self.tr if self.tr > 0 else 0.0
+        di_sum = plus_di + minus_di
+        dx = 100.0 * abs(plus_di - minus_di) / di_sum if di_sum > 0 else 0.0
+        self.dx_count += 1
+        if self.dx_count <= p:
+            self.adx += dx / p
+            if self.dx_count < p:
+                return None, plus_di, minus_di
+        else:
+            self.adx = (self.adx * (p - 1) + dx) / p
+        return self.adx, plus_di, minus_di
+
 def calculate_adx(candles, period=14):
     if len(candles) < period * 2:
         return None, None, None
-    plus_dm, minus_dm, tr_list = [], [], []
-    prev_close = candles[0]['c']
-    prev_high = candles[0]['h']
-    prev_low = candles[0]['l']
-    for c in candles[1:]:
-        high, low, close = c['h'], c['l'], c['c']
-        up_move = high - prev_high
-        down_move = prev_low - low
-        plus_dm.append(up_move if up_move > down_move and up_move > 0 else 0)
-        minus_dm.append(down_move if down_move > up_move and down_move > 0 else 0)
-        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-        tr_list.append(tr)
-        prev_high, prev_low, prev_close = high, low, close
-    atr = sum(tr_list[:period]) / period
-    plus_di = 100 * (sum(plus_dm[:period]) / atr) if atr else 0
-    minus_di = 100 * (sum(minus_dm[:period]) / atr) if atr else 0
-    dx = abs(plus_di - minus_di) / (plus_di + minus_di) * 100 if (plus_di + minus_di) != 0 else 0
-    return round(dx, 2), round(plus_di, 2), round(minus_di, 2)  # ADX, DI+, DI-
+    adx, plus_di, minus_di = adx_series(candles, period)
+    return round(float(adx[-1]), 2), round(float(plus_di[-1]), 2), round(float(minus_di[-1]), 2)  # ADX, DI+, DI-
 
 def calculate_swing_low(candles, lookback=10):
     if len(candles) < lookback:
@@ -121,26 +263,138 @@ def calculate_cci(candles, period=20):
     return round(cci, 2)
 
 # ===== Parabolic SAR =====
+class SARState:
+    """
+    Parabolic SAR کامل Wilder با update(high, low) در O(1).
+    جهت اولیه از مقایسه کندل دوم با اول (میانه high/low)، سپس گام af با هر سقف/کف جدید
+    تا max_step زیاد می‌شود و با عبور قیمت از SAR جهت برمی‌گردد.
+    """
+
+    def __init__(self, step=0.02, max_step=0.2):
+        self.step = step
+        self.max_step = max_step
+        self.bars = []          # دو کندل قبلی (high, low)
+        self.is_long = None
+        self.sar = None
+        self.ep = None
+        self.af = step
+
+    def update(self, high, low):
+        if self.is_long is None:
+            self.bars.append((high, low))
+            if len(self.bars) < 2:
+                return None
+            (h0, l0), (h1, l1) = self.bars
+            self.is_long = h1 + l1 >= h0 + l0
+            self.sar = min(l0, l1) if self.is_long else max(h0, h1)
+            self.ep = max(h0, h1) if self.is_long else min(l0, l1)
+            return self.sar
+
+        (h2, l2), (h1, l1) = self.bars
+        sar = self.sar + self.af * (self.ep - self.sar)
+        if self.is_long:
+            sar = min(sar, l1, l2)
+            if low < sar:
+                self.is_long, sar, self.ep, self.af = False, self.ep, low, self.step
+            elif high > self.ep:
+                self.ep = high
+                self.af = min(self.af + self.step, self.max_step)
+        else:
+            sar = max(sar, h1, h2)
+            if high > sar:
+                self.is_long, sar, self.ep, self.af = True, self.ep, high, self.step
+            elif low < self.ep:
+                self.ep = low
+                self.af = min(self.af + self.step, self.max_step)
+        self.sar = sar
+        self.bars = [(h1, l1), (high, low)]
+        return sar
+
+def sar_series(candles, step=0.02, max_step=0.2):
+    """
+    SAR کل سری (NaN برای کندل اول). SAR وابسته به مسیر است (برگشت جهت)،
+    پس سری با یک پیمایش از همان SARState ساخته می‌شود.
+    """
+    high, low, _ = _hlc(candles)
+    state = SARState(step, max_step)
+    out = np.full(len(high), np.nan)
+    for i, (h, l) in enumerate(zip(high.tolist(), low.tolist())):
+        value = state.update(h, l)
+        if value is not None:
+            out[i] = value
+    return out
+
 def calculate_sar(candles, step=0.02, max_step=0.2):
     if len(candles) < 2:
         return None
-    # ساده‌سازی: فقط آخرین مقدار SAR
-    prev_high, prev_low = candles[-2]['h'], candles[-2]['l']
-    curr_high, curr_low = candles[-1]['h'], candles[-1]['l']
-    ep = curr_high if curr_high > prev_high else curr_low
-    sar = prev_low + step * (ep - prev_low)
-    return round(sar, 4)
+    return round(float(sar_series(candles, step, max_step)[-1]), 4)
 
 # ===== Stochastic Oscillator =====
+def _sma_valid(x, window):
+    # میانگین ساده غلتان با cumsum؛ NaN تا وقتی پنجره کامل از مقادیر معتبر نیست
+    out = np.full(len(x), np.nan)
+    first = int(np.argmax(~np.isnan(x))) if (~np.isnan(x)).any() else len(x)
+    valid = x[first:]
+    if len(valid) < window:
+        return out
+    cs = np.concatenate([[0.0], np.cumsum(valid)])
+    out[first + window - 1:] = (cs[window:] - cs[:-window]) / window
+    return out
+
+def stochastic_series(candles, period=14, smooth_k=3, smooth_d=3):
+    """
+    Stochastic کامل: %K خام از بیشینه/کمینه period کندل (نمای پنجره‌ای)،
+    %K = میانگین smooth_k کندل از %K خام و %D = میانگین smooth_d کندل از %K.
+    """
+    high, low, close = _hlc(candles)
+    n = len(close)
+    k_raw = np.full(n, np.nan)
+    if n >= period:
+        hh = sliding_window_view(high, period).max(axis=1)
+        ll = sliding_window_view(low, period).min(axis=1)
+        rng = hh - ll
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k_raw[period - 1:] = np.where(rng != 0, 100.0 * (close[period - 1:] - ll) / rng, 0.0)
+    k = _sma_valid(k_raw, smooth_k)
+    d = _sma_valid(k, smooth_d)
+    return k, d
+
+class StochasticState:
+    # نسخه افزایشی stochastic_series با deque یکنوا برای بیشینه/کمینه و جمع غلتان برای میانگین‌ها (O(1))
+    def __init__(self, period=14, smooth_k=3, smooth_d=3):
+        self.period = period
+        self.i = -1
+        self.highs = deque()    # (ایندکس، high) نزولی
+        self.lows = deque()     # (ایندکس، low) صعودی
+        self.k_raw = deque(maxlen=smooth_k)
+        self.k_vals = deque(maxlen=smooth_d)
+
+    def update(self, high, low, close):
+        self.i += 1
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((self.i, high))
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((self.i, low))
+        if self.highs[0][0] <= self.i - self.period:
+            self.highs.popleft()
+        if self.lows[0][0] <= self.i - self.period:
+            self.lows.popleft()
+        if self.i < self.period - 1:
+            return None, None
+        hh, ll = self.highs[0][1], self.lows[0][1]
+        self.k_raw.append(100.0 * (close - ll) / (hh - ll) if hh != ll else 0.0)
+        if len(self.k_raw) < self.k_raw.maxlen:
+            return None, None
+        k = sum(self.k_raw) / len(self.k_raw)
+        self.k_vals.append(k)
+        if len(self.k_vals) < self.k_vals.maxlen:
+            return k, None
+        return k, sum(self.k_vals) / len(self.k_vals)
+
 def calculate_stochastic(candles, period=14, smooth_k=3, smooth_d=3):
-    if len(candles) < period:
+    if len(candles) < period + smooth_k + smooth_d - 2:
         return None, None
-    closes = [c['c'] for c in candles]
-    highs = [c['h'] for c in candles]
-    lows = [c['l'] for c in candles]
-    highest_high = max(highs[-period:])
-    lowest_low = min(lows[-period:])
-    k = 100 * (closes[-1] - lowest_low) / (highest_high - lowest_low) if highest_high != lowest_low else 0
-    k_series = [k]
-    d = sum(k_series[-smooth_d:]) / smooth_d
-    return round(k, 2), round(d, 2)
+    k, d = stochastic_series(candles, period, smooth_k, smooth_d)
+    return round(float(k[-1]), 2), round(float(d[-1]), 2)
@@ -0,0 +1,112 @@
+# integrity.py - اعتبارسنجی برداری سری کندل قبل از اندیکاتورها: ترتیب، تکراری، شکاف، کندل در حال شکل‌گیری، حجم صفر
+import logging
+
+import numpy as np
+
+from candles import CandleSeries
+from config import INTEGRITY_BACKFILL_FROM_ARCHIVE, INTEGRITY_MAX_GAP_RATIO
+from data_fetcher import INTERVAL_SECONDS
+from metrics import incr, run_metrics
+
+logger = logging.getLogger(__name__)
+
+def _as_series(candles):
+    return candles if isinstance(candles, CandleSeries) else CandleSeries.from_dicts(candles)
+
+def check_series(candles, interval, now=None):
+    """
+    پاکسازی و گزارش کیفیت یک سری (همه مراحل برداری، بدون حلقه پایتون):
+    - مرتب‌سازی اگر ترتیب زمانی به هم ریخته باشد و حذف زمان‌های تکراری (اولین نگه داشته می‌شود)
+    - حذف کندل در حال شکل‌گیری: t + طول کندل > now (فقط اگر now داده شود)
+    - شمارش شکاف‌ها نسبت به گام مورد انتظار، کندل‌های حجم صفر و OHLC نامعتبر (فقط گزارش)
+    خروجی: (سری پاک‌شده، گزارش)
+    """
+    series = _as_series(candles)
+    step = INTERVAL_SECONDS[interval]
+    arr = series.arr
+    report = {"bars": len(arr), "unsorted": False, "duplicates": 0, "forming_trimmed": 0,
+              "gaps": 0, "missing_bars": 0, "max_gap_bars": 0, "zero_volume": 0, "bad_ohlc": 0}
+    if not len(arr):
+        return series, report
+
+    t = arr[:, 0]
+    diffs = np.diff(t)
+    if (diffs <= 0).any():
+        if (diffs < 0).any():
+            report["unsorted"] = True
+            arr = arr[np.argsort(t, kind="stable")]
+            t = arr[:, 0]
+        keep = np.ones(len(arr), dtype=bool)
+        keep[1:] = t[1:] != t[:-1]
+        report["duplicates"] = int(len(arr) - keep.sum())
+        arr = arr[keep]
+        t = arr[:, 0]
+        diffs = np.diff(t)
+
+    if now is not None:
+        closed = int(np.searchsorted(t, now - step, side="right"))
+        report["forming_trimmed"] = len(arr) - closed
+        if closed < len(arr):
+            arr = arr[:closed]
+            t = arr[:, 0]
+            diffs = diffs[:max(closed - 1, 0)]
+
+    missing = diffs // step - 1
+    gap_mask = missing > 0
+    if gap_mask.any():
+        report["gaps"] = int(gap_mask.sum())
+        report["missing_bars"] = int(missing[gap_mask].sum())
+        report["max_gap_bars"] = int(missing.max())
+    o, c, h, l, v = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4], arr[:, 5]
+    report["zero_volume"] = int((v <= 0).sum())
+    report["bad_ohlc"] = int(((h < np.maximum(o, c)) | (l > np.minimum(o, c)) | (l <= 0)).sum())
+    report["bars"] = len(arr)
+    return (series if arr is series.arr else CandleSeries(arr)), report
+
+def gap_ranges(series, interval):
+    # [(شروع، پایان)] زمان کندل‌های گمشده بین کندل‌های موجود (دو سر شامل)
+    t = series.t
+    step = INTERVAL_SECONDS[interval]
+    idx = np.nonzero(np.diff(t) > step)[0]
+    return [(int(t[i]) + step, int(t[i + 1]) - step) for i in idx.tolist()]
+
+def backfill_gaps(series, symbol, interval, archive):
+    # پر کردن شکاف‌ها از آرشیو محلی (candle_archive)؛ فقط کندل‌های واقعاً موجود در آرشیو اضافه می‌شوند
+    ranges = gap_ranges(series, interval)
+    parts = [archive.range(symbol, interval, s, e).arr for s, e in ranges]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return series, 0
+    arr = np.concatenate([series.arr] + parts)
+    arr = arr[np.argsort(arr[:, 0], kind="stable")]
+    return CandleSeries(arr), sum(len(p) for p in parts)
+
+def validate_series(candles, symbol, interval, now=None, archive=None):
+    """
+    مرحله اعتبارسنجی مشترک برای هر سری دریافتی یا cache شده.
+    اگر INTEGRITY_BACKFILL_FROM_ARCHIVE فعال باشد (یا archive داده شود) شکاف‌ها از آرشیو پر می‌شوند.
+    گزارش در run_metrics (بخش data_quality) و شمارنده‌ها ثبت می‌شود.
+    """
+    series, report = check_series(candles, interval, now)
+    if report["gaps"] and (archive is not None or INTEGRITY_BACKFILL_FROM_ARCHIVE):
+        if archive is None:
+            from candle_archive import CandleArchive
+            archive = CandleArchive()
+        series, filled = backfill_gaps(series, symbol, interval, archive)
+        if filled:
+            report["backfilled"] = filled
+            series, refreshed = check_series(series, interval)
+            report.update({k: refreshed[k] for k in ("bars", "gaps", "missing_bars", "max_gap_bars")})
+
+    run_metrics.record_quality(symbol, interval, report)
+    for key in ("duplicates", "forming_trimmed", "missing_bars", "zero_volume", "bad_ohlc"):
+        if report[key]:
+            incr(f"bars_{key}", report[key])
+    expected = report["bars"] + report["missing_bars"]
+    if expected and report["missing_bars"] / expected > INTEGRITY_MAX_GAP_RATIO:
+        logger.warning("⚠️ شکاف داده %s %s: %d کندل گمشده در %d شکاف (بزرگ‌ترین %d کندل)",
+                       symbol, interval, report["missing_bars"], report["gaps"], report["max_gap_bars"])
+    elif report["duplicates"] or report["unsorted"] or report["bad_ohlc"]:
+        logger.debug("🧹 %s %s: تکراری=%d نامرتب=%s OHLC نامعتبر=%d", symbol, interval,
+                     report["duplicates"], report["unsorted"], report["bad_ohlc"])
+    return series, report
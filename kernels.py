@@ -0,0 +1,228 @@
+# kernels.py - هسته‌های دسته‌ای اندیکاتورهای بازگشتی (EMA، RSI، ATR، ADX) برای چند نماد در یک فراخوانی
+#
+# ورودی ماتریس (نماد × کندل) است؛ سری‌های با طول متفاوت با stack از راست هم‌تراز و از چپ با NaN پر می‌شوند.
+# اگر numba نصب باشد حلقه‌های بازگشتی JIT کامپایل می‌شوند؛ در غیر این صورت (یا KERNELS_BACKEND=numpy)
+# همان پیاده‌سازی مرجع indicators.py برای هر سطر اجرا می‌شود. خروجی‌ها ماتریس هم‌اندازه با NaN به جای None است.
+import logging
+
+import numpy as np
+
+from config import KERNELS_BACKEND
+from indicators import ema_series, rsi_series, wilder_smooth, adx_arrays
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ("numba", "numpy")
+
+logger = logging.getLogger(__name__)
+_warned = False
+
+def backend(requested=None):
+    # backend فعال؛ درخواست numba بدون نصب بودن آن یک بار هشدار می‌دهد و به numpy برمی‌گردد
+    global _warned
+    requested = requested or KERNELS_BACKEND
+    if requested == "numpy":
+        return "numpy"
+    if numba is None:
+        if requested == "numba" and not _warned:
+            logger.warning("⚠️ numba نصب نیست → هسته‌های اندیکاتور با پیاده‌سازی مرجع numpy اجرا می‌شوند")
+            _warned = True
+        return "numpy"
+    return "numba"
+
+def stack(arrays):
+    """
+    سری‌های یک‌بعدی با طول متفاوت → (ماتریس هم‌تراز از راست، ایندکس اولین مقدار معتبر هر سطر).
+    ستون آخر ماتریس آخرین کندل همه نمادهاست.
+    """
+    width = max((len(a) for a in arrays), default=0)
+    out = np.full((len(arrays), width), np.nan)
+    starts = np.empty(len(arrays), dtype=np.int64)
+    for i, a in enumerate(arrays):
+        starts[i] = width - len(a)
+        out[i, starts[i]:] = a
+    return out, starts
+
+def first_valid(x):
+    valid = ~np.isnan(x)
+    starts = valid.argmax(axis=1).astype(np.int64)
+    starts[~valid.any(axis=1)] = x.shape[1]
+    return starts
+
+def _prepare(x, starts):
+    x = np.ascontiguousarray(np.atleast_2d(np.asarray(x, dtype=np.float64)))
+    starts = first_valid(x) if starts is None else np.asarray(starts, dtype=np.int64)
+    return x, starts
+
+# ===== حلقه‌های سطری (بدنه هسته‌های numba؛ معادل پیاده‌سازی مرجع) =====
+def _ema_rows(x, starts, period, out):
+    k = 2.0 / (period + 1)
+    n = x.shape[1]
+    for i in range(x.shape[0]):
+        s = starts[i]
+        if n - s < period:
+            continue
+        acc = 0.0
+        for t in range(s, s + period):
+            acc += x[i, t]
+        prev = acc / period
+        out[i, s + period - 1] = prev
+        for t in range(s + period, n):
+            prev = x[i, t] * k + prev * (1 - k)
+            out[i, t] = prev
+
+def _rsi_rows(x, starts, period, out):
+    n = x.shape[1]
+    for i in range(x.shape[0]):
+        s = starts[i]
+        if n - s < period + 1:
+            continue
+        gain = loss = 0.0
+        for t in range(s + 1, s + period + 1):
+            change = x[i, t] - x[i, t - 1]
+            gain += max(change, 0.0)
+            loss += max(-change, 0.0)
+        gain /= period
+        loss /= period
+        if loss == 0:
+            # مطابق rsi_series: میانگین اولیه بدون ضرر → 100 برای کل سری
+            for t in range(s + period, n):
+                out[i, t] = 100.0
+            continue
+        out[i, s + period] = 100.0 - (100.0 / (1.0 + gain / loss))
+        for t in range(s + period + 1, n):
+            change = x[i, t] - x[i, t - 1]
+            gain = (gain * (period - 1) + max(change, 0.0)) / period
+            loss = (loss * (period - 1) + max(-change, 0.0)) / period
+            out[i, t] = 100.0 if loss == 0 else 100.0 - (100.0 / (1.0 + gain / loss))
+
+def _atr_rows(high, low, close, starts, period, out):
+    n = close.shape[1]
+    for i in range(close.shape[0]):
+        s = starts[i]
+        if n - s < period + 1:
+            continue
+        atr = 0.0
+        for t in range(s + 1, n):
+            k = t - s - 1
+            tr = max(high[i, t] - low[i, t], abs(high[i, t] - close[i, t - 1]), abs(low[i, t] - close[i, t - 1]))
+            if k < period:
+                atr += tr
+                if k < period - 1:
+                    continue
+                atr /= period
+            else:
+                atr = (atr * (period - 1) + tr) / period
+            out[i, t] = atr
+
+def _adx_rows(high, low, close, starts, period, adx, plus_di, minus_di):
+    n = close.shape[1]
+    for i in range(close.shape[0]):
+        s = starts[i]
+        if n - s < period + 1:
+            continue
+        s_tr = s_plus = s_minus = s_adx = 0.0
+        for t in range(s + 1, n):
+            k = t - s - 1
+            up = high[i, t] - high[i, t - 1]
+            down = low[i, t - 1] - low[i, t]
+            pdm = up if (up > down and up > 0) else 0.0
+            mdm = down if (down > up and down > 0) else 0.0
+            tr = max(high[i, t] - low[i, t], abs(high[i, t] - close[i, t - 1]), abs(low[i, t] - close[i, t - 1]))
+            if k < period:
+                s_tr += tr
+                s_plus += pdm
+                s_minus += mdm
+                if k < period - 1:
+                    continue
+                s_tr /= period
+                s_plus /= period
+                s_minus /= period
+            else:
+                s_tr = (s_tr * (period - 1) + tr) / period
+                s_plus = (s_plus * (period - 1) + pdm) / period
+                s_minus = (s_minus * (period - 1) + mdm) / period
+            p_di = 100.0 * s_plus / s_tr if s_tr > 0 else 0.0
+            m_di = 100.0 * s_minus / s_tr if s_tr > 0 else 0.0
+            di_sum = p_di + m_di
+            dx = 100.0 * abs(p_di - m_di) / di_sum if di_sum > 0 else 0.0
+            plus_di[i, t] = p_di
+            minus_di[i, t] = m_di
+            kd = k - (period - 1)    # ایندکس DX
+            if kd < period:
+                s_adx += dx
+                if kd == period - 1:
+                    s_adx /= period
+                    adx[i, t] = s_adx
+            else:
+                s_adx = (s_adx * (period - 1) + dx) / period
+                adx[i, t] = s_adx
+
+if numba is not None:
+    _jit = numba.njit(cache=True, nogil=True)
+    _ema_rows_jit, _rsi_rows_jit = _jit(_ema_rows), _jit(_rsi_rows)
+    _atr_rows_jit, _adx_rows_jit = _jit(_atr_rows), _jit(_adx_rows)
+
+# ===== API دسته‌ای =====
+def ema_batch(prices, period, starts=None, backend_name=None):
+    x, starts = _prepare(prices, starts)
+    out = np.full(x.shape, np.nan)
+    if backend(backend_name) == "numba":
+        _ema_rows_jit(x, starts, period, out)
+        return out
+    for i, s in enumerate(starts.tolist()):
+        out[i, s:] = np.array(ema_series(x[i, s:].tolist(), period), dtype=np.float64)
+    return out
+
+def rsi_batch(prices, period=14, starts=None, backend_name=None):
+    x, starts = _prepare(prices, starts)
+    out = np.full(x.shape, np.nan)
+    if backend(backend_name) == "numba":
+        _rsi_rows_jit(x, starts, period, out)
+        return out
+    for i, s in enumerate(starts.tolist()):
+        out[i, s:] = np.array(rsi_series(x[i, s:].tolist(), period), dtype=np.float64)
+    return out
+
+def atr_batch(high, low, close, period=14, starts=None, backend_name=None):
+    # سری ATR (Wilder) هم‌طول کندل‌ها؛ مقدار آخر هر سطر برابر calculate_atr (قبل از گرد کردن)
+    close, starts = _prepare(close, starts)
+    high, _ = _prepare(high, starts)
+    low, _ = _prepare(low, starts)
+    out = np.full(close.shape, np.nan)
+    if backend(backend_name) == "numba":
+        _atr_rows_jit(high, low, close, starts, period, out)
+        return out
+    for i, s in enumerate(starts.tolist()):
+        h, l, c = high[i, s:], low[i, s:], close[i, s:]
+        if len(c) < period + 1:
+            continue
+        tr = np.maximum.reduce([h[1:] - l[1:], np.abs(h[1:] - c[:-1]), np.abs(l[1:] - c[:-1])])
+        out[i, s + 1:] = wilder_smooth(tr, period, period - 1)
+    return out
+
+def adx_batch(high, low, close, period=14, starts=None, backend_name=None):
+    # (adx, di+, di-) هر کدام ماتریس هم‌اندازه؛ هر سطر برابر indicators.adx_series همان نماد
+    close, starts = _prepare(close, starts)
+    high, _ = _prepare(high, starts)
+    low, _ = _prepare(low, starts)
+    adx, plus_di, minus_di = (np.full(close.shape, np.nan) for _ in range(3))
+    if backend(backend_name) == "numba":
+        _adx_rows_jit(high, low, close, starts, period, adx, plus_di, minus_di)
+        return adx, plus_di, minus_di
+    for i, s in enumerate(starts.tolist()):
+        adx[i, s:], plus_di[i, s:], minus_di[i, s:] = adx_arrays(high[i, s:], low[i, s:], close[i, s:], period)
+    return adx, plus_di, minus_di
+
+def warmup():
+    # کامپایل JIT همه هسته‌ها روی داده کوچک (تا زمان کامپایل در اندازه‌گیری یا اسکن اول حساب نشود)
+    if backend() != "numba":
+        return
+    x = np.linspace(1.0, 2.0, 64).reshape(2, 32)
+    ema_batch(x, 8)
+    rsi_batch(x, 14)
+    atr_batch(x * 1.01, x * 0.99, x, 14)
+    adx_batch(x * 1.01, x * 0.99, x, 5)
@@ -0,0 +1,70 @@
+# log_setup.py - پیکربندی لاگ با صف (بدون بلاک شدن event loop روی دیسک) و حالت JSON
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+from config import LOG_LEVEL, LOG_FORMAT
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    هر رکورد یک خط JSON؛ فیلدهای ساخت‌یافته از extra={"fields": {...}} اضافه می‌شوند.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_listener = None
+
+def setup_logging(log_file="bot_log.txt", level=None, fmt=None):
+    """
+    هندلر ریشه فقط رکورد را در صف می‌گذارد؛ نوشتن روی فایل و stdout در نخ QueueListener انجام می‌شود.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or LOG_LEVEL).upper()
+    fmt = (fmt or LOG_FORMAT).lower()
+    formatter = JsonLinesFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file, encoding="utf-8"))
+    for h in handlers:
+        h.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    # خالی کردن صف و بستن هندلرها قبل از خروج
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
@@ -0,0 +1,214 @@
+# market_data.py - منبع داده بازار قابل تعویض: KuCoin زنده، ضبط در فیکسچر فشرده، پخش مجدد بدون شبکه
+import abc
+import atexit
+import gzip
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from candles import CandleSeries
+from config import MARKET_DATA_SOURCE, MARKET_DATA_FIXTURE, MARKET_DATA_RECORD
+from data_fetcher import (
+    fetch_history, fetch_history_async, fetch_all_tickers_async, parse_klines, loads_json
+)
+
+logger = logging.getLogger(__name__)
+
+# ===== فایل فیکسچر =====
+# قالب: {"source", "recorded_at", "klines": {symbol: {api_tf: [ردیف خام KuCoin، جدیدترین اول]}}, "tickers": {symbol: قیمت}}
+
+def save_fixture(fixture, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # mtime=0 برای فایل gzip قطعی؛ نوشتن در فایل موقت و جایگزینی اتمیک
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(json.dumps(fixture, separators=(",", ":")).encode("utf-8"))
+    os.replace(tmp, path)
+
+def load_fixture(path):
+    with gzip.open(path, "rb") as f:
+        return loads_json(f.read())
+
+def series_to_rows(series):
+    # عکس parse_klines: ردیف‌های رشته‌ای جدیدترین اول (مثل پاسخ KuCoin)
+    return [[str(int(r[0]))] + [repr(x) for x in r[1:]] for r in series.arr[::-1].tolist()]
+
+# ===== منابع داده =====
+class MarketDataProvider(abc.ABC):
+    """
+    رابط مشترک دریافت داده بازار.
+    klines/klines_async → CandleSeries بازه [start_at, end_at] (دو سر شامل) به ترتیب زمانی؛
+    tickers_async → {symbol: آخرین قیمت}؛ now → ساعت منبع (unix) که برای پخش مجدد زمان ضبط است.
+    session و limiter فقط برای منبع زنده لازم‌اند و بقیه آن‌ها را نادیده می‌گیرند.
+    """
+    name = "base"
+
+    def now(self):
+        return int(time.time())
+
+    @abc.abstractmethod
+    def klines(self, symbol, interval, start_at, end_at):
+        ...
+
+    async def klines_async(self, session, symbol, interval, start_at, end_at, limiter):
+        return self.klines(symbol, interval, start_at, end_at)
+
+    async def tickers_async(self, session, limiter):
+        return {}
+
+    def close(self):
+        pass
+
+class KucoinProvider(MarketDataProvider):
+    name = "kucoin"
+
+    def klines(self, symbol, interval, start_at, end_at):
+        return fetch_history(symbol, interval, start_at, end_at)
+
+    async def klines_async(self, session, symbol, interval, start_at, end_at, limiter):
+        return await fetch_history_async(session, symbol, interval, start_at, end_at, limiter)
+
+    async def tickers_async(self, session, limiter):
+        return await fetch_all_tickers_async(session, limiter)
+
+class RecordingProvider(MarketDataProvider):
+    """
+    پوشش یک منبع دیگر که هر پاسخ را در حافظه جمع می‌کند و در close به فیکسچر gzip می‌نویسد.
+    close با atexit هم ثبت می‌شود تا ضبط اسکریپت‌هایی که آن را صدا نمی‌زنند (یا با خطا تمام می‌شوند) از دست نرود.
+    کندل‌های تکراری بازه‌های هم‌پوشان بر اساس زمان شروع یکی می‌شوند.
+    """
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.name = f"record:{inner.name}"
+        self.klines_by_symbol = {}
+        self.tickers = {}
+        self._dirty = False     # داده ضبط‌شده‌ای که هنوز در فایل نوشته نشده
+        atexit.register(self.close)
+
+    def now(self):
+        return self.inner.now()
+
+    def _capture(self, symbol, interval, series):
+        if not len(series):
+            return series
+        by_tf = self.klines_by_symbol.setdefault(symbol, {})
+        merged = series.arr if interval not in by_tf else np.concatenate([by_tf[interval], series.arr])
+        _, idx = np.unique(merged[:, 0], return_index=True)
+        by_tf[interval] = merged[idx]
+        self._dirty = True
+        return series
+
+    def klines(self, symbol, interval, start_at, end_at):
+        return self._capture(symbol, interval, self.inner.klines(symbol, interval, start_at, end_at))
+
+    async def klines_async(self, session, symbol, interval, start_at, end_at, limiter):
+        series = await self.inner.klines_async(session, symbol, interval, start_at, end_at, limiter)
+        return self._capture(symbol, interval, series)
+
+    async def tickers_async(self, session, limiter):
+        tickers = await self.inner.tickers_async(session, limiter)
+        self.tickers.update(tickers)
+        self._dirty = self._dirty or bool(tickers)
+        return tickers
+
+    def fixture(self):
+        return {
+            "source": self.inner.name,
+            "recorded_at": self.inner.now(),
+            "klines": {symbol: {tf: series_to_rows(CandleSeries(arr)) for tf, arr in tfs.items()}
+                       for symbol, tfs in self.klines_by_symbol.items()},
+            "tickers": self.tickers,
+        }
+
+    def close(self):
+        # چند بار صدا زدن (اسکریپت + atexit) فقط تغییرات جدید را می‌نویسد
+        if not self._dirty:
+            return
+        save_fixture(self.fixture(), self.path)
+        self._dirty = False
+        logger.info("💾 داده بازار ضبط شد: %s (%d نماد)", self.path, len(self.klines_by_symbol))
+
+class ReplayProvider(MarketDataProvider):
+    """
+    پخش مجدد فیکسچر از حافظه: هر (نماد، تایم‌فریم) یک بار پارس و بازه‌ها با searchsorted برش داده می‌شوند.
+    now زمان ضبط است تا اسکن، مانیتور و بنچمارک قطعی باشند.
+    """
+    name = "replay"
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.recorded_at = int(fixture.get("recorded_at") or 0)
+        self._series = {}
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_fixture(path))
+
+    def now(self):
+        return self.recorded_at
+
+    def symbols(self):
+        return list(self.fixture["klines"].keys())
+
+    def series(self, symbol, interval):
+        key = (symbol, interval)
+        series = self._series.get(key)
+        if series is None:
+            rows = self.fixture["klines"].get(symbol, {}).get(interval, [])
+            series = self._series[key] = parse_klines(rows)
+        return series
+
+    def klines(self, symbol, interval, start_at, end_at):
+        series = self.series(symbol, interval)
+        t = series.t
+        lo = np.searchsorted(t, start_at, side="left")
+        hi = np.searchsorted(t, end_at, side="right")
+        return series[lo:hi]
+
+    async def tickers_async(self, session, limiter):
+        tickers = dict(self.fixture.get("tickers") or {})
+        if not tickers:
+            # فیکسچر بدون snapshot تیکر: آخرین close کوچک‌ترین تایم‌فریم موجود
+            for symbol, tfs in self.fixture["klines"].items():
+                for tf in ("1min", "5min", "15min", "30min", "1hour", "4hour"):
+                    if tfs.get(tf):
+                        tickers[symbol] = float(tfs[tf][0][2])
+                        break
+        return tickers
+
+_provider = None
+
+def build_provider(source=None, fixture=None, record=None):
+    # source: kucoin، replay یا archive (آرشیو memmap روی دیسک)؛ اگر record داده شود خروجی منبع در آن فایل ضبط می‌شود
+    source = source or MARKET_DATA_SOURCE
+    if source == "replay":
+        provider = ReplayProvider.from_file(fixture or MARKET_DATA_FIXTURE)
+    elif source == "archive":
+        from candle_archive import ArchiveProvider
+        provider = ArchiveProvider()
+    elif source == "kucoin":
+        provider = KucoinProvider()
+    else:
+        raise ValueError(f"منبع داده ناشناخته: {source}")
+    record = MARKET_DATA_RECORD if record is None else record
+    return RecordingProvider(provider, record) if record else provider
+
+def get_provider():
+    # نمونه مشترک در طول اجرا (بر اساس تنظیمات config)
+    global _provider
+    if _provider is None:
+        _provider = build_provider()
+        logger.info("🌐 منبع داده بازار: %s", _provider.name)
+    return _provider
+
+def set_provider(provider):
+    # تعویض منبع (بک‌تست/بنچمارک)؛ منبع قبلی برگردانده می‌شود
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
@@ -0,0 +1,110 @@
+# metrics.py - زمان‌سنجی سبک مراحل مسیر داغ و گزارش زمان‌بندی هر اجرا
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from config import METRICS_DIR, METRICS_PROMETHEUS
+
+PROMETHEUS_PREFIX = "khosro"
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    idx = min(int(round(q * (len(sorted_vals) - 1))), len(sorted_vals) - 1)
+    return sorted_vals[idx]
+
+class RunMetrics:
+    """
+    جمع‌آوری مدت زمان مراحل (span) و شمارنده‌ها در طول یک اجرا.
+    هر span فقط یک perf_counter و یک append هزینه دارد.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.spans = {}      # stage -> [(seconds, labels), ...]
+        self.counters = {}
+        self.data_quality = {}   # symbol -> {interval: گزارش integrity}
+
+    def record(self, stage, seconds, **labels):
+        self.spans.setdefault(stage, []).append((seconds, labels))
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_quality(self, symbol, interval, report):
+        self.data_quality.setdefault(symbol, {})[interval] = report
+
+    @contextmanager
+    def span(self, stage, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0, **labels)
+
+    def summary(self, top=5):
+        stages = {}
+        for stage, items in self.spans.items():
+            durations = sorted(d for d, _ in items)
+            slowest = sorted(items, key=lambda x: x[0], reverse=True)[:top]
+            stages[stage] = {
+                "count": len(durations),
+                "total_s": round(sum(durations), 6),
+                "p50_s": round(_percentile(durations, 0.50), 6),
+                "p95_s": round(_percentile(durations, 0.95), 6),
+                "max_s": round(durations[-1], 6),
+                "slowest": [dict(labels, seconds=round(d, 6)) for d, labels in slowest if labels],
+            }
+        summary = {
+            "started_at": datetime.fromtimestamp(self.started_at, ZoneInfo("Asia/Tehran")).isoformat(timespec="seconds"),
+            "wall_s": round(time.time() - self.started_at, 3),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+        if self.data_quality:
+            summary["data_quality"] = self.data_quality
+        return summary
+
+    def to_prometheus(self, run_name):
+        summary = self.summary(top=0)
+        lines = [f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds summary"]
+        for stage, s in summary["stages"].items():
+            labels = f'run="{run_name}",stage="{stage}"'
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{{labels},quantile="0.5"}} {s["p50_s"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{{labels},quantile="0.95"}} {s["p95_s"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{{labels},quantile="1"}} {s["max_s"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{{labels}}} {s["total_s"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{{labels}}} {s["count"]}')
+        for name, value in summary["counters"].items():
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name}_total counter")
+            lines.append(f'{PROMETHEUS_PREFIX}_{name}_total{{run="{run_name}"}} {value}')
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_wall_seconds gauge")
+        lines.append(f'{PROMETHEUS_PREFIX}_run_wall_seconds{{run="{run_name}"}} {summary["wall_s"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, run_name, directory=None, prometheus=None):
+        directory = METRICS_DIR if directory is None else directory
+        prometheus = METRICS_PROMETHEUS if prometheus is None else prometheus
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{run_name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        if prometheus:
+            with open(os.path.join(directory, f"{run_name}.prom"), "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus(run_name))
+        return path
+
+# نمونه سراسری مشترک بین ماژول‌ها
+run_metrics = RunMetrics()
+
+def span(stage, **labels):
+    return run_metrics.span(stage, **labels)
+
+def incr(name, value=1):
+    run_metrics.incr(name, value)
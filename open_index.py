@@ -0,0 +1,126 @@
+# open_index.py - ایندکس سیگنال‌های باز بر اساس (symbol, direction) برای جلوگیری از سیگنال تکراری
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import signal_store
+from config import DUPLICATE_COOLDOWN_MINUTES
+
+OPEN_INDEX_FILE = "open_index.json"
+TEHRAN = ZoneInfo("Asia/Tehran")
+
+logger = logging.getLogger(__name__)
+
+def _key(symbol, direction):
+    return f"{symbol}|{direction}"
+
+def _parse_time(s):
+    return datetime.fromisoformat(s).replace(tzinfo=TEHRAN)
+
+class OpenSignalIndex:
+    """
+    open: سیگنال‌های باز هر (symbol, direction) — فقط جدیدترین نگه داشته می‌شود.
+    last_issued: زمان آخرین سیگنال هر کلید (حتی پس از بسته شدن) برای پنجره cooldown.
+    فایل فقط همین دو دیکشنری را دارد، پس بارگذاری O(تعداد باز) است.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(signal_store.SIGNALS_DIR, OPEN_INDEX_FILE)
+        self.open = {}
+        self.last_issued = {}
+
+    @classmethod
+    def load(cls, path=None):
+        index = cls(path)
+        if os.path.isfile(index.path):
+            try:
+                with open(index.path, encoding="utf-8") as f:
+                    payload = json.load(f)
+                index.open = payload.get("open", {})
+                index.last_issued = payload.get("last_issued", {})
+                return index
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ ایندکس سیگنال‌های باز خوانده نشد (%s) → بازسازی از CSV", e)
+        index.rebuild_from_csv()
+        return index
+
+    def save(self):
+        signal_store.ensure_dir()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"open": self.open, "last_issued": self.last_issued}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.open)
+
+    def get(self, symbol, direction):
+        return self.open.get(_key(symbol, direction))
+
+    def duplicate_of(self, symbol, direction, now=None, cooldown_minutes=DUPLICATE_COOLDOWN_MINUTES):
+        # سیگنال قبلی که این سیگنال تکرار آن است (باز، یا صادرشده در پنجره cooldown)؛ در غیر این صورت None
+        key = _key(symbol, direction)
+        entry = self.open.get(key)
+        if entry is not None:
+            return entry["issued_at"]
+        last = self.last_issued.get(key)
+        if last and cooldown_minutes > 0:
+            now = now or datetime.now(TEHRAN)
+            if (now - _parse_time(last)).total_seconds() < cooldown_minutes * 60:
+                return last
+        return None
+
+    def add(self, symbol, direction, issued_at, entry_price, stop_loss, take_profit):
+        key = _key(symbol, direction)
+        self.open[key] = {
+            "issued_at": issued_at, "date": issued_at[:10],
+            "entry_price": entry_price, "stop_loss": stop_loss, "take_profit": take_profit,
+        }
+        if self.last_issued.get(key, "") < issued_at:
+            self.last_issued[key] = issued_at
+
+    def sync(self, open_rows):
+        """
+        جایگزینی بخش open با سطرهای OPEN فعلی (خروجی ردیاب نتیجه)؛
+        سیگنال‌های resolve شده حذف و last_issued حفظ می‌شود.
+        """
+        self.open = {}
+        for row in open_rows:
+            key = _key(row["symbol"], row["direction"])
+            current = self.open.get(key)
+            if current is None or current["issued_at"] < row["issued_at_tehran"]:
+                self.add(row["symbol"], row["direction"], row["issued_at_tehran"],
+                         float(row["entry_price"]), float(row["stop_loss"]), float(row["take_profit"]))
+            elif self.last_issued.get(key, "") < row["issued_at_tehran"]:
+                self.last_issued[key] = row["issued_at_tehran"]
+
+    def rebuild_from_csv(self):
+        # فقط وقتی فایل ایندکس وجود ندارد: یک بار پیمایش CSVهای روزانه
+        rows = []
+        if os.path.isdir(signal_store.SIGNALS_DIR):
+            for filename in sorted(os.listdir(signal_store.SIGNALS_DIR)):
+                if not filename.endswith(".csv"):
+                    continue
+                with open(os.path.join(signal_store.SIGNALS_DIR, filename), newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        if row.get("issued_at_tehran"):
+                            key = _key(row["symbol"], row["direction"])
+                            if self.last_issued.get(key, "") < row["issued_at_tehran"]:
+                                self.last_issued[key] = row["issued_at_tehran"]
+                        if row.get("status") == "OPEN":
+                            rows.append(row)
+        self.sync(rows)
+
+_index = None
+
+def get_open_index():
+    # نمونه مشترک در طول اجرا؛ اولین فراخوانی از دیسک بارگذاری می‌کند
+    global _index
+    if _index is None or _index.path != os.path.join(signal_store.SIGNALS_DIR, OPEN_INDEX_FILE):
+        _index = OpenSignalIndex.load()
+        logger.info("📇 ایندکس سیگنال‌های باز بارگذاری شد: %d سیگنال باز", len(_index))
+    return _index
@@ -0,0 +1,213 @@
+# outcome_tracker.py - ردیابی افزایشی نتیجه سیگنال‌های باز با watermark برای هر سیگنال
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import signal_store
+from candles import rows_of
+from config import BROKER_FEE_RATE, TRACKER_MAX_HOLD_HOURS
+from market_data import get_provider
+from metrics import span, incr
+from open_index import OpenSignalIndex
+
+TRACKER_STATE_FILE = "tracker_state.json"
+TEHRAN = ZoneInfo("Asia/Tehran")
+
+logger = logging.getLogger(__name__)
+
+# ===== منطق مشترک resolve (مانیتور شبانه و ردیاب) =====
+def compute_pnl_usd(direction, entry_price, exit_price, position_size_usd, fee_rate=BROKER_FEE_RATE):
+    fee_total = position_size_usd * fee_rate * 2.0
+    ret_pct = (exit_price - entry_price) / entry_price if direction == "LONG" else (entry_price - exit_price) / entry_price
+    gross_pnl = position_size_usd * ret_pct
+    net_pnl = gross_pnl - fee_total
+    return net_pnl, ret_pct * 100.0, fee_total
+
+def resolve_candles(candles, direction, stop_loss, take_profit, after_t=None):
+    """
+    اولین کندلی که SL یا TP را لمس کند → (status, t, price)؛ در غیر این صورت None.
+    اگر هر دو در یک کندل لمس شوند STOP_HIT انتخاب می‌شود. کندل‌های t <= after_t نادیده گرفته می‌شوند.
+    """
+    long_side = direction == "LONG"
+    for c in rows_of(candles):
+        if after_t is not None and c['t'] <= after_t:
+            continue
+        if long_side:
+            sl_hit, tp_hit = c['l'] <= stop_loss, c['h'] >= take_profit
+        else:
+            sl_hit, tp_hit = c['h'] >= stop_loss, c['l'] <= take_profit
+        if sl_hit:
+            return "STOP_HIT", c['t'], stop_loss
+        if tp_hit:
+            return "TP_HIT", c['t'], take_profit
+    return None
+
+def apply_resolution(row, status, hit_dt, exit_price):
+    # نوشتن نتیجه و PNL در سطر CSV
+    entry_price = float(row["entry_price"])
+    position_size_usd = float(row.get("position_size_usd") or "10")
+    final_pnl_usd, return_pct, broker_fee = compute_pnl_usd(row["direction"], entry_price, exit_price, position_size_usd)
+    row.update({
+        "status": status,
+        "hit_price": f"{exit_price:.8f}",
+        "hit_time_tehran": hit_dt.astimezone(TEHRAN).strftime("%Y-%m-%d %H:%M:%S"),
+        "broker_fee": f"{broker_fee:.6f}",
+        "final_pnl_usd": f"{final_pnl_usd:.6f}",
+        "return_pct": f"{return_pct:.4f}",
+    })
+    return final_pnl_usd
+
+def issued_unix(row):
+    return int(datetime.fromisoformat(row["issued_at_tehran"]).replace(tzinfo=TEHRAN).timestamp())
+
+# ===== وضعیت ردیاب =====
+def state_path(signals_dir=None):
+    return os.path.join(signals_dir or signal_store.SIGNALS_DIR, TRACKER_STATE_FILE)
+
+def signal_key(date_str, row):
+    return f"{date_str}|{row['symbol']}|{row['direction']}|{row['issued_at_tehran']}"
+
+def load_state(signals_dir=None):
+    path = state_path(signals_dir)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("watermarks", {})
+    except (OSError, ValueError) as e:
+        logger.warning("⚠️ فایل وضعیت ردیاب خوانده نشد (%s) → شروع از زمان صدور", e)
+        return {}
+
+def save_state(watermarks, signals_dir=None):
+    signal_store.ensure_dir()
+    path = state_path(signals_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"updated_at": int(time.time()), "watermarks": watermarks}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+# ===== فایل‌های روزانه =====
+def _daily_files(signals_dir=None):
+    signals_dir = signals_dir or signal_store.SIGNALS_DIR
+    if not os.path.isdir(signals_dir):
+        return []
+    files = []
+    for filename in sorted(os.listdir(signals_dir)):
+        if not filename.endswith(".csv"):
+            continue
+        try:
+            datetime.strptime(filename[:-4], "%Y-%m-%d")
+        except ValueError:
+            continue
+        files.append((filename[:-4], os.path.join(signals_dir, filename)))
+    return files
+
+def _read_rows(path):
+    with open(path, mode="r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames or signal_store.CSV_HEADERS, list(reader)
+
+def _write_rows(path, fieldnames, rows):
+    tmp = path + ".tmp"
+    with open(tmp, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+def _default_fetch(symbol, start, end):
+    try:
+        return get_provider().klines(symbol, "1min", start, end)
+    except Exception as e:
+        incr("http_errors")
+        logger.error("❌ خطا در دریافت کندل 1m %s: %s", symbol, e)
+    return []
+
+def track_open_signals(now=None, fetch=None, max_hold_hours=TRACKER_MAX_HOLD_HOURS, signals_dir=None):
+    """
+    همه سیگنال‌های OPEN (در همه فایل‌های روزانه موجود) را تا آخرین کندل 1m بسته‌شده جلو می‌برد.
+    برای هر نماد فقط یک بار و فقط کندل‌های بعد از کمترین watermark دریافت می‌شود؛
+    سیگنال حل‌نشده به روز بعد منتقل می‌شود و فقط پس از max_hold_hours ساعت CLOSED_MANUAL می‌شود.
+    signals_dir: پوشه دیگری با همان ساختار (مثلاً پروفایل سایه) با state جداگانه و بدون همگام‌سازی ایندکس سیگنال‌های باز.
+    """
+    fetch = fetch or _default_fetch
+    now = get_provider().now() if now is None else int(now)
+    end = now // 60 * 60 - 60     # شروع آخرین کندل 1m بسته‌شده
+    watermarks = load_state(signals_dir)
+
+    files = {}       # date_str -> (path, fieldnames, rows)
+    open_refs = {}   # symbol -> [(key, row, date_str)]
+    for date_str, path in _daily_files(signals_dir):
+        fieldnames, rows = _read_rows(path)
+        files[date_str] = (path, fieldnames, rows)
+        for row in rows:
+            if row.get("status") == "OPEN":
+                key = signal_key(date_str, row)
+                watermarks.setdefault(key, issued_unix(row) - 60)
+                open_refs.setdefault(row["symbol"], []).append((key, row, date_str))
+
+    # فقط کلید سیگنال‌های هنوز باز نگه داشته می‌شود
+    live_keys = {key for refs in open_refs.values() for key, _, _ in refs}
+    watermarks = {k: v for k, v in watermarks.items() if k in live_keys}
+
+    summary = {"open": len(live_keys), "TP_HIT": 0, "STOP_HIT": 0, "CLOSED_MANUAL": 0, "symbols_fetched": 0}
+    dirty = set()
+    for symbol, refs in open_refs.items():
+        start = min(watermarks[key] for key, _, _ in refs) + 60
+        candles = []
+        if start <= end:
+            with span("fetch_1m", symbol=symbol):
+                candles = fetch(symbol, start, end)
+            summary["symbols_fetched"] += 1
+        rows = [c for c in rows_of(candles) if c['t'] <= end]   # کندل در حال شکل‌گیری بررسی نمی‌شود
+        last_close = rows[-1]['c'] if rows else None
+
+        for key, row, date_str in refs:
+            wm = watermarks[key]
+            hit = resolve_candles(rows, row["direction"], float(row["stop_loss"]), float(row["take_profit"]), after_t=wm)
+            if hit is not None:
+                status, hit_t, exit_price = hit
+                hit_dt = datetime.fromtimestamp(hit_t, TEHRAN)
+            elif now - issued_unix(row) >= max_hold_hours * 3600:
+                status = "CLOSED_MANUAL"
+                exit_price = last_close if last_close is not None else float(row["entry_price"])
+                hit_dt = datetime.fromtimestamp(now, TEHRAN)
+            else:
+                if rows and rows[-1]['t'] > wm:
+                    watermarks[key] = rows[-1]['t']
+                continue
+
+            pnl = apply_resolution(row, status, hit_dt, exit_price)
+            watermarks.pop(key, None)
+            summary[status] += 1
+            incr("signals_resolved")
+            dirty.add(date_str)
+            logger.info("🎯 %s %s → %s در %s | PNL: %.4f USD", symbol, row["direction"], status,
+                        row["hit_time_tehran"], pnl,
+                        extra={"fields": {"symbol": symbol, "status": status, "pnl": pnl}})
+
+    with span("persist"):
+        for date_str in sorted(dirty):
+            path, fieldnames, rows = files[date_str]
+            _write_rows(path, fieldnames, rows)
+        save_state(watermarks, signals_dir)
+        if signals_dir is None:
+            # ایندکس سیگنال‌های باز با وضعیت فعلی CSVها همگام می‌شود
+            index = OpenSignalIndex.load()
+            index.sync([row for refs in open_refs.values() for _, row, _ in refs if row["status"] == "OPEN"])
+            index.save()
+    return summary
+
+if __name__ == "__main__":
+    from log_setup import setup_logging
+    from metrics import run_metrics
+
+    setup_logging(log_file=None)
+    run_metrics.reset()
+    result = track_open_signals()
+    logger.info("✅ ردیابی سیگنال‌های باز: %s", result)
+    run_metrics.write_report("tracker")
@@ -1,3 +1,8 @@
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
 # ===== EMA Rejection =====
 def ema_rejection(prices, ema_value, tolerance=0.002):
     """
@@ -42,11 +47,94 @@ def double_top_bottom(prices, lookback=10, tolerance=0.003):
     """
     if len(prices) < lookback:
         return None
-    recent = prices[-lookback:]
-    high_points = sorted(recent)[-2:]
-    low_points = sorted(recent)[:2]
+    ordered = sorted(prices[-lookback:])
+    high_points = ordered[-2:]
+    low_points = ordered[:2]
     if abs(high_points[0] - high_points[1]) / high_points[0] <= tolerance:
         return "DoubleTop"
     if abs(low_points[0] - low_points[1]) / low_points[0] <= tolerance:
         return "DoubleBottom"
     return None
+
+# ===== نسخه سری کامل (بک‌تست): هر ایندکس i برابر تابع بالا روی prices[:i+1] =====
+def rolling_extreme(values, window, mode="max"):
+    """
+    بیشینه/کمینه غلتان با deque یکنوا: هر مقدار حداکثر یک بار وارد و یک بار خارج می‌شود (O(n)).
+    out[i] = max/min(values[i-window+1 .. i]) و برای i < window-1 مقدار None.
+    """
+    out = [None] * len(values)
+    dq = deque()   # ایندکس‌ها؛ مقادیرشان از ابتدا به انتها یکنواست
+    better = (lambda a, b: a >= b) if mode == "max" else (lambda a, b: a <= b)
+    for i, v in enumerate(values):
+        while dq and better(v, values[dq[-1]]):
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - window:
+            dq.popleft()
+        if i >= window - 1:
+            out[i] = values[dq[0]]
+    return out
+
+def swing_low_series(candles, lookback=10):
+    # سری calculate_swing_low
+    return rolling_extreme([c['l'] for c in candles], lookback, "min")
+
+def swing_high_series(candles, lookback=10):
+    # سری calculate_swing_high
+    return rolling_extreme([c['h'] for c in candles], lookback, "max")
+
+def pullback_series(prices, trend_direction='LONG', lookback=5):
+    # سری pullback: مقایسه قیمت با بیشینه/کمینه lookback-1 قیمت قبلی
+    n = len(prices)
+    out = [False] * n
+    if lookback < 2:
+        return out
+    mode = "max" if trend_direction == 'LONG' else "min"
+    prior = rolling_extreme(prices, lookback - 1, mode)
+    for i in range(lookback - 1, n):
+        ref = prior[i - 1]
+        out[i] = prices[i] < ref if trend_direction == 'LONG' else prices[i] > ref
+    return out
+
+def resistance_test_series(prices, resistance_levels, tolerance=0.002):
+    # سری resistance_test با سطح مقاومت هر کندل (مثلاً سری EMA50)
+    out = [False] * len(prices)
+    for i in range(1, len(prices)):
+        level = resistance_levels[i]
+        if level is None:
+            continue
+        prev_price = prices[i - 1]
+        out[i] = bool(prev_price and prev_price >= level and prices[i] < level * (1 - tolerance))
+    return out
+
+def ema_rejection_series(prices, ema_values, tolerance=0.002):
+    # سری ema_rejection با مقدار EMA هر کندل
+    out = [False] * len(prices)
+    for i in range(1, len(prices)):
+        ema_value = ema_values[i]
+        prev_price = prices[i - 1]
+        if ema_value is None or not prev_price:
+            continue
+        if abs(prev_price - ema_value) / ema_value <= tolerance:
+            out[i] = prices[i] < ema_value
+    return out
+
+def double_top_bottom_series(prices, lookback=10, tolerance=0.003):
+    """
+    سری double_top_bottom ("DoubleTop" / "DoubleBottom" / None).
+    دو بیشینه و دو کمینه هر پنجره با np.partition روی نمای پنجره‌ای (بدون sort کامل)؛
+    partition یک کپی (n × lookback) از پنجره‌ها می‌سازد ولی lookback ثابت و کوچک است پس هزینه کل O(n) است.
+    """
+    n = len(prices)
+    out = [None] * n
+    if n < lookback:
+        return out
+    windows = sliding_window_view(np.asarray(prices, dtype=np.float64), lookback)
+    top = np.partition(windows, lookback - 2, axis=1)[:, -2:]
+    bottom = np.partition(windows, 1, axis=1)[:, :2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        is_top = np.abs(top[:, 0] - top[:, 1]) / top[:, 0] <= tolerance
+        is_bottom = np.abs(bottom[:, 0] - bottom[:, 1]) / bottom[:, 0] <= tolerance
+    for j in np.nonzero(is_top | is_bottom)[0]:
+        out[j + lookback - 1] = "DoubleTop" if is_top[j] else "DoubleBottom"
+    return out
@@ -0,0 +1,247 @@
+# portfolio.py - شبیه‌سازی پرتفوی سیگنال‌های صادرشده: پوزیشن‌های همزمان، اندازه‌گیری پوزیشن، سقف ریسک، منحنی سرمایه
+#
+# اجرا:
+#   python portfolio.py                          # ۳۰ روز تا امروز با سیاست PORTFOLIO_SIZING
+#   python portfolio.py 2026-10-01 90 kelly      # تاریخ پایان، تعداد روز، سیاست (fixed | atr_risk | kelly)
+
+import csv
+import heapq
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import signal_store
+from bootstrap import bootstrap_metrics, format_ci_report
+from config import (
+    BROKER_FEE_RATE, SLIPPAGE_PCT,
+    PORTFOLIO_INITIAL_EQUITY, PORTFOLIO_SIZING, PORTFOLIO_FIXED_USD, PORTFOLIO_RISK_PCT,
+    PORTFOLIO_KELLY_CAP, PORTFOLIO_KELLY_MIN_TRADES, PORTFOLIO_MAX_EXPOSURE, PORTFOLIO_MAX_POSITIONS
+)
+from outcome_tracker import issued_unix, TEHRAN
+
+SIZING_POLICIES = ("fixed", "atr_risk", "kelly")
+RESOLVED_STATUSES = ("TP_HIT", "STOP_HIT", "CLOSED_MANUAL")
+
+logger = logging.getLogger(__name__)
+
+# ===== ورودی =====
+def load_signal_rows(end_date_str, days):
+    # سطرهای سیگنال CSVهای روزانه [end - days + 1, end] به ترتیب زمان صدور
+    end = datetime.strptime(end_date_str, "%Y-%m-%d")
+    rows = []
+    for i in range(days - 1, -1, -1):
+        path = os.path.join(signal_store.SIGNALS_DIR, f"{(end - timedelta(days=i)).strftime('%Y-%m-%d')}.csv")
+        if os.path.isfile(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                rows.extend(r for r in csv.DictReader(f) if r.get("issued_at_tehran"))
+    rows.sort(key=lambda r: r["issued_at_tehran"])
+    return rows
+
+def first_exit(series, direction, stop_loss, take_profit, after_t):
+    """
+    نسخه برداری resolve_candles: اولین کندل بعد از after_t که SL یا TP را لمس کند → (status, t, price) یا None.
+    (هر دو در یک کندل → STOP_HIT، مثل ردیاب)
+    """
+    lo = int(np.searchsorted(series.t, after_t, side="right"))
+    h, l = series.h[lo:], series.l[lo:]
+    if direction == "LONG":
+        sl_hit, tp_hit = l <= stop_loss, h >= take_profit
+    else:
+        sl_hit, tp_hit = h >= stop_loss, l <= take_profit
+    hit = sl_hit | tp_hit
+    if not hit.any():
+        return None
+    i = int(np.argmax(hit))
+    t = int(series.t[lo + i])
+    return ("STOP_HIT", t, stop_loss) if sl_hit[i] else ("TP_HIT", t, take_profit)
+
+def build_trades(rows, prices=None):
+    """
+    آرایه‌های ستونی معاملات: زمان ورود/خروج، جهت، قیمت ورود/خروج، فاصله استاپ.
+    سطرهای resolve شده از CSV خوانده می‌شوند؛ سطرهای OPEN با کندل 1m (اگر در prices باشد) resolve می‌شوند
+    و در غیر این صورت کنار گذاشته می‌شوند.
+    """
+    prices = prices or {}
+    cols = {k: [] for k in ("symbol", "entry_t", "exit_t", "sign", "entry", "exit", "stop_pct", "status")}
+    for row in rows:
+        entry_t = issued_unix(row)
+        entry = float(row["entry_price"])
+        sl, tp = float(row["stop_loss"]), float(row["take_profit"])
+        if row.get("status") in RESOLVED_STATUSES and row.get("hit_time_tehran") and row.get("hit_price"):
+            exit_t = int(datetime.fromisoformat(row["hit_time_tehran"]).replace(tzinfo=TEHRAN).timestamp())
+            status, exit_price = row["status"], float(row["hit_price"])
+        elif row["symbol"] in prices:
+            hit = first_exit(prices[row["symbol"]], row["direction"], sl, tp, entry_t)
+            if hit is None:
+                continue
+            status, exit_t, exit_price = hit
+        else:
+            continue
+        cols["symbol"].append(row["symbol"])
+        cols["entry_t"].append(entry_t)
+        cols["exit_t"].append(max(exit_t, entry_t))
+        cols["sign"].append(1.0 if row["direction"] == "LONG" else -1.0)
+        cols["entry"].append(entry)
+        cols["exit"].append(exit_price)
+        cols["stop_pct"].append(abs(entry - sl) / entry if entry else 0.0)
+        cols["status"].append(status)
+    trades = {k: np.array(v, dtype=np.float64) for k, v in cols.items() if k not in ("symbol", "status")}
+    trades["entry_t"] = trades["entry_t"].astype(np.int64)
+    trades["exit_t"] = trades["exit_t"].astype(np.int64)
+    trades["symbol"] = cols["symbol"]
+    trades["status"] = cols["status"]
+    return trades
+
+# ===== اندازه‌گیری پوزیشن =====
+def kelly_fraction(returns, cap=PORTFOLIO_KELLY_CAP):
+    # f* = W - (1 - W) / R با R = میانگین سود / میانگین زیان، محدود به [0, cap]
+    returns = np.asarray(returns, dtype=np.float64)
+    wins, losses = returns[returns > 0], returns[returns <= 0]
+    if not len(wins) or not len(losses) or losses.mean() == 0:
+        return cap if len(wins) else 0.0
+    w = len(wins) / len(returns)
+    r = wins.mean() / -losses.mean()
+    return float(min(max(w - (1.0 - w) / r, 0.0), cap))
+
+def position_size(policy, equity, stop_pct, closed_returns):
+    if policy == "fixed":
+        return PORTFOLIO_FIXED_USD
+    if policy == "atr_risk":
+        # ریسک ثابت از سرمایه تا استاپ (استاپ خودش از ATR/سوئینگ ساخته شده)
+        return equity * PORTFOLIO_RISK_PCT / stop_pct if stop_pct > 0 else 0.0
+    if policy == "kelly":
+        if len(closed_returns) < PORTFOLIO_KELLY_MIN_TRADES:
+            return PORTFOLIO_FIXED_USD
+        return equity * kelly_fraction(closed_returns)
+    raise ValueError(f"سیاست اندازه پوزیشن ناشناخته: {policy}")
+
+# ===== شبیه‌سازی =====
+def simulate(trades, policy=PORTFOLIO_SIZING, initial_equity=PORTFOLIO_INITIAL_EQUITY, prices=None,
+             max_exposure=PORTFOLIO_MAX_EXPOSURE, max_positions=PORTFOLIO_MAX_POSITIONS,
+             fee_rate=BROKER_FEE_RATE, slippage=SLIPPAGE_PCT, bootstrap=False):
+    """
+    پذیرش معاملات به ترتیب ورود: سرمایه تحقق‌یافته برای اندازه‌گیری، حداکثر یک پوزیشن باز برای هر نماد،
+    سقف تعداد پوزیشن و سقف مجموع ارزش اسمی باز (max_exposure × سرمایه).
+    فقط همین حلقه پذیرش ترتیبی است (O(n log n) با heap)؛ PNL و منحنی سرمایه برداری حساب می‌شوند.
+    خروجی: {"notional", "pnl", "accepted", "curve": (t, equity), "drawdown", "stats"}
+    و اگر bootstrap=True، "ci" فاصله اطمینان PNL معاملات پذیرفته‌شده به ترتیب خروج (بلوک = روز خروج به وقت تهران).
+    """
+    n = len(trades["entry_t"])
+    sign, entry, exit_ = trades["sign"], trades["entry"], trades["exit"]
+    entry_eff = entry * (1.0 + sign * slippage)
+    exit_eff = exit_ * (1.0 - sign * slippage)
+    ret = sign * (exit_eff - entry_eff) / entry_eff - 2.0 * fee_rate   # بازده خالص هر دلار اسمی
+
+    order = np.argsort(trades["entry_t"], kind="stable")
+    notional = np.zeros(n)
+    realized = initial_equity
+    open_heap = []            # (exit_t, i)
+    open_symbols = {}
+    exposure = 0.0
+    closed_returns = []
+    for i in order.tolist():
+        t = trades["entry_t"][i]
+        while open_heap and open_heap[0][0] <= t:
+            _, j = heapq.heappop(open_heap)
+            realized += notional[j] * ret[j]
+            exposure -= notional[j]
+            closed_returns.append(ret[j])
+            del open_symbols[trades["symbol"][j]]
+        if trades["symbol"][i] in open_symbols or len(open_heap) >= max_positions or realized <= 0:
+            continue
+        size = min(position_size(policy, realized, trades["stop_pct"][i], closed_returns),
+                   max_exposure * realized - exposure)
+        if size <= 0:
+            continue
+        notional[i] = size
+        exposure += size
+        open_symbols[trades["symbol"][i]] = i
+        heapq.heappush(open_heap, (trades["exit_t"][i], i))
+
+    pnl = notional * ret
+    accepted = notional > 0
+    t, equity = equity_curve(trades, notional, pnl, entry_eff, initial_equity, prices)
+    peak = np.maximum.accumulate(equity) if len(equity) else equity
+    drawdown = equity / peak - 1.0 if len(equity) else equity
+    wins = pnl[accepted] > 0
+    stats = {
+        "policy": policy,
+        "trades": int(accepted.sum()),
+        "rejected": int(n - accepted.sum()),
+        "win_rate": float(wins.mean()) if accepted.any() else 0.0,
+        "net_pnl": float(pnl.sum()),
+        "fees": float((notional * 2.0 * fee_rate).sum()),
+        "final_equity": float(equity[-1]) if len(equity) else initial_equity,
+        "return_pct": float((equity[-1] / initial_equity - 1.0) * 100.0) if len(equity) else 0.0,
+        "max_drawdown_pct": float(drawdown.min() * 100.0) if len(drawdown) else 0.0,
+    }
+    result = {"notional": notional, "pnl": pnl, "accepted": accepted, "curve": (t, equity),
+              "drawdown": drawdown, "stats": stats}
+    if bootstrap:
+        closed = np.nonzero(accepted)[0]
+        closed = closed[np.argsort(trades["exit_t"][closed], kind="stable")]
+        exit_days = [datetime.fromtimestamp(t, TEHRAN).date() for t in trades["exit_t"][closed].tolist()]
+        result["ci"] = bootstrap_metrics(pnl[closed], blocks=exit_days)
+    return result
+
+def equity_curve(trades, notional, pnl, entry_eff, initial_equity, prices=None, step=60):
+    """
+    سرمایه روی شبکه دقیقه‌ای از اولین ورود تا آخرین خروج:
+    سود/زیان تحقق‌یافته با np.add.at در لحظه خروج + ارزش روز پوزیشن‌های باز از کندل 1m (اگر در prices باشد).
+    """
+    accepted = np.nonzero(notional > 0)[0]
+    if not len(accepted):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    start = trades["entry_t"][accepted].min() // step * step
+    end = trades["exit_t"][accepted].max() // step * step
+    grid = np.arange(start, end + step, step, dtype=np.int64)
+    realized = np.zeros(len(grid))
+    exit_idx = np.searchsorted(grid, trades["exit_t"][accepted], side="right") - 1
+    np.add.at(realized, exit_idx, pnl[accepted])
+    equity = initial_equity + np.cumsum(realized)
+
+    for k, i in enumerate(accepted.tolist()):
+        series = (prices or {}).get(trades["symbol"][i])
+        if series is None or not len(series):
+            continue
+        i0 = int(np.searchsorted(grid, trades["entry_t"][i], side="left"))
+        i1 = int(exit_idx[k])
+        if i1 <= i0:
+            continue
+        pos = np.searchsorted(series.t, grid[i0:i1] - step, side="right") - 1   # آخرین کندل بسته
+        valid = pos >= 0
+        close = series.c[np.clip(pos, 0, None)]
+        unrealized = notional[i] * trades["sign"][i] * (close - entry_eff[i]) / entry_eff[i]
+        equity[i0:i1] += np.where(valid, unrealized, 0.0)
+    return grid, equity
+
+def format_portfolio_report(stats, end_date_str, days):
+    return "\n".join([
+        f"💼 شبیه‌سازی پرتفوی {days} روز تا {end_date_str} (سیاست: {stats['policy']})",
+        f"معاملات: {stats['trades']} | رد شده (سقف ریسک/نماد باز): {stats['rejected']}",
+        f"نرخ برد: {stats['win_rate'] * 100:.1f}% | سود خالص: {stats['net_pnl']:.2f}$ | کارمزد: {stats['fees']:.2f}$",
+        f"سرمایه نهایی: {stats['final_equity']:.2f}$ ({stats['return_pct']:+.2f}%) | "
+        f"بیشترین افت: {stats['max_drawdown_pct']:.2f}%",
+    ])
+
+def archive_prices(symbols):
+    # کندل‌های 1m آرشیو محلی (در صورت وجود) برای ارزش‌گذاری روزانه پوزیشن‌های باز
+    from candle_archive import CandleArchive
+    archive = CandleArchive()
+    return {s: archive.series(s, "1min") for s in set(symbols) if archive.rows(s, "1min")}
+
+if __name__ == "__main__":
+    from log_setup import setup_logging
+
+    setup_logging(log_file=None)
+    end_date = sys.argv[1] if len(sys.argv) > 1 else signal_store.tehran_date_str()
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    policy = sys.argv[3] if len(sys.argv) > 3 else PORTFOLIO_SIZING
+    rows = load_signal_rows(end_date, days)
+    prices = archive_prices(r["symbol"] for r in rows)
+    result = simulate(build_trades(rows, prices), policy, prices=prices, bootstrap=True)
+    print(format_portfolio_report(result["stats"], end_date, days))
+    print(format_ci_report(result["ci"]))
@@ -0,0 +1,42 @@
+# prefilter.py - رد نمادهایی که از اسکن قبلی تقریباً تغییری نکرده‌اند و نمی‌توانند سیگنال بدهند
+import logging
+import time
+
+from config import (
+    SIGNAL_THRESHOLD, RANGE_FILTER_MIN_DIFF,
+    PREFILTER_MIN_MOVE, PREFILTER_RATIO_MARGIN, PREFILTER_MAX_AGE_MINUTES
+)
+
+logger = logging.getLogger(__name__)
+
+def skip_reason(entry, price, now):
+    """
+    دلیل رد شدن نماد یا None (باید کامل اسکن شود).
+    نماد فقط وقتی رد می‌شود که وضعیت تازه داشته باشد، قیمتش تقریباً ثابت مانده باشد
+    و در اسکن قبلی یا در رنج بوده یا از آستانه سیگنال دور بوده است.
+    """
+    if entry is None or price is None or not entry.get("price"):
+        return None
+    if now - entry.get("scanned_at", 0) >= PREFILTER_MAX_AGE_MINUTES * 60:
+        return None
+    move = abs(price / entry["price"] - 1.0)
+    if move >= PREFILTER_MIN_MOVE:
+        return None
+    if entry.get("ema_spread") is not None and entry["ema_spread"] < RANGE_FILTER_MIN_DIFF:
+        return f"رنج (فاصله EMA={entry['ema_spread']:.4f}، تغییر قیمت={move:.4f})"
+    if entry.get("ratio") is not None and entry["ratio"] < SIGNAL_THRESHOLD - PREFILTER_RATIO_MARGIN:
+        return f"دور از آستانه (نسبت وزنی={entry['ratio']:.2f}، تغییر قیمت={move:.4f})"
+    return None
+
+def prefilter_symbols(symbols, tickers, state, now=None):
+    # تقسیم نمادها به (اسکن کامل، رد شده) بر اساس snapshot قیمت و وضعیت اسکن قبلی
+    now = time.time() if now is None else now
+    to_scan, skipped = [], []
+    for symbol in symbols:
+        reason = skip_reason(state.get(symbol), tickers.get(symbol), now)
+        if reason is None:
+            to_scan.append(symbol)
+        else:
+            skipped.append(symbol)
+            logger.debug("⏭️ رد %s در پیش‌فیلتر: %s", symbol, reason)
+    return to_scan, skipped
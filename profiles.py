@@ -0,0 +1,217 @@
+# profiles.py - ارزیابی سایه (A/B) چند پروفایل تنظیمات روی همان داده و snapshot اندیکاتور هر اسکن
+#
+# فقط پروفایل اصلی (config.py) ذخیره و به تلگرام ارسال می‌شود؛ هر پروفایل سایه فقط هزینه قوانین را اضافه می‌کند
+# (ورودی‌های build_signal_inputs و indicator_snapshot یک بار برای هر نماد ساخته می‌شوند).
+#
+# اجرا:
+#   python profiles.py 2026-10-17       # مقایسه سیگنال‌های اصلی و سایه یک روز
+
+import csv
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import rules
+import signal_store
+from config import SHADOW_PROFILES, SHADOW_PROFILES_FILE, DUPLICATE_COOLDOWN_MINUTES
+from metrics import span, incr
+
+SHADOW_DIR = os.path.join(signal_store.SIGNALS_DIR, "shadow")
+SHADOW_HEADERS = signal_store.CSV_HEADERS + ["ratio", "primary_status"]
+
+# نام‌هایی از rules که یک پروفایل می‌تواند بازنویسی کند
+PROFILE_KEYS = (
+    "SIGNAL_THRESHOLD", "RISK_FACTORS",
+    "ADX_THRESHOLD_LONG", "ADX_THRESHOLD_SHORT",
+    "BS_MAX_THRESHOLD", "BS_MIN_THRESHOLD", "MACD_LONG_MEDIUM_THRESHOLD",
+    "RSI_LONG_MIN", "RSI_SHORT_MIN", "RSI_SHORT_MAX",
+    "RANGE_FILTER_DIFF", "RANGE_FILTER_MIN_DIFF",
+    "VOLUME_SPIKE_MIN",
+)
+
+logger = logging.getLogger(__name__)
+
+def merge_risk_factors(overrides):
+    # وزن‌های داده‌شده روی RISK_FACTORS اصلی؛ گروه‌ها و سطوح ریسک دیگر بدون تغییر
+    return {risk: {**weights, **overrides.get(risk, {})} for risk, weights in rules.RISK_FACTORS.items()}
+
+def load_profiles(profiles=None, path=SHADOW_PROFILES_FILE):
+    """
+    پروفایل‌های سایه از SHADOW_PROFILES و فایل JSON اختیاری SHADOW_PROFILES_FILE.
+    خروجی: {نام: {کلید: مقدار}} با RISK_FACTORS کامل (ادغام‌شده)؛ کلید ناشناخته نادیده گرفته می‌شود.
+    """
+    merged = dict(SHADOW_PROFILES if profiles is None else profiles)
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                merged.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ فایل پروفایل‌های سایه خوانده نشد (%s)", e)
+
+    result = {}
+    for name, overrides in merged.items():
+        unknown = sorted(set(overrides) - set(PROFILE_KEYS))
+        if unknown:
+            logger.warning("⚠️ پروفایل سایه %s: کلیدهای ناشناخته نادیده گرفته شد: %s", name, ", ".join(unknown))
+        values = {key: overrides[key] for key in PROFILE_KEYS if key in overrides}
+        if "RISK_FACTORS" in values:
+            values["RISK_FACTORS"] = merge_risk_factors(values["RISK_FACTORS"])
+        result[name] = values
+    return result
+
+@contextmanager
+def apply_profile(values):
+    # بازنویسی موقت آستانه‌های ماژول rules؛ ارزیابی همگام است پس اسکن موازی دیگری وسط آن اجرا نمی‌شود
+    saved = {key: getattr(rules, key) for key in values}
+    try:
+        for key, value in values.items():
+            setattr(rules, key, value)
+        yield
+    finally:
+        for key, value in saved.items():
+            setattr(rules, key, value)
+
+class ShadowRecorder:
+    """
+    ارزیابی همه پروفایل‌های سایه برای هر نماد با همان ورودی و snapshot پروفایل اصلی.
+    سیگنال‌های سایه در حافظه جمع و در flush یک بار برای هر فایل نوشته می‌شوند.
+    سیگنال تکراری (symbol, direction) در DUPLICATE_COOLDOWN_MINUTES هر پروفایل ثبت نمی‌شود؛ سقف روزانه اعمال نمی‌شود.
+    """
+
+    def __init__(self, profiles=None, root=SHADOW_DIR):
+        self.profiles = load_profiles() if profiles is None else profiles
+        self.root = root
+        self.pending = {name: [] for name in self.profiles}
+        self._last_issued = {}   # name -> {(symbol, direction): datetime}
+
+    def __bool__(self):
+        return bool(self.profiles)
+
+    def profile_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _recent(self, name):
+        # آخرین زمان صدور هر (symbol, direction) از فایل‌های امروز و دیروز پروفایل (یک بار در هر اسکن)
+        if name not in self._last_issued:
+            last = {}
+            today = datetime.fromisoformat(signal_store.tehran_time_str())
+            for day in (today - timedelta(days=1), today):
+                path = os.path.join(self.profile_dir(name), f"{day:%Y-%m-%d}.csv")
+                if not os.path.isfile(path):
+                    continue
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        key = (row["symbol"], row["direction"])
+                        issued = datetime.fromisoformat(row["issued_at_tehran"])
+                        last[key] = max(last.get(key, issued), issued)
+            self._last_issued[name] = last
+        return self._last_issued[name]
+
+    def evaluate(self, symbol, inputs, snapshot, primary=None):
+        # inputs: خروجی build_signal_inputs؛ snapshot: خروجی rules.indicator_snapshot
+        with span("shadow", symbol=symbol):
+            for name, values in self.profiles.items():
+                with apply_profile(values):
+                    signal = rules.evaluate_signal(symbol=symbol, snapshot=snapshot, **inputs)
+                if signal.get("rule_results") is None or signal["status"] != "SIGNAL":
+                    continue
+                recent = self._recent(name)
+                key = (symbol, signal["direction"])
+                issued = datetime.fromisoformat(signal["time"])
+                if key in recent and issued - recent[key] < timedelta(minutes=DUPLICATE_COOLDOWN_MINUTES):
+                    continue
+                recent[key] = issued
+                self.pending[name].append(self._row(signal, primary))
+                incr("shadow_signals")
+
+    @staticmethod
+    def _row(signal, primary):
+        return {
+            "symbol": signal["symbol"],
+            "direction": signal["direction"],
+            "risk_level": signal["risk"],
+            "entry_price": f"{signal['price']:.8f}",
+            "stop_loss": f"{signal['stop_loss']:.8f}",
+            "take_profit": f"{signal['take_profit']:.8f}",
+            "issued_at_tehran": signal["time"],
+            "status": "OPEN",
+            "hit_time_tehran": "",
+            "hit_price": "",
+            "broker_fee": "",
+            "final_pnl_usd": "",
+            "position_size_usd": f"{10.0:.2f}",
+            "return_pct": "",
+            "signal_source": signal["signal_source"],
+            "ratio": f"{signal['passed_weight'] / signal['total_weight']:.4f}",
+            "primary_status": primary.get("status", "") if primary else "",
+        }
+
+    def flush(self):
+        # نوشتن سیگنال‌های سایه این اسکن؛ خروجی: {نام: تعداد}
+        written = {}
+        for name, rows in self.pending.items():
+            if not rows:
+                continue
+            by_date = {}
+            for row in rows:
+                by_date.setdefault(row["issued_at_tehran"][:10], []).append(row)
+            os.makedirs(self.profile_dir(name), exist_ok=True)
+            for date_str, day_rows in by_date.items():
+                path = os.path.join(self.profile_dir(name), f"{date_str}.csv")
+                file_exists = os.path.isfile(path)
+                with open(path, mode="a", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, fieldnames=SHADOW_HEADERS)
+                    if not file_exists:
+                        writer.writeheader()
+                    writer.writerows(day_rows)
+            written[name] = len(rows)
+            rows.clear()
+        if written:
+            logger.info("🧪 سیگنال‌های سایه: %s", ", ".join(f"{n}={c}" for n, c in written.items()))
+        return written
+
+# ===== حل نتیجه و مقایسه =====
+def shadow_dirs(root=SHADOW_DIR):
+    # همه پوشه‌های پروفایل (حتی پروفایل حذف‌شده از config تا سیگنال‌های بازش حل شوند)
+    if not os.path.isdir(root):
+        return []
+    return [(name, os.path.join(root, name)) for name in sorted(os.listdir(root))
+            if os.path.isdir(os.path.join(root, name))]
+
+def resolve_shadow(fetch=None, now=None, root=SHADOW_DIR):
+    # همان ردیاب افزایشی outcome_tracker برای هر پروفایل با state جداگانه در پوشه خودش
+    from outcome_tracker import track_open_signals
+    return {name: track_open_signals(now=now, fetch=fetch, signals_dir=path) for name, path in shadow_dirs(root)}
+
+def _day_stats(path):
+    stats = {"signals": 0, "resolved": 0, "wins": 0, "pnl": 0.0}
+    if not os.path.isfile(path):
+        return stats
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            stats["signals"] += 1
+            if row.get("status") in ("TP_HIT", "STOP_HIT", "CLOSED_MANUAL") and row.get("final_pnl_usd"):
+                pnl = float(row["final_pnl_usd"])
+                stats["resolved"] += 1
+                stats["wins"] += pnl > 0
+                stats["pnl"] += pnl
+    return stats
+
+def format_shadow_report(date_str, root=SHADOW_DIR):
+    dirs = shadow_dirs(root)
+    if not dirs:
+        return "🧪 پروفایل سایه‌ای ثبت نشده است."
+    lines = [f"🧪 مقایسه پروفایل‌ها ({date_str}):"]
+    for name, stats in [("اصلی", _day_stats(os.path.join(signal_store.SIGNALS_DIR, f"{date_str}.csv")))] + \
+                       [(name, _day_stats(os.path.join(path, f"{date_str}.csv"))) for name, path in dirs]:
+        win_rate = stats["wins"] / stats["resolved"] * 100 if stats["resolved"] else 0.0
+        lines.append(f"   - {name}: {stats['signals']} سیگنال، {stats['resolved']} بسته، "
+                     f"نرخ برد {win_rate:.1f}%، PNL {stats['pnl']:+.2f} USD")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    date_str = sys.argv[1] if len(sys.argv) > 1 else signal_store.tehran_date_str()
+    print(format_shadow_report(date_str))
@@ -0,0 +1,224 @@
+# reports.py - موتور گزارش تک‌گذره با rollup روزانه و پنجره‌های چندروزه
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+
+import signal_store
+
+HIT_STATUSES = ("TP_HIT", "STOP_HIT")
+ROLLING_WINDOWS = (7, 30, 90)
+ROLLUP_SUFFIX = ".rollup.json"
+
+class Rollup:
+    """
+    آمار تجمعی سیگنال‌های hit شده (TP_HIT / STOP_HIT).
+    همه معیارها در یک پیمایش ساخته می‌شوند و rollup چند روز با merge جمع می‌شود،
+    پس گزارش ۹۰ روزه فقط ۹۰ فایل کوچک JSON می‌خواند.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.pnl_sum = 0.0
+        self.by_direction = {}
+        self.by_risk = {}
+        self.by_status = {}
+        self.by_symbol = {}    # symbol -> {"count", "tp", "pnl"}
+        self.best = None       # (pnl, symbol)
+        self.worst = None
+
+    def add(self, row):
+        status = row.get("status")
+        if status not in HIT_STATUSES:
+            return
+        pnl = float(row["final_pnl_usd"])
+        symbol = row.get("symbol", "N/A")
+        self.count += 1
+        self.pnl_sum += pnl
+        self._bump(self.by_direction, row.get("direction"))
+        self._bump(self.by_risk, row.get("risk_level"))
+        self._bump(self.by_status, status)
+        sym = self.by_symbol.setdefault(symbol, {"count": 0, "tp": 0, "pnl": 0.0})
+        sym["count"] += 1
+        sym["tp"] += status == "TP_HIT"
+        sym["pnl"] += pnl
+        # مقایسه اکید: در تساوی، اولین سیگنال (به ترتیب فایل) حفظ می‌شود
+        if self.best is None or pnl > self.best[0]:
+            self.best = (pnl, symbol)
+        if self.worst is None or pnl < self.worst[0]:
+            self.worst = (pnl, symbol)
+
+    @staticmethod
+    def _bump(counter, key, value=1):
+        counter[key] = counter.get(key, 0) + value
+
+    def merge(self, other):
+        self.count += other.count
+        self.pnl_sum += other.pnl_sum
+        for mine, theirs in ((self.by_direction, other.by_direction),
+                             (self.by_risk, other.by_risk),
+                             (self.by_status, other.by_status)):
+            for key, value in theirs.items():
+                self._bump(mine, key, value)
+        for symbol, stats in other.by_symbol.items():
+            sym = self.by_symbol.setdefault(symbol, {"count": 0, "tp": 0, "pnl": 0.0})
+            sym["count"] += stats["count"]
+            sym["tp"] += stats["tp"]
+            sym["pnl"] += stats["pnl"]
+        if other.best is not None and (self.best is None or other.best[0] > self.best[0]):
+            self.best = other.best
+        if other.worst is not None and (self.worst is None or other.worst[0] < self.worst[0]):
+            self.worst = other.worst
+        return self
+
+    @property
+    def tp_count(self):
+        return self.by_status.get("TP_HIT", 0)
+
+    @property
+    def stop_count(self):
+        return self.by_status.get("STOP_HIT", 0)
+
+    @property
+    def win_rate(self):
+        return self.tp_count / self.count * 100 if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count, "pnl_sum": self.pnl_sum,
+            "by_direction": self.by_direction, "by_risk": self.by_risk,
+            "by_status": self.by_status, "by_symbol": self.by_symbol,
+            "best": self.best, "worst": self.worst,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        r = cls()
+        r.count = d["count"]
+        r.pnl_sum = d["pnl_sum"]
+        r.by_direction = dict(d["by_direction"])
+        r.by_risk = dict(d["by_risk"])
+        r.by_status = dict(d["by_status"])
+        r.by_symbol = {k: dict(v) for k, v in d["by_symbol"].items()}
+        r.best = tuple(d["best"]) if d["best"] else None
+        r.worst = tuple(d["worst"]) if d["worst"] else None
+        return r
+
+def rollup_rows(rows):
+    rollup = Rollup()
+    for row in rows:
+        rollup.add(row)
+    return rollup
+
+# ===== rollup روزانه کنار فایل CSV =====
+def csv_path(date_str):
+    return os.path.join(signal_store.SIGNALS_DIR, f"{date_str}.csv")
+
+def rollup_path(date_str):
+    return os.path.join(signal_store.SIGNALS_DIR, f"{date_str}{ROLLUP_SUFFIX}")
+
+def build_daily_rollup(date_str):
+    path = csv_path(date_str)
+    if not os.path.isfile(path):
+        return None
+    with open(path, mode="r", newline="", encoding="utf-8") as f:
+        rollup = rollup_rows(csv.DictReader(f))
+    payload = {"date": date_str, "source_sha1": signal_store.file_digest(path), "rollup": rollup.to_dict()}
+    with open(rollup_path(date_str), "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    return rollup
+
+def load_daily_rollup(date_str):
+    # rollup ذخیره‌شده؛ اگر محتوای CSV بعد از ساخت rollup تغییر کرده باشد دوباره ساخته می‌شود
+    path = rollup_path(date_str)
+    csv_file = csv_path(date_str)
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if not os.path.isfile(csv_file) or signal_store.file_digest(csv_file) == payload.get("source_sha1"):
+            return Rollup.from_dict(payload["rollup"])
+    return build_daily_rollup(date_str)
+
+def window_rollup(end_date_str, days):
+    # مجموع rollup روزهای [end - days + 1, end]؛ روزهای بدون داده نادیده گرفته می‌شوند
+    end = datetime.strptime(end_date_str, "%Y-%m-%d")
+    total, found = Rollup(), 0
+    for i in range(days - 1, -1, -1):
+        day = (end - timedelta(days=i)).strftime("%Y-%m-%d")
+        daily = load_daily_rollup(day)
+        if daily is not None:
+            total.merge(daily)
+            found += 1
+    return total, found
+
+# ===== قالب گزارش =====
+def _pct(n, total):
+    return n / total * 100 if total else 0.0
+
+def format_daily_report(date_str, rollup):
+    hit_count = rollup.count
+    if hit_count == 0:
+        return f"📊 برای تاریخ {date_str} هیچ سیگنال hit شده (TP_HIT یا STOP_HIT) وجود ندارد.\n" \
+               f"(OPEN و CLOSED_MANUAL در گزارش روزانه نادیده گرفته می‌شوند)"
+
+    long_count = rollup.by_direction.get("LONG", 0)
+    short_count = rollup.by_direction.get("SHORT", 0)
+    low_risk = rollup.by_risk.get("LOW", 0)
+    medium_risk = rollup.by_risk.get("MEDIUM", 0)
+    high_risk = rollup.by_risk.get("HIGH", 0)
+    tp_hit_count = rollup.tp_count
+    stop_hit_count = rollup.stop_count
+    total_pnl = rollup.pnl_sum
+    avg_pnl = total_pnl / hit_count
+    best_pnl, best_symbol = rollup.best
+    worst_pnl, worst_symbol = rollup.worst
+
+    report = f"📅 **#گزارش روزانه_سیگنال‌های Hit شده - تاریخ: {date_str}**\n\n"
+    report += f"🔢 **تعداد سیگنال‌های فعال‌شده (TP یا SL)**: {hit_count}\n"
+    report += f"   - 🟢 LONG: {long_count} ({long_count/hit_count*100:.1f}%)\n"
+    report += f"   - 🔴 SHORT: {short_count} ({short_count/hit_count*100:.1f}%)\n\n"
+    report += f"📊 **سطوح ریسک** (فقط در سیگنال‌های hit شده):\n"
+    report += f"   - 🟢 LOW: {low_risk} ({low_risk/hit_count*100:.1f}%)\n"
+    report += f"   - 🟡 MEDIUM: {medium_risk} ({medium_risk/hit_count*100:.1f}%)\n"
+    report += f"   - 🔴 HIGH: {high_risk} ({high_risk/hit_count*100:.1f}%)\n\n"
+    report += f"🛡️ **وضعیت Hit**:\n"
+    report += f"   - ✅ TP_HIT: {tp_hit_count} ({tp_hit_count/hit_count*100:.1f}%)\n"
+    report += f"   - ❌ STOP_HIT: {stop_hit_count} ({stop_hit_count/hit_count*100:.1f}%)\n\n"
+    report += f"💹 **عملکرد مالی (فقط TP_HIT و STOP_HIT)**:\n"
+    report += f"   - نرخ موفقیت (TP): {rollup.win_rate:.1f}%\n"
+    report += f"   - مجموع PNL (USD): {total_pnl:.2f}\n"
+    report += f"   - میانگین PNL هر سیگنال hit شده: {avg_pnl:.2f}\n"
+    report += f"   - بهترین نتیجه: {best_pnl:.2f} USD (نماد: {best_symbol})\n"
+    report += f"   - بدترین نتیجه: {worst_pnl:.2f} USD (نماد: {worst_symbol})\n\n"
+    report += f"ℹ️ **نکته مهم**: فقط سیگنال‌هایی که SL یا TP آن‌ها فعال شده در این گزارش محاسبه شده‌اند. سیگنال‌های OPEN و CLOSED_MANUAL کاملاً نادیده گرفته شده‌اند."
+    return report
+
+def format_window_report(end_date_str, days, rollup, days_found, top_symbols=5):
+    if rollup.count == 0:
+        return f"📆 **{days} روز اخیر** (تا {end_date_str}): سیگنال hit شده‌ای ثبت نشده است."
+    n = rollup.count
+    lines = [
+        f"📆 **{days} روز اخیر** (تا {end_date_str}، {days_found} روز دارای داده)",
+        f"   - تعداد: {n} | نرخ موفقیت: {rollup.win_rate:.1f}% | مجموع PNL: {rollup.pnl_sum:.2f} USD | میانگین: {rollup.pnl_sum / n:.2f}",
+        "   - جهت: " + " | ".join(f"{k}: {v} ({_pct(v, n):.0f}%)" for k, v in sorted(rollup.by_direction.items())),
+        "   - ریسک: " + " | ".join(f"{k}: {v} ({_pct(v, n):.0f}%)" for k, v in sorted(rollup.by_risk.items())),
+    ]
+    ranked = sorted(rollup.by_symbol.items(), key=lambda kv: kv[1]["pnl"], reverse=True)
+    if ranked:
+        best = ", ".join(f"{s} {v['pnl']:+.2f}" for s, v in ranked[:top_symbols])
+        worst = ", ".join(f"{s} {v['pnl']:+.2f}" for s, v in ranked[::-1][:top_symbols])
+        lines.append(f"   - بهترین نمادها: {best}")
+        lines.append(f"   - بدترین نمادها: {worst}")
+    return "\n".join(lines)
+
+def generate_rolling_report(end_date_str, windows=ROLLING_WINDOWS):
+    parts = []
+    for days in windows:
+        rollup, found = window_rollup(end_date_str, days)
+        parts.append(format_window_report(end_date_str, days, rollup, found))
+    return "\n\n".join(parts)
+
+if __name__ == "__main__":
+    import sys
+    end_date = sys.argv[1] if len(sys.argv) > 1 else signal_store.tehran_date_str()
+    print(generate_rolling_report(end_date))
@@ -0,0 +1,193 @@
+# rule_analytics.py - سهم هر قانون در نتیجه سیگنال‌ها (ماتریس سیگنال × قانون)
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import signal_store
+from rules import RULE_GROUP_MAP
+
+RESOLVED_STATUSES = ("TP_HIT", "STOP_HIT")
+RULES_SUFFIX = ".rules.json"
+MIN_SUPPORT = 5   # حداقل تعداد سیگنال برای گزارش یک قانون یا جفت قانون
+
+def parse_signal_source(signal_source):
+    # "✅ نام: جزئیات;❌ نام: جزئیات;..." → {نام: پاس شده؟}
+    flags = {}
+    for part in signal_source.split(";"):
+        part = part.strip()
+        if not part or part[0] not in "✅❌":
+            continue
+        name = part[1:].partition(":")[0].strip()
+        if name:
+            flags[name] = part[0] == "✅"
+    return flags
+
+# ===== داده روزانه فشرده کنار فایل CSV =====
+def _csv_path(date_str):
+    return os.path.join(signal_store.SIGNALS_DIR, f"{date_str}.csv")
+
+def _rules_path(date_str):
+    return os.path.join(signal_store.SIGNALS_DIR, f"{date_str}{RULES_SUFFIX}")
+
+def build_daily_rules(date_str):
+    """
+    برای هر سیگنال resolve شده: لیست قوانین پاس‌شده، برد/باخت و PNL.
+    این فایل بعد از پاکسازی CSVهای قدیمی باقی می‌ماند تا تحلیل چندماهه ممکن باشد.
+    """
+    path = _csv_path(date_str)
+    if not os.path.isfile(path):
+        return None
+    signals = []
+    with open(path, mode="r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get("status") not in RESOLVED_STATUSES:
+                continue
+            flags = parse_signal_source(row.get("signal_source", ""))
+            if not flags:
+                continue
+            signals.append({
+                "rules": [name for name, ok in flags.items() if ok],
+                "evaluated": list(flags.keys()),
+                "win": row["status"] == "TP_HIT",
+                "pnl": float(row["final_pnl_usd"] or 0.0),
+            })
+    payload = {"date": date_str, "source_sha1": signal_store.file_digest(path), "signals": signals}
+    with open(_rules_path(date_str), "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    return signals
+
+def load_daily_rules(date_str):
+    path = _rules_path(date_str)
+    csv_file = _csv_path(date_str)
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if not os.path.isfile(csv_file) or signal_store.file_digest(csv_file) == payload.get("source_sha1"):
+            return payload["signals"]
+    return build_daily_rules(date_str)
+
+def load_history(end_date_str, days):
+    end = datetime.strptime(end_date_str, "%Y-%m-%d")
+    signals = []
+    for i in range(days - 1, -1, -1):
+        daily = load_daily_rules((end - timedelta(days=i)).strftime("%Y-%m-%d"))
+        if daily:
+            signals.extend(daily)
+    return signals
+
+def build_matrix(signals):
+    # ماتریس بولی سیگنال × قانون به همراه بردار برد و PNL
+    names = sorted({name for s in signals for name in s["evaluated"]})
+    col = {name: j for j, name in enumerate(names)}
+    matrix = np.zeros((len(signals), len(names)), dtype=bool)
+    for i, s in enumerate(signals):
+        matrix[i, [col[name] for name in s["rules"]]] = True
+    win = np.fromiter((s["win"] for s in signals), dtype=bool, count=len(signals))
+    pnl = np.fromiter((s["pnl"] for s in signals), dtype=np.float64, count=len(signals))
+    return names, matrix, win, pnl
+
+# ===== محاسبات برداری =====
+def rule_attribution(names, matrix, win, pnl):
+    """
+    برای هر قانون: پشتیبانی، نرخ برد در حالت پاس/رد، lift نسبت به نرخ پایه
+    و اختلاف میانگین PNL (پاس منهای رد).
+    """
+    n = len(win)
+    m = matrix.astype(np.float64)
+    w = win.astype(np.float64)
+    base_wr = w.mean() if n else 0.0
+
+    n_pass = m.sum(axis=0)
+    n_fail = n - n_pass
+    wins_pass = m.T @ w
+    wins_fail = w.sum() - wins_pass
+    pnl_pass = m.T @ pnl
+    pnl_fail = pnl.sum() - pnl_pass
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wr_pass = np.where(n_pass > 0, wins_pass / n_pass, np.nan)
+        wr_fail = np.where(n_fail > 0, wins_fail / n_fail, np.nan)
+        lift = wr_pass / base_wr if base_wr else np.full(len(names), np.nan)
+        mean_pnl_pass = np.where(n_pass > 0, pnl_pass / n_pass, np.nan)
+        mean_pnl_fail = np.where(n_fail > 0, pnl_fail / n_fail, np.nan)
+
+    return {
+        "names": names, "n": n, "base_win_rate": base_wr,
+        "support": n_pass, "win_rate_pass": wr_pass, "win_rate_fail": wr_fail,
+        "lift": lift, "pnl_pass_total": pnl_pass,
+        "pnl_delta": mean_pnl_pass - mean_pnl_fail,
+    }
+
+def pair_attribution(names, matrix, win, pnl):
+    # همه جفت‌ها با ضرب ماتریسی: هم‌پاسی، برد و PNL مشترک
+    m = matrix.astype(np.float64)
+    co = m.T @ m
+    co_wins = m.T @ (m * win.astype(np.float64)[:, None])
+    co_pnl = m.T @ (m * pnl[:, None])
+    base_wr = win.mean() if len(win) else 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wr = np.where(co > 0, co_wins / co, np.nan)
+        lift = wr / base_wr if base_wr else np.full_like(wr, np.nan)
+        mean_pnl = np.where(co > 0, co_pnl / co, np.nan)
+    return {"names": names, "support": co, "win_rate": wr, "lift": lift, "mean_pnl": mean_pnl}
+
+def group_attribution(single):
+    # جمع‌بندی در سطح گروه‌های وزن RISK_FACTORS (میانگین lift وزن‌دار با پشتیبانی)
+    groups = {}
+    for name, support, lift in zip(single["names"], single["support"], single["lift"]):
+        if support <= 0 or np.isnan(lift):
+            continue
+        g = groups.setdefault(RULE_GROUP_MAP.get(name, "Other"), [0.0, 0.0])
+        g[0] += support * lift
+        g[1] += support
+    return {g: total / support for g, (total, support) in groups.items() if support}
+
+def format_attribution_report(end_date_str, days, min_support=MIN_SUPPORT, top_pairs=10):
+    signals = load_history(end_date_str, days)
+    if not signals:
+        return f"📊 سیگنال resolve شده‌ای در {days} روز منتهی به {end_date_str} یافت نشد."
+    names, matrix, win, pnl = build_matrix(signals)
+    single = rule_attribution(names, matrix, win, pnl)
+    pairs = pair_attribution(names, matrix, win, pnl)
+
+    lines = [
+        f"📊 تحلیل قوانین — {days} روز تا {end_date_str} | سیگنال‌ها: {single['n']} | نرخ برد پایه: {single['base_win_rate'] * 100:.1f}%",
+        "",
+        f"{'قانون':<28}{'پاس':>6}{'برد|پاس':>9}{'برد|رد':>9}{'lift':>7}{'ΔPNL':>9}",
+    ]
+    order = np.argsort(-np.nan_to_num(single["lift"], nan=-1.0))
+    for j in order:
+        if single["support"][j] < min_support:
+            continue
+        lines.append(
+            f"{names[j]:<28}{int(single['support'][j]):>6}"
+            f"{single['win_rate_pass'][j] * 100:>8.1f}%{np.nan_to_num(single['win_rate_fail'][j]) * 100:>8.1f}%"
+            f"{single['lift'][j]:>7.2f}{single['pnl_delta'][j]:>+9.3f}"
+        )
+
+    iu, ju = np.triu_indices(len(names), k=1)
+    mask = pairs["support"][iu, ju] >= min_support
+    iu, ju = iu[mask], ju[mask]
+    if len(iu):
+        best = np.argsort(-np.nan_to_num(pairs["lift"][iu, ju], nan=-1.0))[:top_pairs]
+        lines += ["", "🔗 بهترین جفت قوانین:"]
+        for k in best:
+            i, j = iu[k], ju[k]
+            lines.append(f"   {names[i]} + {names[j]}: پشتیبانی={int(pairs['support'][i, j])}, "
+                         f"برد={pairs['win_rate'][i, j] * 100:.1f}%, lift={pairs['lift'][i, j]:.2f}, "
+                         f"میانگین PNL={pairs['mean_pnl'][i, j]:+.3f}")
+
+    groups = group_attribution(single)
+    if groups:
+        lines += ["", "⚖️ lift گروه‌های RISK_FACTORS:"]
+        lines += [f"   {g}: {v:.2f}" for g, v in sorted(groups.items(), key=lambda kv: -kv[1])]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    end_date = sys.argv[1] if len(sys.argv) > 1 else signal_store.tehran_date_str()
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    print(format_attribution_report(end_date, days))
@@ -24,6 +24,7 @@ from config import (
     RANGE_FILTER_ADX,
     RANGE_FILTER_MIN_DIFF,
     MAX_DAILY_SIGNALS,
+    VOLUME_SPIKE_MIN,
     FORBIDDEN_HOURS_START,
     FORBIDDEN_HOURS_END
 )
@@ -34,6 +35,8 @@ from indicators import (
 )
 from patterns import ema_rejection, resistance_test, pullback, double_top_bottom
 from signal_store import append_signal_row, tehran_time_str
+from open_index import get_open_index
+from metrics import span, incr
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +66,10 @@ def is_forbidden_hour() -> bool:
         return True
     return False
 
+def duplicate_signal_of(symbol: str, direction: str) -> Optional[str]:
+    # زمان صدور سیگنال باز/اخیر همین (symbol, direction)؛ None یعنی سیگنال تکراری نیست
+    return get_open_index().duplicate_of(symbol, direction)
+
 # ============================================
 
 @dataclass
@@ -88,9 +95,9 @@ async def send_to_telegram(text: str):
                 if resp.status == 200:
                     logger.info("✅ پیام به تلگرام ارسال شد")
                 else:
-                    logger.warning(f"⚠️ خطا در ارسال تلگرام: {resp.status}")
+                    logger.warning("⚠️ خطا در ارسال تلگرام: %s", resp.status)
         except Exception as e:
-            logger.error(f"❌ خطا در ارسال به تلگرام: {e}")
+            logger.error("❌ خطا در ارسال به تلگرام: %s", e)
 
 # ===== قوانین پایه =====
 def rule_body_strength(open_15m, close_15m, high_15m, low_15m, risk_rules) -> RuleResult:
@@ -219,8 +226,8 @@ def rule_smart_pullback_entry(price_30m, ema21_30m, rsi_30m, open_15m, close_15m
     return RuleResult("ورود هوشمند پولبک", ok, detail)
 
 # ===== مرحله ۳: مومنتوم جدید =====
-def rule_cci_momentum(candles, direction) -> RuleResult:
-    cci = calculate_cci(candles)
+def rule_cci_momentum(candles, direction, snapshot=None) -> RuleResult:
+    cci = snapshot["cci"] if snapshot else calculate_cci(candles)
     if cci is None:
         return RuleResult("CCI مومنتوم", False, "داده موجود نیست")
     
@@ -240,8 +247,8 @@ def rule_cci_momentum(candles, direction) -> RuleResult:
             detail = f"CCI={cci:.2f}"
     return RuleResult("CCI عبور از ۰", ok, detail)
 
-def rule_stochastic_momentum(candles, direction) -> RuleResult:
-    k, d = calculate_stochastic(candles)
+def rule_stochastic_momentum(candles, direction, snapshot=None) -> RuleResult:
+    k, d = snapshot["stochastic"] if snapshot else calculate_stochastic(candles)
     if k is None or d is None:
         return RuleResult("Stochastic کراس", False, "داده موجود نیست")
     
@@ -266,8 +273,8 @@ def rule_stochastic_momentum(candles, direction) -> RuleResult:
     return RuleResult("Stochastic کراس", ok, detail)
 
 # ===== قوانین مرحله ۱ =====
-def rule_adx(candles: list, direction: str) -> RuleResult:
-    adx, di_plus, di_minus = calculate_adx(candles)
+def rule_adx(candles: list, direction: str, snapshot: Optional[dict] = None) -> RuleResult:
+    adx, di_plus, di_minus = snapshot["adx"] if snapshot else calculate_adx(candles)
     if adx is None:
         return RuleResult("ADX", False, "داده ADX موجود نیست")
     
@@ -280,8 +287,8 @@ def rule_adx(candles: list, direction: str) -> RuleResult:
     detail = f"ADX={adx:.2f} [>{threshold}], DI+={di_plus:.2f}, DI-={di_minus:.2f}"
     return RuleResult("ADX", ok, detail)
 
-def rule_sar(candles: list, direction: str) -> RuleResult:
-    sar = calculate_sar(candles)
+def rule_sar(candles: list, direction: str, snapshot: Optional[dict] = None) -> RuleResult:
+    sar = snapshot["sar"] if snapshot else calculate_sar(candles)
     if sar is None:
         return RuleResult("SAR", False, "داده SAR موجود نیست")
     last_close = candles[-1]['c']
@@ -345,19 +352,49 @@ def rule_resistance_test(prices_series_30m: list, ema50_30m: float) -> RuleResul
     tested = resistance_test(prices_series_30m, ema50_30m)
     return RuleResult("تست مقاومت", tested, "تست مقاومت تایید شد" if tested else "بدون تست")
 
-def rule_pullback(prices_series_30m: list, direction: str) -> RuleResult:
+def rule_pullback(prices_series_30m: list, direction: str, snapshot: Optional[dict] = None) -> RuleResult:
     if not prices_series_30m:
         return RuleResult("پولبک", False, "داده موجود نیست")
-    pb = pullback(prices_series_30m, direction)
+    pb = snapshot["pullback"][direction] if snapshot and "pullback" in snapshot else pullback(prices_series_30m, direction)
     return RuleResult("پولبک", pb, "پولبک تشخیص داده شد" if pb else "بدون پولبک")
 
-def rule_double_top_bottom(prices_series_30m: list) -> RuleResult:
+def rule_double_top_bottom(prices_series_30m: list, snapshot: Optional[dict] = None) -> RuleResult:
     if not prices_series_30m:
         return RuleResult("Double Top/Bottom", False, "داده موجود نیست")
-    pattern = double_top_bottom(prices_series_30m)
+    if snapshot and "double_top_bottom" in snapshot:
+        pattern = snapshot["double_top_bottom"]
+    else:
+        pattern = double_top_bottom(prices_series_30m)
     ok = pattern is not None
     return RuleResult("Double Top/Bottom", ok, f"الگو={pattern}" if ok else "بدون الگو")
 
+def rule_no_divergence(divergence_detected: bool, direction: str) -> RuleResult:
+    # واگرایی RSI/MACD خلاف جهت سیگنال در چند کندل آخر 30m → رد
+    ok = not divergence_detected
+    against = "نزولی" if direction == "LONG" else "صعودی"
+    return RuleResult("عدم واگرایی", ok, "بدون واگرایی مخالف" if ok else f"واگرایی {against} فعال")
+
+def rule_volume_spike(vol_spike_factor: float) -> RuleResult:
+    # حجم کندل فعلی 30m نسبت به میانگین غلتان VOLUME_WINDOW کندل قبل
+    if vol_spike_factor is None:
+        return RuleResult("جهش حجم", False, "داده حجم موجود نیست")
+    ok = vol_spike_factor >= VOLUME_SPIKE_MIN
+    return RuleResult("جهش حجم", ok, f"ضریب حجم={vol_spike_factor:.2f} [>={VOLUME_SPIKE_MIN}]")
+
+# ===== snapshot اندیکاتورهای قوانین =====
+def indicator_snapshot(candles, adx: Optional[tuple] = None, stochastic: Optional[tuple] = None,
+                       sar: Optional[float] = None) -> dict:
+    # اندیکاتورهایی که قوانین از کندل‌های 30m می‌سازند؛ یک بار برای هر نماد و مشترک بین پروفایل‌ها (profiles.py)
+    # کلیدهای اختیاری "pullback" ({جهت: bool}) و "double_top_bottom" را بک‌تست از سری‌های patterns پر می‌کند
+    # adx: خروجی از پیش محاسبه‌شده (adx, di+, di-) به شکل calculate_adx (بک‌تست با kernels.adx_batch)
+    # stochastic/sar: خروجی از پیش محاسبه‌شده به شکل calculate_stochastic/calculate_sar (بک‌تست با StochasticState/SARState)
+    return {
+        "adx": calculate_adx(candles) if adx is None else adx,
+        "cci": calculate_cci(candles),
+        "stochastic": calculate_stochastic(candles) if stochastic is None else stochastic,
+        "sar": calculate_sar(candles) if sar is None else sar,
+    }
+
 # ===== نقشه وزن قوانین =====
 RULE_GROUP_MAP = {
     "قدرت کندل 15m": "Candles",
@@ -377,6 +414,8 @@ RULE_GROUP_MAP = {
     "Double Top/Bottom": "Patterns",
     "فیلتر رنج": "RiskMgmt",
     "فیلتر رنج ترکیبی": "RiskMgmt",
+    "عدم واگرایی": "Confirm",
+    "جهش حجم": "Volume",
 }
 
 def evaluate_rules(
@@ -391,9 +430,12 @@ def evaluate_rules(
     macd_hist_30m: float, rsi_30m: float,
     vol_spike_factor: float, divergence_detected: bool,
     candles: list, prices_series_30m: list, closes_by_tf: dict,
-    adx_value: float
+    adx_value: float,
+    snapshot: Optional[dict] = None
 ) -> Tuple[List[RuleResult], float, float]:
 
+    if snapshot is None:
+        snapshot = indicator_snapshot(candles)
     # محاسبه فاصله EMA برای فیلتر ترکیبی
     diff = abs(ema21_30m - ema50_30m) / price_30m if price_30m and price_30m != 0 else 0
 
@@ -405,16 +447,18 @@ def evaluate_rules(
         rule_rsi(rsi_30m, direction, risk),
         rule_macd(macd_hist_30m, direction, risk),
         rule_smart_pullback_entry(price_30m, ema21_30m, rsi_30m, open_15m, close_15m, high_15m, low_15m, direction),
-        rule_adx(candles, direction),
-        rule_cci_momentum(candles, direction),
-        rule_sar(candles, direction),
-        rule_stochastic_momentum(candles, direction),
+        rule_adx(candles, direction, snapshot),
+        rule_cci_momentum(candles, direction, snapshot),
+        rule_sar(candles, direction, snapshot),
+        rule_stochastic_momentum(candles, direction, snapshot),
         rule_ema_rejection(prices_series_30m, ema21_30m),
         rule_resistance_test(prices_series_30m, ema50_30m),
-        rule_pullback(prices_series_30m, direction),
-        rule_double_top_bottom(prices_series_30m),
+        rule_pullback(prices_series_30m, direction, snapshot),
+        rule_double_top_bottom(prices_series_30m, snapshot),
         rule_range_filter(ema21_30m, ema50_30m, price_30m),
         rule_combined_range_filter(diff, adx_value, direction),
+        rule_no_divergence(divergence_detected, direction),
+        rule_volume_spike(vol_spike_factor),
     ]
 
     weights = RISK_FACTORS.get(risk, {})
@@ -424,7 +468,37 @@ def evaluate_rules(
     return rule_results, passed_weight, total_weight
 
 # ===== تولید سیگنال =====
-async def generate_signal(
+def stop_levels(direction: str, strength_ratio: float, price_30m: float, atr_val_30m: float, candles) -> tuple:
+    # (stop_loss, take_profit) از سوئینگ ۱۰ کندل آخر (یا ATR) با ضریب و R:R وابسته به قدرت سیگنال؛ مشترک با بک‌تست
+    # تنظیم ATR multiplier
+    if direction == "LONG":
+        if strength_ratio >= 0.65:
+            atr_mult, rr_target = 1.5, 2.5
+        elif strength_ratio >= 0.45:
+            atr_mult, rr_target = 1.8, 2.0
+        else:
+            atr_mult, rr_target = 2.0, 1.5
+    else:
+        if strength_ratio >= 0.65:
+            atr_mult, rr_target = 2.0, 2.5
+        elif strength_ratio >= 0.45:
+            atr_mult, rr_target = 2.5, 2.0
+        else:
+            atr_mult, rr_target = 3.0, 1.5
+
+    if direction == "LONG":
+        swing_low = calculate_swing_low(candles)
+        buffer = 0.001 * price_30m
+        stop_loss = swing_low - buffer if swing_low is not None else price_30m - atr_val_30m * atr_mult
+        take_profit = price_30m + (price_30m - stop_loss) * rr_target
+    else:
+        swing_high = calculate_swing_high(candles)
+        buffer = 0.003 * price_30m
+        stop_loss = swing_high + buffer if swing_high is not None else price_30m + atr_val_30m * atr_mult
+        take_profit = price_30m - (stop_loss - price_30m) * rr_target
+    return stop_loss, take_profit
+
+def evaluate_signal(
     symbol: str,
     direction: str,
     prefer_risk: str,
@@ -443,13 +517,20 @@ async def generate_signal(
     divergence_detected: bool,
     candles: list,
     prices_series_30m: list,
-    closes_by_tf: dict
-) -> Optional[dict]:
+    closes_by_tf: dict,
+    snapshot: Optional[dict] = None
+) -> dict:
+    """
+    مرحله ارزیابی بدون اثر جانبی: قوانین، استاپ/تارگت، ریسک نهایی و وضعیت بر اساس SIGNAL_THRESHOLD.
+    سیگنال تکراری، سهمیه روزانه، ذخیره و ارسال در emit_signal انجام می‌شوند تا بتوان بین نمادها انتخاب کرد.
+    snapshot: خروجی indicator_snapshot (اگر داده نشود همین‌جا ساخته می‌شود).
+    """
     time_str = tehran_time_str()
 
     # بررسی بازه ممنوعه (نیمه‌شب)
     if is_forbidden_hour():
-        logger.info(f"⏰ ساعت {datetime.now(ZoneInfo('Asia/Tehran')).strftime('%H:%M')} در بازه ممنوعه (۰۰:۰۰-۰۴:۰۰) - رد سیگنال {symbol}")
+        logger.debug("⏰ ساعت %s در بازه ممنوعه (۰۰:۰۰-۰۴:۰۰) - رد سیگنال %s",
+                     datetime.now(ZoneInfo('Asia/Tehran')).strftime('%H:%M'), symbol)
         return {
             "symbol": symbol,
             "direction": direction,
@@ -466,62 +547,41 @@ async def generate_signal(
             "total_weight": 0
         }
 
-    # محاسبه ADX برای استفاده در فیلتر ترکیبی
-    adx, _, _ = calculate_adx(candles)
+    # محاسبه ADX برای استفاده در فیلتر ترکیبی (از snapshot مشترک با قوانین)
+    if snapshot is None:
+        snapshot = indicator_snapshot(candles)
+    adx = snapshot["adx"][0]
     if adx is None:
         adx = 0
 
     risk_rules = next((r["rules"] for r in RISK_LEVELS if r["key"] == prefer_risk), RISK_LEVELS[1]["rules"])
-    rule_results, passed_weight, total_weight = evaluate_rules(
-        symbol=symbol,
-        direction=direction,
-        risk=prefer_risk,
-        risk_rules=risk_rules,
-        price_30m=price_30m,
-        open_15m=open_15m, close_15m=close_15m, high_15m=high_15m, low_15m=low_15m,
-        open_5m=open_5m, close_5m=close_5m, high_5m=high_5m, low_5m=low_5m,
-        open_1m=open_1m, close_1m=close_1m, high_1m=high_1m, low_1m=low_1m,
-        ema21_30m=ema21_30m, ema50_30m=ema50_30m, ema8_30m=ema8_30m,
-        ema21_1h=ema21_1h, ema50_1h=ema50_1h,
-        ema21_4h=ema21_4h, ema50_4h=ema50_4h, ema200_4h=ema200_4h,
-        macd_hist_30m=hist_30m,
-        rsi_30m=rsi_30m,
-        vol_spike_factor=1.0,
-        divergence_detected=divergence_detected,
-        candles=candles,
-        prices_series_30m=prices_series_30m,
-        closes_by_tf=closes_by_tf,
-        adx_value=adx
-    )
+    vol_spike_factor = curr_vol / avg_vol_30m if curr_vol is not None and avg_vol_30m else None
+    with span("rules", symbol=symbol):
+        rule_results, passed_weight, total_weight = evaluate_rules(
+            symbol=symbol,
+            direction=direction,
+            risk=prefer_risk,
+            risk_rules=risk_rules,
+            price_30m=price_30m,
+            open_15m=open_15m, close_15m=close_15m, high_15m=high_15m, low_15m=low_15m,
+            open_5m=open_5m, close_5m=close_5m, high_5m=high_5m, low_5m=low_5m,
+            open_1m=open_1m, close_1m=close_1m, high_1m=high_1m, low_1m=low_1m,
+            ema21_30m=ema21_30m, ema50_30m=ema50_30m, ema8_30m=ema8_30m,
+            ema21_1h=ema21_1h, ema50_1h=ema50_1h,
+            ema21_4h=ema21_4h, ema50_4h=ema50_4h, ema200_4h=ema200_4h,
+            macd_hist_30m=hist_30m,
+            rsi_30m=rsi_30m,
+            vol_spike_factor=vol_spike_factor,
+            divergence_detected=divergence_detected,
+            candles=candles,
+            prices_series_30m=prices_series_30m,
+            closes_by_tf=closes_by_tf,
+            adx_value=adx,
+            snapshot=snapshot
+        )
 
     strength_ratio = passed_weight / total_weight if total_weight > 0 else 0
-    
-    # تنظیم ATR multiplier
-    if direction == "LONG":
-        if strength_ratio >= 0.65:
-            atr_mult, rr_target = 1.5, 2.5
-        elif strength_ratio >= 0.45:
-            atr_mult, rr_target = 1.8, 2.0
-        else:
-            atr_mult, rr_target = 2.0, 1.5
-    else:
-        if strength_ratio >= 0.65:
-            atr_mult, rr_target = 2.0, 2.5
-        elif strength_ratio >= 0.45:
-            atr_mult, rr_target = 2.5, 2.0
-        else:
-            atr_mult, rr_target = 3.0, 1.5
-
-    if direction == "LONG":
-        swing_low = calculate_swing_low(candles)
-        buffer = 0.001 * price_30m
-        stop_loss = swing_low - buffer if swing_low is not None else price_30m - atr_val_30m * atr_mult
-        take_profit = price_30m + (price_30m - stop_loss) * rr_target
-    else:
-        swing_high = calculate_swing_high(candles)
-        buffer = 0.003 * price_30m
-        stop_loss = swing_high + buffer if swing_high is not None else price_30m + atr_val_30m * atr_mult
-        take_profit = price_30m - (stop_loss - price_30m) * rr_target
+    stop_loss, take_profit = stop_levels(direction, strength_ratio, price_30m, atr_val_30m, candles)
 
     core_rules = ["روند EMA 1h", "روند EMA 4h", "ADX", "RSI 30m"]
     core_passed = all(any(r.name == cr and r.passed for r in rule_results) for cr in core_rules)
@@ -535,33 +595,11 @@ async def generate_signal(
     # وضعیت نهایی
     status = "SIGNAL" if passed_weight >= total_weight * SIGNAL_THRESHOLD else "NO_SIGNAL"
 
-    # محدودیت تعداد سیگنال روزانه
-    if status == "SIGNAL" and not can_issue_signal():
-        logger.info(f"⛔ محدودیت تعداد سیگنال روزانه رسیده است - {symbol}")
-        status = "NO_SIGNAL"
+    # متن قوانین فقط یک بار ساخته می‌شود و در لاگ، CSV و خروجی مشترک است
+    details = [str(r) for r in rule_results]
+    signal_source = ";".join(details)
 
-    passed_list = [str(r) for r in rule_results if r.passed]
-    failed_list = [str(r) for r in rule_results if not r.passed]
-    total_rules = len(rule_results)
-    passed_rules_count = len(passed_list)
-    failed_rules_count = len(failed_list)
-
-    logger.info("=" * 80)
-    logger.info(f"📊 سیگنال {symbol} | جهت={direction} | ریسک={final_risk}")
-    logger.info(f"📈 قوانین پاس‌شده: وزن={passed_weight}/{total_weight}")
-    logger.info(f"📊 تعداد قوانین: پاس={passed_rules_count}, رد={failed_rules_count}, کل={total_rules}")
-    logger.info("📋 همه قوانین بررسی‌شده:")
-    logger.info("\n".join([str(r) for r in rule_results]))
-    logger.info("—" * 60)
-    logger.info("✅ قوانین پاس‌شده:")
-    logger.info("\n".join(passed_list) if passed_list else "هیچ‌کدام")
-    logger.info("❌ قوانین ردشده:")
-    logger.info("\n".join(failed_list) if failed_list else "هیچ‌کدام")
-    logger.info(f"✅ وضعیت نهایی: {status}")
-    logger.info(f"🎯 استاپ: {stop_loss:.4f} | تارگت: {take_profit:.4f}")
-    logger.info("=" * 80)
-
-    signal_dict = {
+    return {
         "symbol": symbol,
         "direction": direction,
         "risk": final_risk,
@@ -571,25 +609,93 @@ async def generate_signal(
         "stop_loss": stop_loss,
         "take_profit": take_profit,
         "time": time_str,
-        "signal_source": ";".join([str(r) for r in rule_results]),
-        "details": [str(r) for r in rule_results],
+        "signal_source": signal_source,
+        "details": details,
         "passed_weight": passed_weight,
-        "total_weight": total_weight
+        "total_weight": total_weight,
+        "duplicate_of": None,
+        "adx": adx,
+        "rule_results": rule_results,
     }
 
+async def emit_signal(signal: dict) -> dict:
+    """
+    مرحله صدور: بررسی سیگنال تکراری و سهمیه روزانه، لاگ، ذخیره در CSV/ایندکس و ارسال به تلگرام.
+    سیگنالی که status آن قبلاً NO_SIGNAL شده (مثلاً به خاطر خوشه همبستگی) فقط لاگ می‌شود.
+    """
+    rule_results = signal.get("rule_results")
+    if rule_results is None:
+        return signal
+    symbol, direction, status = signal["symbol"], signal["direction"], signal["status"]
+    final_risk, price_30m, time_str = signal["risk"], signal["price"], signal["time"]
+    stop_loss, take_profit = signal["stop_loss"], signal["take_profit"]
+    passed_weight, total_weight = signal["passed_weight"], signal["total_weight"]
+    details, signal_source = signal["details"], signal["signal_source"]
+
+    # سیگنال تکراری (قبل از مصرف سهمیه روزانه، ذخیره و ارسال)
+    duplicate_of = None
     if status == "SIGNAL":
-        append_signal_row(
-            symbol=symbol,
-            direction=direction,
-            risk_level_name=final_risk,
-            entry_price=price_30m,
-            stop_loss=stop_loss,
-            take_profit=take_profit,
-            issued_at_tehran=time_str,
-            signal_source=";".join([str(r) for r in rule_results]),
-            position_size_usd=10.0
+        duplicate_of = duplicate_signal_of(symbol, direction)
+        if duplicate_of:
+            logger.info("🔁 سیگنال تکراری %s %s - سیگنال قبلی %s هنوز باز/در cooldown است", symbol, direction, duplicate_of)
+            incr("signals_duplicate")
+            status = "NO_SIGNAL"
+
+    # محدودیت تعداد سیگنال روزانه
+    if status == "SIGNAL" and not can_issue_signal():
+        logger.info("⛔ محدودیت تعداد سیگنال روزانه رسیده است - %s", symbol)
+        status = "NO_SIGNAL"
+
+    signal.update(status=status, duplicate_of=duplicate_of,
+                  strength=passed_weight / total_weight if status == "SIGNAL" else None)
+    total_rules = len(rule_results)
+    passed_rules_count = sum(1 for r in rule_results if r.passed)
+    failed_rules_count = total_rules - passed_rules_count
+
+    # یک خط خلاصه در INFO؛ جزئیات قوانین فقط برای SIGNAL یا در سطح DEBUG ساخته می‌شود
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "📊 سیگنال %s | جهت=%s | ریسک=%s | وزن=%s/%s | پاس=%d/%d | وضعیت=%s",
+            symbol, direction, final_risk, passed_weight, total_weight,
+            passed_rules_count, total_rules, status,
+            extra={"fields": {
+                "event": "signal_eval", "symbol": symbol, "direction": direction,
+                "risk": final_risk, "status": status, "passed_weight": passed_weight,
+                "total_weight": total_weight, "passed_rules": passed_rules_count,
+                "total_rules": total_rules,
+            }}
+        )
+    detail_level = logging.INFO if status == "SIGNAL" else logging.DEBUG
+    if logger.isEnabledFor(detail_level):
+        logger.log(
+            detail_level,
+            "📋 قوانین بررسی‌شده %s:\n%s\n🎯 استاپ: %.4f | تارگت: %.4f",
+            symbol, "\n".join(details), stop_loss, take_profit,
+            extra={"fields": {
+                "event": "signal_rules", "symbol": symbol,
+                "rules": [{"name": r.name, "passed": r.passed, "detail": r.detail} for r in rule_results],
+                "stop_loss": stop_loss, "take_profit": take_profit,
+            }}
         )
 
+    if status == "SIGNAL":
+        incr("signals_emitted")
+        with span("persist", symbol=symbol):
+            append_signal_row(
+                symbol=symbol,
+                direction=direction,
+                risk_level_name=final_risk,
+                entry_price=price_30m,
+                stop_loss=stop_loss,
+                take_profit=take_profit,
+                issued_at_tehran=time_str,
+                signal_source=signal_source,
+                position_size_usd=10.0
+            )
+            open_index = get_open_index()
+            open_index.add(symbol, direction, time_str, price_30m, stop_loss, take_profit)
+            open_index.save()
+
         dir_icon = "🟢" if direction == "LONG" else "🔴"
         risk_icon_map = {
             "LOW": "🛡️ محافظه‌کار",
@@ -613,6 +719,11 @@ async def generate_signal(
             f"❌ قوانین ردشده ({failed_rules_count}):\n"
             + "\n".join([f"❌ {r.name} → {r.detail}" for r in rule_results if not r.passed])
         )
-        await send_to_telegram(msg)
+        with span("notify", symbol=symbol):
+            await send_to_telegram(msg)
+
+    return signal
 
-    return signal_dict
+async def generate_signal(**inputs) -> Optional[dict]:
+    # ارزیابی و صدور یک نماد به صورت مستقل (بدون انتخاب بین نمادهای همبسته)
+    return await emit_signal(evaluate_signal(**inputs))
@@ -0,0 +1,59 @@
+# scan_state.py - وضعیت هر نماد از اسکن قبلی (قیمت، فاصله EMA، نسبت وزنی) برای پیش‌فیلتر و زمان‌بندی
+import json
+import logging
+import os
+import time
+
+import signal_store
+
+SCAN_STATE_FILE = "scan_state.json"
+
+logger = logging.getLogger(__name__)
+
+class ScanState:
+    """
+    symbols[symbol] = {
+        "price": قیمت در آخرین اسکن کامل, "ema_spread": |EMA21-EMA50|/قیمت در 30m,
+        "ratio": passed_weight/total_weight, "atr_pct": ATR 30m / قیمت, "adx": ADX 30m,
+        "scanned_at": unix آخرین اسکن کامل, "skips": تعداد رد شدن متوالی
+    }
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(signal_store.SIGNALS_DIR, SCAN_STATE_FILE)
+        self.symbols = {}
+
+    @classmethod
+    def load(cls, path=None):
+        state = cls(path)
+        if os.path.isfile(state.path):
+            try:
+                with open(state.path, encoding="utf-8") as f:
+                    state.symbols = json.load(f).get("symbols", {})
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ وضعیت اسکن قبلی خوانده نشد (%s) → اسکن کامل همه نمادها", e)
+        return state
+
+    def save(self):
+        signal_store.ensure_dir()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": int(time.time()), "symbols": self.symbols}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, symbol):
+        return self.symbols.get(symbol)
+
+    def record_scan(self, symbol, price, ema_spread, ratio, atr_pct, now=None, **extra):
+        entry = {
+            "price": price, "ema_spread": ema_spread, "ratio": ratio, "atr_pct": atr_pct,
+            "scanned_at": int(time.time() if now is None else now), "skips": 0,
+        }
+        entry.update(extra)
+        self.symbols[symbol] = entry
+
+    def record_skip(self, symbol):
+        entry = self.symbols.get(symbol)
+        if entry is not None:
+            entry["skips"] = entry.get("skips", 0) + 1
@@ -0,0 +1,69 @@
+# scheduler.py - زمان‌بندی تطبیقی اسکن: نمادهای پرنوسان و نزدیک به آستانه زودتر، نمادهای خاموش دیرتر
+import logging
+import time
+
+import numpy as np
+
+from config import SIGNAL_THRESHOLD, SCHEDULER_TIERS, SCHEDULER_DUE_TOLERANCE_MINUTES
+
+logger = logging.getLogger(__name__)
+
+def priority_scores(symbols, state):
+    """
+    امتیاز ۰..۱ هر نماد از وضعیت اسکن قبلی:
+    0.5 × نزدیکی ratio به SIGNAL_THRESHOLD + 0.3 × رتبه ATR% در بین نمادها + 0.2 × ADX/50.
+    نماد بدون وضعیت امتیاز 1 می‌گیرد (حتماً اسکن شود).
+    """
+    entries = [state.get(s) for s in symbols]
+    atr = np.array([(e or {}).get("atr_pct") or np.nan for e in entries], dtype=np.float64)
+    ratio = np.array([np.nan if (e or {}).get("ratio") is None else e["ratio"] for e in entries], dtype=np.float64)
+    adx = np.array([(e or {}).get("adx") or 0.0 for e in entries], dtype=np.float64)
+
+    closeness = np.clip(1.0 - np.abs(ratio - SIGNAL_THRESHOLD) / SIGNAL_THRESHOLD, 0.0, 1.0)
+    valid = ~np.isnan(atr)
+    atr_rank = np.zeros(len(symbols))
+    if valid.sum() > 1:
+        order = atr[valid].argsort().argsort()
+        atr_rank[valid] = order / (valid.sum() - 1)
+    elif valid.any():
+        atr_rank[valid] = 0.5
+    scores = 0.5 * np.nan_to_num(closeness) + 0.3 * atr_rank + 0.2 * np.clip(adx / 50.0, 0.0, 1.0)
+    unknown = np.array([e is None for e in entries])
+    scores[unknown] = 1.0
+    return dict(zip(symbols, scores.tolist()))
+
+def tier_of(score):
+    for name, min_score, interval in SCHEDULER_TIERS:
+        if score >= min_score:
+            return name, interval
+    name, _, interval = SCHEDULER_TIERS[-1]
+    return name, interval
+
+def plan_scan(symbols, state, budget, cost_per_symbol, now=None):
+    """
+    انتخاب نمادهای این اجرا در سقف budget درخواست.
+    نمادی سررسید است که از آخرین اسکن کاملش فاصله tier (منهای SCHEDULER_DUE_TOLERANCE_MINUTES) گذشته باشد؛ سررسیدها به ترتیب
+    امتیاز + عقب‌افتادگی (چند برابر فاصله tier) مرتب می‌شوند تا نماد خاموش گرسنه نماند.
+    خروجی: (انتخاب‌شده‌ها به ترتیب فهرست اصلی، عقب‌افتاده‌ها)
+    """
+    now = time.time() if now is None else now
+    scores = priority_scores(symbols, state)
+    due = []
+    for symbol in symbols:
+        entry = state.get(symbol)
+        name, interval = tier_of(scores[symbol])
+        age = now - entry.get("scanned_at", 0) if entry else float("inf")
+        if age >= max(0, interval - SCHEDULER_DUE_TOLERANCE_MINUTES) * 60:
+            overdue = age / (interval * 60) if interval else 1.0
+            due.append((scores[symbol] + min(overdue - 1.0, 2.0) * 0.25, symbol, name))
+
+    max_symbols = max(1, budget // max(1, cost_per_symbol))
+    due.sort(reverse=True)
+    chosen = {symbol for _, symbol, _ in due[:max_symbols]}
+    if logger.isEnabledFor(logging.DEBUG):
+        for priority, symbol, name in due:
+            logger.debug("🗓️ %s: tier=%s امتیاز=%.2f %s", symbol, name, priority,
+                         "✅" if symbol in chosen else "⏳ عقب افتاد (بودجه)")
+    selected = [s for s in symbols if s in chosen]
+    deferred = [s for s in symbols if s not in chosen]
+    return selected, deferred
@@ -1,5 +1,6 @@
 import os
 import csv
+import hashlib
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -28,6 +29,11 @@ def tehran_time_str(dt=None):
     now = datetime.now(tz) if dt is None else dt.astimezone(tz)
     return now.strftime("%Y-%m-%d %H:%M:%S")
 
+def file_digest(path):
+    # sha1 محتوای فایل؛ کلید اعتبار کش‌های مشتق از CSV (برخلاف mtime در checkout تازه هم ثابت می‌ماند)
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
 def daily_csv_path(date_str=None):
     ensure_dir()
     d = tehran_date_str() if date_str is None else date_str
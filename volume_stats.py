@@ -0,0 +1,131 @@
+# volume_stats.py - آمار غلتان حجم (میانگین/انحراف معیار O(1) و صدک با bisect) برای اسکن زنده و بک‌تست
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+import numpy as np
+
+from candles import CandleSeries
+from config import VOLUME_WINDOW
+
+class RollingVolumeStats:
+    """
+    پنجره غلتان روی حجم: هر update یک مقدار اضافه و قدیمی‌ترین را حذف می‌کند.
+    میانگین و انحراف معیار از جمع و جمع مربعات (O(1))، صدک از لیست مرتب با bisect.
+    برای جلوگیری از انباشت خطای اعشاری، جمع‌ها هر window به‌روزرسانی دقیق دوباره محاسبه می‌شوند.
+    """
+
+    def __init__(self, window=VOLUME_WINDOW):
+        self.window = window
+        self.values = deque()
+        self.sorted_values = []
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.last_t = None
+        self._updates = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def full(self):
+        return len(self.values) >= self.window
+
+    def update(self, volume, t=None):
+        # t اختیاری: کندل تکراری (t <= آخرین t) نادیده گرفته می‌شود تا اسکن‌های پشت سر هم دوباره نشمارند
+        if t is not None:
+            if self.last_t is not None and t <= self.last_t:
+                return False
+            self.last_t = t
+        volume = float(volume)
+        self.values.append(volume)
+        insort(self.sorted_values, volume)
+        self.total += volume
+        self.total_sq += volume * volume
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            del self.sorted_values[bisect_left(self.sorted_values, old)]
+            self.total -= old
+            self.total_sq -= old * old
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+        return True
+
+    @property
+    def mean(self):
+        return self.total / len(self.values) if self.values else 0.0
+
+    @property
+    def std(self):
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        var = (self.total_sq - self.total * self.total / n) / n
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def percentile_rank(self, volume):
+        # درصد مقادیر پنجره که کوچک‌تر یا مساوی volume هستند (0..100)
+        if not self.sorted_values:
+            return 0.0
+        return bisect_right(self.sorted_values, volume) / len(self.sorted_values) * 100.0
+
+    def quantile(self, q):
+        if not self.sorted_values:
+            return 0.0
+        return self.sorted_values[min(len(self.sorted_values) - 1, int(q * len(self.sorted_values)))]
+
+    def snapshot(self, volume):
+        # آمار کندل جاری نسبت به پنجره قبلی (قبل از اضافه شدن خودش)
+        mean = self.mean
+        std = self.std
+        return {
+            "mean": mean, "std": std,
+            "spike_factor": volume / mean if mean > 0 else 1.0,
+            "zscore": (volume - mean) / std if std > 0 else 0.0,
+            "percentile": self.percentile_rank(volume),
+        }
+
+def volume_snapshot(candles, window=VOLUME_WINDOW):
+    """
+    مسیر اسکن زنده: آمار حجم آخرین کندل نسبت به window کندل قبل از آن، مستقیم روی آرایه.
+    خروجی همان snapshot نسخه غلتان پس از تغذیه همان window کندل است.
+    """
+    if isinstance(candles, CandleSeries):
+        vols = candles.v
+    else:
+        vols = np.fromiter((c['v'] for c in candles), dtype=np.float64, count=len(candles))
+    if len(vols) < 2:
+        return None
+    current = float(vols[-1])
+    base = vols[-window - 1:-1]
+    mean = float(base.mean())
+    std = float(base.std())
+    return {
+        "mean": mean, "std": std,
+        "spike_factor": current / mean if mean > 0 else 1.0,
+        "zscore": (current - mean) / std if std > 0 else 0.0,
+        "percentile": float(np.count_nonzero(base <= current)) / len(base) * 100.0,
+    }
+
+class VolumeStatsRegistry:
+    # یک RollingVolumeStats برای هر (symbol, timeframe) در replay/استریم
+    def __init__(self, window=VOLUME_WINDOW):
+        self.window = window
+        self.stats = {}
+
+    def get(self, symbol, tf):
+        key = (symbol, tf)
+        if key not in self.stats:
+            self.stats[key] = RollingVolumeStats(self.window)
+        return self.stats[key]
+
+    def update(self, symbol, tf, t, volume):
+        # snapshot کندل جدید نسبت به پنجره قبلی، سپس افزودن آن به پنجره
+        stats = self.get(symbol, tf)
+        if stats.last_t is not None and t <= stats.last_t:
+            return None
+        snap = stats.snapshot(volume) if len(stats) else None
+        stats.update(volume, t)
+        return snap